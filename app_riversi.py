@@ -1,7 +1,5 @@
 """Riversi App file"""
 
-from ast import literal_eval
-
 from kivy.app import App
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.boxlayout import BoxLayout
@@ -12,7 +10,10 @@ from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.clock import Clock, mainthread
 
 from riversi import BoardSize8
-from clientserver import ClientServeur, threading
+from netclient import CLOSED, CONNECTED, MOVE_RECEIVED, NetworkClient
+from protocol import REASONS, WRONG_MOVE
+from background import BackgroundEngine, ThinkingPlayer, position_of
+from record import GameRecorder, RecordWriter
 
 class StartScreen(Screen):
     """The start screen of the Reversi app.
@@ -36,6 +37,10 @@ class StartScreen(Screen):
         self.game_screen_button.bind(on_press=self.switch_to_game_screen)
         self.game_type_button_group.add_widget(self.game_screen_button)
 
+        self.computer_game_button = Button(text="Computer Game")
+        self.computer_game_button.bind(on_press=self.switch_to_computer_game_screen)
+        self.game_type_button_group.add_widget(self.computer_game_button)
+
         self.game_screen_connection_button = Button(text="Network Game")
         self.game_screen_connection_button.bind(on_press=self.switch_to_network_game_screen)
         self.game_type_button_group.add_widget(self.game_screen_connection_button)
@@ -45,6 +50,13 @@ class StartScreen(Screen):
 
     def switch_to_game_screen(self, instance):
         """Switch to the local game screen."""
+        self.game_screen.set_computer_player(None)
+        self.game_screen.play_game()
+        self.manager.current = 'game'
+
+    def switch_to_computer_game_screen(self, instance):
+        """Switch to the local game screen against the computer."""
+        self.game_screen.set_computer_player(ThinkingPlayer())
         self.game_screen.play_game()
         self.manager.current = 'game'
 
@@ -73,8 +85,21 @@ class NetworkGameScreenSelection(Screen):
         self.connect_button.bind(on_press=self.switch_to_connect_game)
         layout.add_widget(self.connect_button)
 
+        self.computer_button = Button(text="Computer plays: no")
+        self.computer_button.bind(on_press=self.switch_computer_player)
+        layout.add_widget(self.computer_button)
+
         self.add_widget(layout)
 
+    def switch_computer_player(self, instance):
+        """Choose if the computer plays the network game instead of the player"""
+        if self.game_screen.computer_player is None:
+            self.game_screen.set_computer_player(ThinkingPlayer())
+            self.computer_button.text = "Computer plays: yes"
+        else:
+            self.game_screen.set_computer_player(None)
+            self.computer_button.text = "Computer plays: no"
+
     def switch_to_host_game(self, instance):
         """Switch to the network game screen"""
         self.game_screen.host_game("0.0.0.0")
@@ -113,17 +138,52 @@ class ConnectScreen(Screen):
         self.manager.current = 'network_game'
         self.game_screen.connect_to_game(self.ip_input.text)
 
+BLACK_COLOR = (0.2, 0.2, 0.2, 1)
+WHITE_COLOR = (1, 1, 1, 1)
+EMPTY_COLOR = (0, 1, 0, 1)
+MOVE_COLOR = (1, 0, 0, 1)
+
 class GameScreen(Screen, BoardSize8):
     """Screen who we can play the game on local.
+
+    The buttons of the cells are created once, then each display only changes the
+    color of the cells whose pawn or possible move changed since the last display
+    (see 'update_cells').
+
+    board_size: the size of the board, 8 by default ('size' is the size of the widget)
+    computer_player: None for a game between two humans, or the computer player
+    (see 'background.ThinkingPlayer') who plays the color 'computer_color', set by
+    'set_computer_player'. It searches in the thread of 'engine', and ponders while
+    the human thinks. 'search_position' is the position of its search of a move, a
+    result of another position is ignored.
+    recorder: None, or the 'record.GameRecorder' who records the games
     
     This class is inherited of the BoardSize8 class
     """
-    def __init__(self, **kwargs):
+    def __init__(self, board_size: int = 8, **kwargs):
         super(GameScreen, self).__init__(**kwargs)
+        if board_size != self.boardsize:
+            self.boardsize = board_size
+            self.create_new_board()
         self.player = 0
         self.turn_pass = 0
-
-        self.layout = GridLayout(cols=8)
+        self.computer_player = None
+        self.computer_color = 1
+        self.engine = None
+        self.search_position = None
+        self.recorder = None
+
+        self.layout = GridLayout(cols=self.boardsize)
+        self.buttons = []
+        for index in range(self.boardsize * self.boardsize):
+            button = Button(text='', size_hint=(1 / self.boardsize, 1 / self.boardsize),
+                            background_color=EMPTY_COLOR)
+            button.gridpos = divmod(index, self.boardsize)
+            button.bind(on_press=self.press_cell)
+            self.layout.add_widget(button)
+            self.buttons.append(button)
+        self.shown_masks = (0, 0, 0)  # black, white and possible moves on the buttons
+        self.input_enabled = False
         self.add_widget(self.layout)
 
         self.label_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height=30)
@@ -131,132 +191,310 @@ class GameScreen(Screen, BoardSize8):
         self.label_layout.add_widget(self.player_label)
         self.add_widget(self.label_layout)
 
+    def update_cells(self, show_moves: bool):
+        """Procedure who change the color of the buttons of the cells who changed since
+        the last call.
+
+        show_moves: if true, the cells of 'next_possible_move' are shown and can be pressed
+        """
+        black, white = self.position_masks()
+        moves = 0
+        if show_moves:
+            for row_index, column_index in self.next_possible_move:
+                moves |= 1 << row_index * self.boardsize + column_index
+        shown_black, shown_white, shown_moves = self.shown_masks
+        changed = (black ^ shown_black) | (white ^ shown_white) | (moves ^ shown_moves)
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            if bit & black:
+                color = BLACK_COLOR
+            elif bit & white:
+                color = WHITE_COLOR
+            elif bit & moves:
+                color = MOVE_COLOR
+            else:
+                color = EMPTY_COLOR
+            self.buttons[bit.bit_length() - 1].background_color = color
+        self.shown_masks = (black, white, moves)
+        self.input_enabled = show_moves
+
     @mainthread
     def graphical_board(self):
-      """Procedure who display the graphical game board"""
-      for row_index, row in enumerate(self.board):
-        for column_index, cell in enumerate(row):
-            position = (row_index, column_index)
-            button = Button(text='', size_hint=(1/8, 1/8))
-            setattr(button, 'gridpos', position)
-            if cell is not None:
-                button.background_color = (0.2, 0.2, 0.2) if cell.get_color() == 0 else (1, 1, 1)
-            else:
-                button.background_color = (0, 1, 0)
-            if position in self.next_possible_move:
-                button.background_color = (1, 0, 0, 1)
-                button.bind(on_press=self.make_move)
-                self.turn_pass = 0
-            self.layout.add_widget(button)
+        """Procedure who display the graphical game board"""
+        if self.next_possible_move:
+            self.turn_pass = 0
+        self.update_cells(True)
+
+    @mainthread
+    def graphical_board_no_move(self):
+        """Display de game board without the next possible move"""
+        self.update_cells(False)
+
+    def press_cell(self, button):
+        """Procedure call when we click on a button, the click is ignored if the cell
+        is not a possible move of the player who has to click
+
+        button : the button on which we click
+        """
+        if self.input_enabled and button.gridpos in self.next_possible_move:
+            self.input_enabled = False
+            self.select_move(button)
+
+    def record_move(self, cord):
+        """Procedure who record a move of the next possible moves, None for a pass
+
+        cord: the tuple (row, column) of the move
+        """
+        if self.recorder is not None:
+            index = None if cord is None else list(self.next_possible_move).index(cord)
+            self.recorder.record(index)
+
+    def record_end(self):
+        """Procedure who record the end of the game"""
+        if self.recorder is not None:
+            self.recorder.finish(*self.nb_of_pawn_by_color())
 
     def play_game(self):
         """The logic of the game"""
         self.next_move(self.player)
+        self.cancel_search()
         if self.turn_pass >= 2:
+            self.record_end()
+            if self.engine is not None:
+                self.engine.cancel()
             self.manager.current = 'end'
         else:
           if len(self.next_possible_move) == 0:
+              self.record_move(None)
               self.turn_pass += 1
+              self.player = 1 - self.player
               self.update_layout()
           else:
             str_player = 'black' if self.player == 0 else 'white'
             self.player_label.text = f"{str_player.capitalize()} pawn's turn."
-            self.graphical_board()
+            if self.computer_turn():
+                self.graphical_board_no_move()
+                self.start_search()
+            else:
+                self.graphical_board()
+                if self.engine is not None:
+                    self.engine.ponder(self)
+
+    def set_computer_player(self, player):
+        """Procedure who change the computer player and stop the searches of the last one
+
+        player: None, or the ThinkingPlayer
+        """
+        if self.engine is not None:
+            self.engine.close()
+            self.engine = None
+        self.search_position = None
+        self.computer_player = player
+        if player is not None:
+            self.engine = BackgroundEngine(player, on_progress=self.show_progress,
+                                           on_result=self.computer_moved)
+
+    def computer_turn(self) -> bool:
+        """Function who return true when the computer player has to play"""
+        return self.computer_player is not None and self.player == self.computer_color
+
+    def game_board(self):
+        """Function who return the board searched by the computer player"""
+        return self
+
+    def start_search(self):
+        """Procedure who start the search of the move of the computer player"""
+        board = self.game_board()
+        self.search_position = position_of(board)
+        self.engine.think(board)
+
+    def cancel_search(self):
+        """Procedure who stop the search of the computer player when the game left its
+        position, like after a restart of the game"""
+        if self.search_position is not None \
+                and self.search_position != position_of(self.game_board()):
+            self.engine.cancel()
+            self.search_position = None
+
+    @mainthread
+    def show_progress(self, result):
+        """Procedure who display the progress of the search of the computer player
+
+        result: the SearchResult of the last completed depth
+        """
+        self.player_label.text = (f"Computer thinking: depth {result.depth}, "
+                                  f"score {result.score}, {result.nodes} positions")
+
+    @mainthread
+    def computer_moved(self, result, position):
+        """Procedure who play the move chosen by the computer player, the result of a
+        search who is not of 'search_position' is ignored
+
+        result: the SearchResult of the search
+        position: the position of the search (see 'background.position_of')
+        """
+        if position != self.search_position or not self.computer_turn():
+            return
+        self.search_position = None
+        self.turn_pass = 0
+        row, column = result.move
+        self.select_move(self.buttons[row * self.boardsize + column])
 
     def update_layout(self):
         """Procedure who permit the graphical update of the layout"""
-        self.layout.clear_widgets()
         self.play_game()
 
-    def make_move(self, button):
+    def select_move(self, button):
         """Procedure call when we click on a button
         
         button : the button on which we click
         """
         cord = button.gridpos
+        self.record_move(cord)
         vector = self.next_possible_move[cord]
         self.place_pawn(self.player, cord, vector)
 
         self.player = 1 - self.player
         self.update_layout()
 
-class GameScreenConnection(GameScreen, ClientServeur):
-    """Screen who we can play the game on local.
+class GameScreenConnection(GameScreen):
+    """Screen who we can play the game on network.
+
+    The network runs in the thread of a 'netclient.NetworkClient', its events are read
+    by 'poll_network' at each frame, so the screen never waits for the opponent.
+    With a computer player, the computer plays the color of the player and ponders
+    while the opponent thinks.
     
-    This class is inherited of the GameScreen and ClientServeur class
+    This class is inherited of the GameScreen class
     """
     def __init__(self, **kwargs):
         self.turn = 0
         super().__init__(**kwargs)
+        self.network = NetworkClient(self.boardsize)
+        self.poll_event = None
 
-    @mainthread
-    def graphical_board_no_move(self):
-        """Display de game board without the next possible move"""
-        for row_index, row in enumerate(self.board):
-            for column_index, cell in enumerate(row):
-                position = (row_index, column_index)
-                button = Button(text='', size_hint=(1/8, 1/8))
-                setattr(button, 'gridpos', position)
-                if cell is not None:
-                    button.background_color = (0.2, 0.2, 0.2
-                                               ) if cell.get_color() == 0 else (1, 1, 1)
-                else:
-                    button.background_color = (0, 1, 0)
-                self.layout.add_widget(button)
+    def host_game(self, host, port=55555):
+        """Procedure who wait for an opponent, the player is black
 
-    def handle_connection(self, client):
-        self.client = client
-        self.play_game()
+        host: your own ip address
+        port: the connection port
+        """
+        self.start_network()
+        self.player_label.text = "Waiting for the opponent..."
+        self.network.host(host, port)
+
+    def connect_to_game(self, host, port=55555):
+        """Procedure who join a game hosted by a player or by a 'server.GameServer'
+
+        host: the ip address of the host
+        port: the connection port
+        """
+        self.start_network()
+        self.player_label.text = "Connection..."
+        self.network.connect(host, port)
+
+    def start_network(self):
+        """Procedure who start to read the network events at each frame"""
+        if self.poll_event is None:
+            self.poll_event = Clock.schedule_interval(self.poll_network, 0)
+        self.graphical_board_no_move()
+
+    def poll_network(self, *args):
+        """Procedure who handle the events of the network"""
+        for kind, value in self.network.poll():
+            if kind == CONNECTED:
+                self.player = value[0]
+                self.turn = 0
+                self.turn_pass = 0
+                self.play_game()
+            elif kind == MOVE_RECEIVED:
+                self.receive_move(value)
+            elif kind == CLOSED:
+                self.connection_closed(value)
+
+    def connection_closed(self, reason):
+        """Procedure who stop the game when the connection is closed
+
+        reason: the reason of the end, one of 'protocol.REASONS'
+        """
+        self.graphical_board_no_move()
+        if self.engine is not None:
+            self.engine.cancel()
+        self.search_position = None
+        self.player_label.text = f"Connection closed: {REASONS[reason]}."
 
-    @mainthread
     def play_game(self):
         str_player = 'black' if self.turn == 0 else 'white'
         self.player_label.text = f"{str_player.capitalize()} pawn's turn."
 
         self.next_move(self.turn)
+        self.cancel_search()
 
-        if self.turn_pass >= 2:
+        if not self.next_possible_move and not self.legal_moves(1 - self.turn):
+            self.record_end()
+            if self.engine is not None:
+                self.engine.cancel()
             self.manager.current = 'end_connection'
         else:
             if self.turn == self.player:
                 if len(self.next_possible_move) == 0:
+                    self.record_move(None)
                     self.turn_pass += 1
                     self.turn = 1 - self.turn
-                    self.client.send("NO MOVE".encode('utf-8'))
+                    self.network.send_move(None)
                     self.update_layout()
+                elif self.computer_turn():
+                    self.graphical_board_no_move()
+                    self.start_search()
                 else:
                     self.graphical_board()
             else:
                 self.graphical_board_no_move()
-                Clock.schedule_once(lambda x: threading.Thread(target=self.receive_move).start())
+                self.network.wait_move()
+                if self.engine is not None and self.next_possible_move:
+                    self.engine.ponder(self.game_board())
 
-    @mainthread
-    def receive_move(self, *args):
-        """Procedure who permit to receive the move of the other player with socket"""
-        data = self.client.recv(128)
+    def computer_turn(self) -> bool:
+        return self.computer_player is not None and self.turn == self.player
 
-        if not data:
-            self.client.close()
+    def game_board(self):
+        """Function who return a copy of the board for the computer player, 'player' is
+        the player to move on the copy ('player' is the color of the player here)"""
+        board = self.copy()
+        board.player = self.turn
+        return board
 
-        data_decode = data.decode('utf-8')
-        if data_decode != 'NO MOVE':
-            cord = literal_eval(data_decode)
-            #literal_eval is better than eval because it blocks bad intentioned code.
+    def receive_move(self, cord):
+        """Procedure who play the move of the other player, an illegal move or a pass of
+        a player who can play closes the connection
+
+        cord: the tuple (row, column) of the move, None for a pass
+        """
+        if self.turn == self.player or (cord is None and self.next_possible_move) \
+                or (cord is not None and cord not in self.next_possible_move):
+            self.network.close()
+            self.connection_closed(WRONG_MOVE)
+            return
+
+        self.record_move(cord)
+        if cord is None:
+            self.turn_pass += 1
+        else:
             vector = self.next_possible_move[cord]
             self.place_pawn(self.turn, cord, vector)
             self.turn_pass = 0
-        else:
-            self.turn_pass += 1
         self.turn = 1 - self.turn
 
         self.update_layout()
 
-    def make_move(self, button):
+    def select_move(self, button):
         cord = button.gridpos
+        self.record_move(cord)
         vector = self.next_possible_move[cord]
         self.place_pawn(self.turn, cord, vector)
 
-        self.client.send(str(cord).encode('utf-8'))
+        self.network.send_move(cord)
 
         self.turn = 1 - self.turn
         self.turn_pass = 0
@@ -315,14 +553,21 @@ class ReversiApp(App):
     """The kivy App class for loading the game
     
     This class is inherited of the kivy App class
+
+    record_path: None, or the path of the record file where the games are added
+    board_size: the size of the board of the games
     """
+    record_path = None
+    board_size = 8
+
     def build(self):
         sm = ScreenManager()
 
-        game_screen = GameScreen(name='game')
+        game_screen = GameScreen(name='game', board_size=self.board_size)
         start_screen = StartScreen(name='start', game_screen=game_screen)
 
-        game_screen_connection = GameScreenConnection(name='network_game')
+        game_screen_connection = GameScreenConnection(name='network_game',
+                                                      board_size=self.board_size)
         network_game_screen_selection = NetworkGameScreenSelection(
             name='network_game_selection', game_screen=game_screen_connection)
 
@@ -332,6 +577,11 @@ class ReversiApp(App):
         end_screen_connection = EndScreenConnection(name='end_connection',
                                                     game_screen=game_screen_connection)
 
+        if self.record_path is not None:
+            record_writer = RecordWriter(self.record_path)
+            game_screen.recorder = GameRecorder(record_writer, self.board_size)
+            game_screen_connection.recorder = GameRecorder(record_writer, self.board_size)
+
         sm.add_widget(start_screen)
         sm.add_widget(network_game_screen_selection)
         sm.add_widget(connect_game)
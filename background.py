@@ -0,0 +1,309 @@
+"""Reversi background engine file
+
+The search of a computer player runs in a worker thread, so a graphical interface never
+waits for it. 'BackgroundEngine.think' starts the search of a move and returns at once,
+the callbacks 'on_progress' and 'on_result' are called by the worker thread after each
+completed depth and with the chosen move and its position, so a caller can ignore the
+result of a position it left. 'cancel' stops the current search.
+
+While the opponent thinks, 'BackgroundEngine.ponder' searches the position after the
+predicted reply of the opponent (the best move of the transposition table). When the
+opponent plays this reply, the ponder search becomes the search of the move: its time
+budget starts at the start of the ponder search, so the move often comes at once. When
+the prediction is wrong, the ponder search is stopped, and its entries of the
+transposition table are still used by the next search.
+
+The worker is a thread rather than a process: the player and its transposition table
+are kept from one search to the next, and the interface keeps drawing while the search
+runs because the interpreter switches between the threads.
+"""
+
+import argparse
+import math
+import queue
+import random
+import threading
+import time
+
+from engine import AlphaBetaPlayer, RandomPlayer, SearchResult
+from riversi import BitBoard
+from symmetry import INVERSE_TRANSFORMS, canonical_key, transform_cord
+
+class SearchJob():
+    """A search asked to the worker thread.
+
+    board: the copy of the board to search
+    ponder: if true, the search has no deadline and its result is kept until the
+    opponent plays the predicted reply
+    origin: for a ponder search, the position (see 'position_of') before the reply
+    """
+
+    def __init__(self, board, ponder: bool = False, origin=None) -> None:
+        self.board = board
+        self.ponder = ponder
+        self.origin = origin
+        self.key = position_of(board)
+        self.stop = threading.Event()
+        self.start = None
+        self.deadline = math.inf
+        self.result = None
+
+def position_of(board) -> tuple:
+    """Function who return the tuple (black, white, player) who identifies a position.
+
+    board: a reversi Board
+    """
+    black, white = board.position_masks()
+    return black, white, board.player
+
+class ThinkingPlayer(AlphaBetaPlayer):
+    """AlphaBetaPlayer who can be stopped from another thread and who reports its progress.
+
+    The search of 'job' stops when 'job.stop' is set or after 'job.deadline', and starts
+    no new depth after the half of its time, the function 'progress' is called with a
+    SearchResult after each completed depth.
+    The arguments are the ones of AlphaBetaPlayer.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.job = None
+        self.progress = None
+
+    def out_of_time(self) -> bool:
+        if self.job is None:
+            return super().out_of_time()
+        return self.job.stop.is_set() or time.perf_counter() > self.job.deadline
+
+    def can_start_depth(self, start: float) -> bool:
+        job = self.job
+        if job is None:
+            return super().can_start_depth(start)
+        return time.perf_counter() - job.start < (job.deadline - job.start) / 2
+
+    def limit_solvers(self, deadline: float):
+        """Procedure who bring forward the deadline of a running endgame solver.
+
+        deadline: the new deadline, as a time.perf_counter() value
+        """
+        for solver in self.solvers.values():
+            if solver.deadline is not None:
+                solver.deadline = min(solver.deadline, deadline)
+
+    def search_root(self, board, moves: list, depth: int, first) -> tuple:
+        move, score = super().search_root(board, moves, depth, first)
+        job = self.job
+        if self.progress is not None and job is not None and not job.ponder:
+            self.progress(SearchResult(move, score, depth, self.nodes,
+                                       time.perf_counter() - job.start))
+        return move, score
+
+    def predicted_move(self, board):
+        """Function who return the best move of the transposition table for the player
+        'board.player', None if the table does not know the position.
+
+        board: the reversi Board
+        """
+        if self.symmetric:
+            key, transform = canonical_key(board)
+        else:
+            key, transform = board.position_key(), 0
+        entry = self.table.probe(key)
+        if entry is None or entry[0] < 0:
+            return None
+        cord = transform_cord(divmod(entry[0], board.boardsize), board.boardsize,
+                              INVERSE_TRANSFORMS[transform])
+        return cord if cord in board.legal_moves() else None
+
+class BackgroundEngine():
+    """Computer player whose searches run in a worker thread.
+
+    The callbacks are called in the worker thread (or in 'think' when a finished ponder
+    search already has the move), a Kivy interface decorates them with
+    'kivy.clock.mainthread'. The result of a cancelled search is never given.
+
+    player: the ThinkingPlayer who searches, a new one by default
+    on_progress: None, or the function called with a SearchResult after each depth
+    on_result: None, or the function called with the SearchResult of the move and the
+    position (see 'position_of') of the search
+    ponder_limit: the maximal time of a ponder search in seconds
+    """
+
+    def __init__(self, player=None, on_progress=None, on_result=None,
+                 ponder_limit: float = 60.0) -> None:
+        self.player = ThinkingPlayer() if player is None else player
+        assert isinstance(self.player, ThinkingPlayer)
+        assert ponder_limit > 0
+        self.player.progress = on_progress
+        self.on_result = on_result
+        self.time_limit = self.player.time_limit
+        self.ponder_limit = ponder_limit
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()
+        self.current = None
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def think(self, board):
+        """Procedure who start the search of the move of the player 'board.player'.
+
+        board: the reversi Board of the game, it is copied
+        """
+        key = position_of(board)
+        with self.lock:
+            job = self.current
+            if job is not None and job.ponder and job.key == key and not job.stop.is_set():
+                self.ponder_hits += 1
+                job.ponder = False
+                result = job.result
+                if result is None and job.start is not None:
+                    job.deadline = job.start + self.time_limit
+                    self.player.limit_solvers(job.start + self.time_limit / 2)
+            else:
+                if job is not None and job.ponder:
+                    self.ponder_misses += 1
+                self.submit(SearchJob(board.copy()))
+                return
+        if result is not None and self.on_result is not None:
+            self.on_result(result, key)
+
+    def ponder(self, board):
+        """Procedure who start to search the position after the predicted reply of the
+        player 'board.player', nothing is done if there is no prediction.
+
+        board: the reversi Board of the game, with the opponent of the engine to move
+        """
+        with self.lock:
+            job = self.current
+            origin = position_of(board)
+            if job is not None and job.ponder and job.origin == origin:
+                return
+            cord = self.player.predicted_move(board)
+            if cord is None:
+                return
+            copy = board.copy()
+            copy.make_move(cord)
+            self.submit(SearchJob(copy, True, origin))
+
+    def cancel(self):
+        """Procedure who stop the current search, its result is not given."""
+        with self.lock:
+            self.stop_current()
+
+    def close(self):
+        """Procedure who stop the searches and the worker thread."""
+        self.cancel()
+        self.jobs.put(None)
+        self.thread.join()
+
+    def submit(self, job: SearchJob):
+        """Procedure who stop the current search and queue 'job', called with the lock."""
+        self.stop_current()
+        self.current = job
+        self.jobs.put(job)
+
+    def stop_current(self):
+        """Procedure who stop the current search, called with the lock."""
+        if self.current is not None:
+            self.current.stop.set()
+            if self.player.job is self.current:
+                self.player.limit_solvers(0)
+            self.current = None
+
+    def run(self):
+        """Procedure of the worker thread, who do the searches of the queue."""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            with self.lock:
+                if job.stop.is_set():
+                    continue
+                job.start = time.perf_counter()
+                if not job.ponder:
+                    job.deadline = job.start + self.time_limit
+                self.player.job = job
+            # the search time is given by 'job.deadline', the time limit of the player
+            # only gives the time of the endgame solver
+            self.player.time_limit = self.ponder_limit if job.ponder else self.time_limit
+            result = self.player.search(job.board)
+            with self.lock:
+                self.player.job = None
+                self.player.time_limit = self.time_limit
+                job.result = result
+                if job.stop.is_set() or job.ponder:
+                    continue
+                if self.current is job:
+                    self.current = None
+            if self.on_result is not None:
+                self.on_result(result, job.key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def play_game(engine: BackgroundEngine, size: int = 8, think_time: float = 0.5,
+              ponder: bool = True, seed: int = 0) -> dict:
+    """Function who play a game of the engine (white) against a player (black) who
+    thinks 'think_time' seconds per move, and return {'latencies', 'pawns'}.
+
+    The opponent plays the move of a search at depth 2, or a random move one time in
+    four. The latency of a move is the time between the move of the opponent and the
+    move of the engine, it is near zero when the engine pondered the reply of the opponent.
+
+    engine: the BackgroundEngine
+    size: the size of the board
+    think_time: the time of the opponent
+    ponder: if true, the engine ponders while the opponent thinks
+    seed: the seed of the random moves
+    """
+    board = BitBoard(size)
+    opponent = AlphaBetaPlayer(max_depth=2, endgame_empties=0)
+    random_player = RandomPlayer(seed)
+    generator = random.Random(seed)
+    results = queue.Queue()
+    engine.on_result = lambda result, position: results.put(result)
+    latencies = []
+    while board.legal_moves() or board.legal_moves(1 - board.player):
+        if board.player == 0:
+            if ponder:
+                engine.ponder(board)
+            time.sleep(think_time)
+            player = random_player if generator.random() < 0.25 else opponent
+            board.make_move(player.choose_move(board))
+        elif board.legal_moves():
+            start = time.perf_counter()
+            engine.think(board)
+            result = results.get()
+            latencies.append(time.perf_counter() - start)
+            board.make_move(result.move)
+        else:
+            board.make_move(None)
+    engine.cancel()
+    return {'latencies': latencies, 'pawns': board.nb_of_pawn_by_color()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play an engine who ponders against a "
+                                                 "weak player and print its move latency.")
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--time', type=float, default=1.0, help="time of the engine per move")
+    parser.add_argument('--think', type=float, default=1.0, help="time of the opponent per move")
+    parser.add_argument('--games', type=int, default=1)
+    parser.add_argument('--no-ponder', action='store_true')
+    args = parser.parse_args()
+
+    with BackgroundEngine(ThinkingPlayer(time_limit=args.time)) as main_engine:
+        all_latencies = []
+        for game in range(args.games):
+            game_result = play_game(main_engine, args.size, args.think, not args.no_ponder,
+                                    random.randrange(2 ** 32))
+            all_latencies += game_result['latencies']
+            print(f"game {game + 1}: {game_result['pawns'][0]}-{game_result['pawns'][1]}")
+        all_latencies.sort()
+        print(f"{len(all_latencies)} moves, ponder hits {main_engine.ponder_hits}, "
+              f"misses {main_engine.ponder_misses}, median latency "
+              f"{all_latencies[len(all_latencies) // 2]:.3f}s, max {all_latencies[-1]:.3f}s")
@@ -0,0 +1,277 @@
+"""Reversi batched boards file
+
+Many boards are played at the same time with NumPy: each board is a pair of 64 bits
+masks (pawns of the player to move, pawns of the opponent) like in 'BitBoard', and each
+step computes the possible moves, the flips, the passes and the ends of all the boards
+with operations on whole arrays. The boards have at most 64 cells (size 8 or less).
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from riversi import BitBoard, bitboard_tables
+
+_BYTE_COUNTS = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    """Function who return the number of bits of each element of an array of uint64."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(masks).astype(np.int64)
+    return _BYTE_COUNTS[masks.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+def lowest_bit_index(masks: np.ndarray) -> np.ndarray:
+    """Function who return the number of the lowest bit of each element of an array of
+    uint64, -1 for 0."""
+    lowest = masks & (~masks + np.uint64(1))
+    indexes = np.full(masks.shape, -1, dtype=np.int64)
+    nonzero = lowest != 0
+    # the powers of 2 are exact in float64
+    indexes[nonzero] = np.log2(lowest[nonzero].astype(np.float64)).astype(np.int64)
+    return indexes
+
+class BatchBoards():
+    """Boards played at the same time, all the methods work on the whole batch.
+
+    own[i] and opponent[i] are the masks of the pawns of the player to move of the board
+    i and of its opponent, player[i] is the color of the player to move and over[i] is
+    true when no player can play on the board i.
+
+    nb_boards: the number of boards
+    size: the size of the boards, 8 or less
+    """
+
+    def __init__(self, nb_boards: int, size: int = 8) -> None:
+        if size * size > 64:
+            raise ValueError("the batched boards have at most 64 cells")
+        self.nb_boards = nb_boards
+        self.size = size
+        full, directions = bitboard_tables(size)
+        self.full = np.uint64(full)
+        self.directions = [(np.uint64(abs(shift)), shift > 0, np.uint64(mask))
+                           for shift, mask, _ in directions]
+        self.steps = range(size - 3)
+        self.reset()
+
+    def reset(self):
+        """Procedure who put every board on the start position, black to move."""
+        black, white = BitBoard(self.size).start_position()
+        self.own = np.full(self.nb_boards, black, dtype=np.uint64)
+        self.opponent = np.full(self.nb_boards, white, dtype=np.uint64)
+        self.player = np.zeros(self.nb_boards, dtype=np.uint8)
+        self.over = np.zeros(self.nb_boards, dtype=bool)
+        self.nb_moves = np.zeros(self.nb_boards, dtype=np.int64)
+
+    def set_position(self, index: int, black: int, white: int, player: int):
+        """Procedure who set the position of the board 'index', like 'Board.set_position'."""
+        own, opponent = (black, white) if player == 0 else (white, black)
+        self.own[index] = own
+        self.opponent[index] = opponent
+        self.player[index] = player
+        self.over[index] = False
+        self.nb_moves[index] = 0
+
+    def load(self, black, white, player):
+        """Procedure who set the positions of all the boards.
+
+        black: sequence of the masks of the black pawns of each board
+        white: sequence of the masks of the white pawns of each board
+        player: sequence of the player to move of each board
+        """
+        black = np.asarray(black, dtype=np.uint64)
+        white = np.asarray(white, dtype=np.uint64)
+        self.player = np.asarray(player, dtype=np.uint8).copy()
+        white_to_move = self.player == 1
+        self.own = np.where(white_to_move, white, black)
+        self.opponent = np.where(white_to_move, black, white)
+        self.over = np.zeros(self.nb_boards, dtype=bool)
+        self.nb_moves = np.zeros(self.nb_boards, dtype=np.int64)
+
+    def masks(self) -> tuple:
+        """Function who return the arrays (black, white) of the masks of the pawns."""
+        white_to_move = self.player == 1
+        return (np.where(white_to_move, self.opponent, self.own),
+                np.where(white_to_move, self.own, self.opponent))
+
+    def counts(self) -> tuple:
+        """Function who return the arrays (black, white) of the number of pawns."""
+        black, white = self.masks()
+        return popcount(black), popcount(white)
+
+    def board(self, index: int) -> BitBoard:
+        """Function who return a BitBoard with the position of the board 'index'."""
+        black, white = self.masks()
+        board = BitBoard(self.size)
+        board.set_position(int(black[index]), int(white[index]), int(self.player[index]))
+        return board
+
+    def shift(self, masks: np.ndarray, amount: np.uint64, left: bool) -> np.ndarray:
+        """Function who return the masks shifted of 'amount' bits."""
+        return masks << amount if left else masks >> amount
+
+    def legal_masks(self, own=None, opponent=None) -> np.ndarray:
+        """Function who return the array of the masks of the possible moves of 'own'.
+
+        own: array of the masks of the pawns of the player, the player to move by default
+        opponent: array of the masks of the pawns of the opponent
+        """
+        if own is None:
+            own, opponent = self.own, self.opponent
+        moves = np.zeros_like(own)
+        for amount, left, mask in self.directions:
+            mask_opponent = opponent & mask
+            line = self.shift(own, amount, left) & mask_opponent
+            for _ in self.steps:
+                line |= self.shift(line, amount, left) & mask_opponent
+            moves |= self.shift(line, amount, left) & mask
+        return moves & ~(own | opponent) & self.full
+
+    def flips(self, move_bits: np.ndarray) -> np.ndarray:
+        """Function who return the array of the masks of the pawns flipped by the moves.
+
+        move_bits: array of the masks of the moves of the player to move, 0 for no move
+        """
+        own, opponent = self.own, self.opponent
+        flipped = np.zeros_like(own)
+        for amount, left, mask in self.directions:
+            mask_opponent = opponent & mask
+            line = self.shift(move_bits, amount, left) & mask_opponent
+            for _ in self.steps:
+                line |= self.shift(line, amount, left) & mask_opponent
+            closed = (self.shift(line, amount, left) & mask & own) != 0
+            flipped |= np.where(closed, line, np.uint64(0))
+        return flipped
+
+    def play(self, cells: np.ndarray):
+        """Procedure who play a move on each board who is not over.
+
+        cells: array of the bit number (row * size + column) of the possible move of
+        each board, -1 for a pass
+        """
+        cells = np.asarray(cells, dtype=np.int64)
+        active = ~self.over
+        playing = active & (cells >= 0)
+        move_bits = np.where(playing, np.uint64(1) << np.maximum(cells, 0).astype(np.uint64),
+                             np.uint64(0))
+        flipped = self.flips(move_bits)
+        own = self.own | flipped | move_bits
+        opponent = self.opponent & ~flipped
+        self.own = np.where(active, opponent, self.own)
+        self.opponent = np.where(active, own, self.opponent)
+        self.player = np.where(active, 1 - self.player, self.player).astype(np.uint8)
+        self.nb_moves += active
+
+    def update_over(self) -> np.ndarray:
+        """Function who mark the boards where no player can play and return the masks
+        of the possible moves of the player to move."""
+        moves = self.legal_masks()
+        no_move = moves == 0
+        if no_move.any():
+            self.over |= no_move & (self.legal_masks(self.opponent, self.own) == 0)
+        return moves
+
+    def random_cells(self, moves: np.ndarray, generator) -> np.ndarray:
+        """Function who return an array with a random possible move of each board,
+        -1 when there is no move.
+
+        moves: array of the masks of the possible moves
+        generator: a numpy random Generator
+        """
+        counts = popcount(moves)
+        choices = (generator.random(self.nb_boards) * counts).astype(np.int64)
+        moves = moves.copy()
+        for step in range(int(choices.max(initial=0))):
+            remove = choices > step
+            moves[remove] &= moves[remove] - np.uint64(1)
+        return lowest_bit_index(moves)
+
+    def play_random(self, generator=None, history: list = None,
+                    moves_history: list = None) -> int:
+        """Function who play random moves on every board until the end of all the games
+        and return the number of steps.
+
+        generator: a numpy random Generator, a new one by default
+        history: optional list where the array of the cells played at each step is added
+        moves_history: optional list where the array of the masks of the possible moves
+        at each step is added
+        """
+        if generator is None:
+            generator = np.random.default_rng()
+        nb_steps = 0
+        while True:
+            moves = self.update_over()
+            if self.over.all():
+                return nb_steps
+            cells = self.random_cells(moves, generator)
+            if history is not None:
+                history.append(np.where(self.over, -2, cells))
+            if moves_history is not None:
+                moves_history.append(moves)
+            self.play(cells)
+            nb_steps += 1
+
+def check(nb_games: int = 100, size: int = 8, seed: int = 0) -> bool:
+    """Function who play random games in a batch, play the same moves on a BitBoard and
+    return true if the masks of the possible moves at each step and the results are the
+    same.
+
+    nb_games: the number of games
+    size: the size of the boards
+    seed: the seed of the random moves
+    """
+    batch = BatchBoards(nb_games, size)
+    history = []
+    moves_history = []
+    batch.play_random(np.random.default_rng(seed), history, moves_history)
+    black_counts, white_counts = batch.counts()
+    for game in range(nb_games):
+        board = BitBoard(size)
+        for cells, moves in zip(history, moves_history):
+            cell = int(cells[game])
+            if cell == -2:
+                break
+            if int(moves[game]) != board.moves_mask(board.player):
+                return False
+            if cell == -1:
+                if moves[game]:
+                    return False
+                board.make_move(None)
+            elif (moves[game] >> np.uint64(cell)) & np.uint64(1):
+                board.make_move(divmod(cell, size))
+            else:
+                return False
+        if board.legal_moves() or board.legal_moves(1 - board.player):
+            return False
+        if board.nb_of_pawn_by_color() != [black_counts[game], white_counts[game]]:
+            return False
+    return True
+
+def benchmark(nb_boards: int = 10000, size: int = 8, seed: int = 0) -> dict:
+    """Function who play random games on a batch, print and return the games by second.
+
+    nb_boards: the number of boards of the batch
+    size: the size of the boards
+    seed: the seed of the random moves
+    """
+    batch = BatchBoards(nb_boards, size)
+    start = time.perf_counter()
+    nb_steps = batch.play_random(np.random.default_rng(seed))
+    elapsed = time.perf_counter() - start
+    nb_moves = int(batch.nb_moves.sum())
+    print(f"{nb_boards} games, {nb_steps} steps, {nb_moves} moves in {elapsed:.3f} s: "
+          f"{nb_boards / elapsed:.0f} games/s, {nb_moves / elapsed:.0f} moves/s")
+    return {'games': nb_boards, 'elapsed': elapsed, 'games_per_second': nb_boards / elapsed,
+            'moves_per_second': nb_moves / elapsed}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of the batched boards.")
+    parser.add_argument('--boards', type=int, default=10000)
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--check', type=int, default=100,
+                        help="number of games checked with BitBoard")
+    args = parser.parse_args()
+
+    if args.check:
+        print(f"check with BitBoard: {'ok' if check(args.check, args.size) else 'WRONG'}")
+    benchmark(args.boards, args.size)
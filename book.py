@@ -0,0 +1,295 @@
+"""Reversi opening book file
+
+A book keeps the results of the recorded games for each position of their first moves.
+The file is a header (HEADER: MAGIC, size of the board, number of moves, SYMMETRIC if
+the keys are the canonical keys of 'symmetry.canonical_key', number of positions), the
+sorted keys of the positions ('position_key' of the boards) on 8 bytes,
+then the number of black wins, draws and white wins of each position on 4 bytes each.
+The file is memory-mapped and the keys are searched by bisection, so the processes
+who use the same book share one copy of it.
+"""
+
+import argparse
+import bisect
+import heapq
+import mmap
+import shutil
+import struct
+import tempfile
+from array import array
+
+from engine import AlphaBetaPlayer
+from record import PASS_MOVE, RecordReader
+from riversi import BitBoard
+from symmetry import canonical_key
+
+MAGIC = b'RVB\x01'
+HEADER = struct.Struct('<4sBBBxQ')
+SYMMETRIC = 1
+RUN_ENTRY = struct.Struct('<QIII')  # key and results of a position in a sorted run
+
+def book_key(board, flags: int) -> int:
+    """Function who return the key of the position of 'board' in a book.
+
+    board: a reversi Board
+    flags: the flags of the book
+    """
+    return canonical_key(board)[0] if flags & SYMMETRIC else board.position_key()
+
+def build_book(record_paths: list, path: str, plies: int = 20, size: int = 8,
+               min_games: int = 2, symmetric: bool = False,
+               max_positions: int = 1000000) -> int:
+    """Function who write the book of the games of record files and return its number of
+    positions.
+
+    The results are counted in a dict of at most 'max_positions' positions. When it is
+    full, it is written as a run sorted by key in a temporary file and a new dict is
+    started. The runs are merged at the end, so the memory does not grow with the
+    number of games.
+
+    record_paths: list of the paths of the record files
+    path: the path of the book
+    plies: the number of moves of each game added to the book
+    size: the size of the board, the games of other sizes are ignored
+    min_games: the minimal number of games of a position in the book
+    symmetric: if true, the symmetric positions share their results
+    max_positions: the maximal number of positions counted in memory
+    """
+    assert max_positions > 0
+    flags = SYMMETRIC if symmetric else 0
+    stats = {}
+    runs = []
+    board = BitBoard(size)
+    start = board.start_position()
+    try:
+        for record_path in record_paths:
+            with RecordReader(record_path) as reader:
+                for game in reader:
+                    if game.size != size:
+                        continue
+                    if game.black > game.white:
+                        result = 0
+                    elif game.black == game.white:
+                        result = 1
+                    else:
+                        result = 2
+                    board.set_position(*start, 0)
+                    for index in game.moves[:plies]:
+                        key = book_key(board, flags)
+                        counts = stats.get(key)
+                        if counts is None:
+                            counts = stats[key] = [0, 0, 0]
+                        counts[result] += 1
+                        board.make_move(None if index == PASS_MOVE else board.legal_moves()[index])
+                    key = book_key(board, flags)
+                    counts = stats.get(key)
+                    if counts is None:
+                        counts = stats[key] = [0, 0, 0]
+                    counts[result] += 1
+                    if len(stats) >= max_positions:
+                        runs.append(write_run(stats))
+                        stats = {}
+
+        entries = heapq.merge(*(read_run(run) for run in runs),
+                              ((key, *stats[key]) for key in sorted(stats)))
+        return write_book(path, size, plies, flags, merge_entries(entries), min_games)
+    finally:
+        for run in runs:
+            run.close()
+
+def write_run(stats: dict):
+    """Function who write the counts of 'stats' sorted by key in a temporary file and
+    return the file, at its start.
+
+    stats: dict {key: [black wins, draws, white wins]}
+    """
+    run = tempfile.TemporaryFile()
+    buffer = bytearray()
+    for key in sorted(stats):
+        buffer += RUN_ENTRY.pack(key, *stats[key])
+        if len(buffer) >= 1 << 20:
+            run.write(buffer)
+            buffer.clear()
+    run.write(buffer)
+    run.seek(0)
+    return run
+
+def read_run(run):
+    """Generator of the entries (key, black wins, draws, white wins) of a run written by
+    'write_run'."""
+    while True:
+        data = run.read(RUN_ENTRY.size * 4096)
+        if not data:
+            return
+        yield from RUN_ENTRY.iter_unpack(data)
+
+def merge_entries(entries):
+    """Generator who add the counts of the consecutive entries of the same key.
+
+    entries: iterable of (key, black wins, draws, white wins) sorted by key
+    """
+    last_key, counts = None, None
+    for key, black, draws, white in entries:
+        if key == last_key:
+            counts[0] += black
+            counts[1] += draws
+            counts[2] += white
+        else:
+            if counts is not None:
+                yield last_key, counts
+            last_key, counts = key, [black, draws, white]
+    if counts is not None:
+        yield last_key, counts
+
+def write_book(path: str, size: int, plies: int, flags: int, entries,
+               min_games: int) -> int:
+    """Function who write a book file and return its number of positions. The keys are
+    written as they come, the results go through a temporary file and are copied after
+    them.
+
+    path: the path of the book
+    size, plies, flags: the fields of the header
+    entries: iterable of (key, [black wins, draws, white wins]) sorted by key
+    min_games: the minimal number of games of a position in the book
+    """
+    nb_positions = 0
+    with open(path, 'wb') as file, tempfile.TemporaryFile() as results_file:
+        file.write(HEADER.pack(MAGIC, size, plies, flags, 0))
+        keys = array('Q')
+        results = array('I')
+        for key, counts in entries:
+            if sum(counts) < min_games:
+                continue
+            keys.append(key)
+            results.extend(counts)
+            nb_positions += 1
+            if len(keys) >= 65536:
+                file.write(keys.tobytes())
+                results_file.write(results.tobytes())
+                del keys[:], results[:]
+        file.write(keys.tobytes())
+        results_file.write(results.tobytes())
+        results_file.seek(0)
+        shutil.copyfileobj(results_file, file)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, size, plies, flags, nb_positions))
+    return nb_positions
+
+class Book():
+    """A memory-mapped opening book.
+
+    path: the path of the book
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, self.plies, self.flags, self.nb_positions = \
+            HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a book file")
+        view = memoryview(self.data)
+        keys_end = HEADER.size + 8 * self.nb_positions
+        self.keys = view[HEADER.size:keys_end].cast('Q')
+        self.results = view[keys_end:keys_end + 12 * self.nb_positions].cast('I')
+        view.release()
+
+    def __len__(self) -> int:
+        return self.nb_positions
+
+    def lookup(self, key: int):
+        """Function who return the (black wins, draws, white wins) of a position, None
+        if it is not in the book.
+
+        key: the 'position_key' of the position
+        """
+        index = bisect.bisect_left(self.keys, key)
+        if index == self.nb_positions or self.keys[index] != key:
+            return None
+        return tuple(self.results[3 * index:3 * index + 3])
+
+    def moves(self, board) -> list:
+        """Function who return the list of (cord, black wins, draws, white wins) of the
+        possible moves of 'board.player' whose position is in the book, in the order of
+        'next_possible_move'.
+
+        board: a reversi Board, it is not modified
+        """
+        if board.boardsize != self.size or sum(board.nb_of_pawn_by_color()) - 4 >= self.plies:
+            return []
+        copy = board.copy()
+        book_moves = []
+        for cord in copy.legal_moves():
+            record = copy.make_move(cord)
+            results = self.lookup(book_key(copy, self.flags))
+            copy.unmake_move(record)
+            if results is not None:
+                book_moves.append((cord, *results))
+        return book_moves
+
+    def close(self):
+        """Procedure who close the memory map."""
+        self.keys.release()
+        self.results.release()
+        self.data.close()
+
+class BookPlayer():
+    """Computer player who plays the best move of the book, or the move of another
+    player out of the book.
+
+    The score of a move is the rate of points of the player in the games of the book.
+
+    book: the Book, or the path of the book
+    fallback: the computer player out of the book, by default an 'engine.AlphaBetaPlayer'
+    min_games: the minimal number of games of a move to play it
+    """
+
+    def __init__(self, book, fallback=None, min_games: int = 5) -> None:
+        self.book = Book(book) if isinstance(book, str) else book
+        self.fallback = AlphaBetaPlayer() if fallback is None else fallback
+        self.min_games = min_games
+        self.book_moves = 0
+
+    def choose_move(self, board):
+        """Function who return the move chosen for the player 'board.player'.
+
+        board: the reversi Board of the game, it is not modified
+        """
+        best_move, best_score = None, -1.0
+        for cord, black_wins, draws, white_wins in self.book.moves(board):
+            nb_games = black_wins + draws + white_wins
+            if nb_games < self.min_games:
+                continue
+            wins = black_wins if board.player == 0 else white_wins
+            score = (wins + draws / 2) / nb_games
+            if score > best_score:
+                best_move, best_score = cord, score
+        if best_move is None:
+            return self.fallback.choose_move(board)
+        self.book_moves += 1
+        return best_move
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build an opening book from record files.")
+    parser.add_argument('path', help="the path of the book")
+    parser.add_argument('records', nargs='*', help="the record files, print the moves of "
+                                                   "the start position without record files")
+    parser.add_argument('--plies', type=int, default=20)
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--min-games', type=int, default=2)
+    parser.add_argument('--symmetric', action='store_true',
+                        help="the symmetric positions share their results")
+    parser.add_argument('--max-positions', type=int, default=1000000,
+                        help="positions counted in memory before a sorted run is written")
+    args = parser.parse_args()
+
+    if args.records:
+        nb_positions = build_book(args.records, args.path, args.plies, args.size,
+                                  args.min_games, args.symmetric, args.max_positions)
+        print(f"{nb_positions} positions")
+    else:
+        opening_book = Book(args.path)
+        start_board = BitBoard(opening_book.size)
+        for move, *move_results in opening_book.moves(start_board):
+            print(f"{move}: black wins {move_results[0]}, draws {move_results[1]}, "
+                  f"white wins {move_results[2]}")
@@ -1,7 +1,10 @@
 """ClientServeur class file"""
 
+import sys
 import threading
 import socket
+from protocol import (DISCONNECTED, END, FINISHED, LAST_MATCH, MOVE, PASS, REASONS, STATE,
+                      START, WATCH, WRONG_MOVE, FrameDecoder, ProtocolError, PASS_FRAME, encode)
 from riversi import BoardWithoutGUI
 
 class ClientServeur():
@@ -22,25 +25,77 @@ class ClientServeur():
       server.bind((host, port))
       server.listen()
       client, _ = server.accept()
+      self.decoder = FrameDecoder()
+      client.sendall(encode(START, 1, self.boardsize))
 
+      self.player = 0
       conn_thread = threading.Thread(target=self.handle_connection, args=(client, ))
       conn_thread.start()
 
     def connect_to_game(self, host, port=55555):
-      """Procedure who permit to host a game 
+      """Procedure who permit to join a game hosted by a player or by a 'server.GameServer'
 
-      host: your own ip address
+      The host choose the color of the player.
+
+      host: the ip address of the host
       port: the connection port 
       """
       client = socket.socket()
       client.connect((host, port))
+      self.decoder = FrameDecoder()
 
       print("Connect to the server")
 
-      self.player = 1
-      conn_thread = threading.Thread(target=self.handle_connection, args=(client, ))
+      conn_thread = threading.Thread(target=self.join_game, args=(client, ))
       conn_thread.start()
 
+    def join_game(self, client):
+      """Procedure who wait for the START message of the host and play the game
+
+      client: your game socket
+      """
+      frame = self.receive_frame(client)
+      if frame is None or frame[0] != START or frame[1][1] != self.boardsize:
+        client.close()
+        return
+
+      self.player = frame[1][0]
+      self.handle_connection(client)
+
+    def watch_game(self, host, port, match_id=LAST_MATCH):
+      """Procedure who permit to watch a match of a 'server.GameServer'
+
+      host: the ip address of the server
+      port: the port of the spectators of the server
+      match_id: the number of the match, the last started match by default
+      """
+      client = socket.socket()
+      client.connect((host, port))
+      self.decoder = FrameDecoder()
+      client.sendall(encode(WATCH, match_id))
+
+      conn_thread = threading.Thread(target=self.handle_watch, args=(client, ))
+      conn_thread.start()
+
+    def send_move(self, client, cord):
+      """Procedure who send a move, or a pass if 'cord' is None
+
+      client: your game socket
+      cord: tuple (row, column) of the move
+      """
+      client.sendall(PASS_FRAME if cord is None else encode(MOVE, *cord))
+
+    def receive_frame(self, client):
+      """Function who return the next message (kind, fields) received on 'client', None
+      if the connection is closed
+
+      client: your game socket
+      """
+      try:
+        return self.decoder.next_frame(client)
+      except (OSError, ProtocolError):
+        return None
+
     def handle_connection(self, client):
         """Procedure for the client serveur game logic
 
@@ -48,55 +103,118 @@ class ClientServeur():
         """
         raise NotImplementedError
 
+    def handle_watch(self, client):
+        """Procedure for the spectator logic
+
+        client: your spectator socket
+        """
+        raise NotImplementedError
+
 class BoardWithoutGUIClientServer(BoardWithoutGUI, ClientServeur):
   """Class of a reversi Game Board for with a multiplayer connexion.
   
   This class is inherited of BoardWithoutGUI and ClientServeur.
+
+  recorder: optional 'record.GameRecorder' who records the games
   """
 
-  def __init__(self, size) -> None:
+  def __init__(self, size, recorder=None) -> None:
       super().__init__(size)
       self.turn = 0
       self.turn_pass = 0
+      self.recorder = recorder
 
   def handle_connection(self, client):
-      while self.turn_pass <= 2:
+      reason = FINISHED
+      while True:
           str_player = 'black' if self.turn == 0 else 'white'
           self.next_move(self.turn)
 
           print(self)
 
-          if len(self.next_possible_move) == 0:
-              self.turn_pass += 1
-              print(f"{str_player.capitalize()} player can't play.")
-          else:
-              print(f"{str_player.capitalize()} pawn's turn.")
-              if self.turn == self.player:
+          if not self.next_possible_move and not self.legal_moves(1 - self.turn):
+              break
+
+          if self.turn == self.player:
+              if not self.next_possible_move:
+                  print(f"{str_player.capitalize()} player can't play.")
+                  self.send_move(client, None)
+                  self.turn_pass += 1
+                  index_of_move = None
+              else:
+                  print(f"{str_player.capitalize()} pawn's turn.")
                   index_of_move = self.choice_move()
                   cord = list(self.next_possible_move.keys())[index_of_move]
                   vector = self.next_possible_move[cord]
                   self.place_pawn(self.turn, cord, vector)
-
+                  self.send_move(client, cord)
                   self.turn_pass = 0
-                  self.turn = 1 - self.turn
-                  client.send(str(index_of_move).encode('utf-8'))
 
+          else:
+              print(f"{str_player.capitalize()} pawn's turn.")
+              frame = self.receive_frame(client)
+
+              if frame is None:
+                  reason = DISCONNECTED
+                  break
+
+              kind, fields = frame
+              if kind == PASS and not self.next_possible_move:
+                  print(f"{str_player.capitalize()} player can't play.")
+                  self.turn_pass += 1
+                  index_of_move = None
+              elif kind == MOVE and fields in self.next_possible_move:
+                  index_of_move = list(self.next_possible_move).index(fields)
+                  self.place_pawn(self.turn, fields, self.next_possible_move[fields])
+                  self.turn_pass = 0
+              elif kind == END:
+                  reason = fields[0]
+                  print(f"End of the game: {REASONS[reason]}.")
+                  break
               else:
-                  data = client.recv(128)
+                  reason = WRONG_MOVE
+                  break
 
-                  if not data:
-                      break
+          if self.recorder is not None:
+              self.recorder.record(index_of_move)
+          self.turn = 1 - self.turn
 
-                  index_of_move = int(data.decode('utf-8'))
-                  cord = list(self.next_possible_move.keys())[index_of_move]
-                  vector = self.next_possible_move[cord]
-                  self.place_pawn(self.turn, cord, vector)
+      client.close()
+      if self.recorder is not None:
+          self.recorder.finish(*self.nb_of_pawn_by_color(), reason)
+
+  def handle_watch(self, client):
+      while True:
+          frame = self.receive_frame(client)
+          if frame is None:
+              break
+
+          kind, fields = frame
+          if kind == STATE:
+              player, _, black, white = fields
+              self.set_position(black, white, player)
+          elif kind == MOVE:
+              self.make_move(fields)
+          elif kind == PASS:
+              self.make_move(None)
+          elif kind == END:
+              break
+          else:
+              continue
 
-                  self.turn_pass = 0
-                  self.turn = 1 - self.turn
+          str_player = 'black' if self.player == 0 else 'white'
+          print(self)
+          print(f"{str_player.capitalize()} pawn's turn.")
 
       client.close()
 
 if __name__ == '__main__':
-    board_server = BoardWithoutGUIClientServer(8)
-    board_server.host_game("0.0.0.0", 55555)
+    if len(sys.argv) > 3:
+        board_spectator = BoardWithoutGUIClientServer(8)
+        board_spectator.watch_game(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
+    elif len(sys.argv) > 1:
+        board_client = BoardWithoutGUIClientServer(8)
+        board_client.connect_to_game(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 55555)
+    else:
+        board_server = BoardWithoutGUIClientServer(8)
+        board_server.host_game("0.0.0.0", 55555)
@@ -0,0 +1,260 @@
+"""Reversi self-play data file
+
+Random self-play games are played by batches with 'batch.BatchBoards' and every position
+of the games is written in NumPy '.npy' files ('shards') with the structured type
+POSITION:
+
+- black, white: the masks of the pawns, the bit row * size + column is the cell
+- legal: the mask of the possible moves of the player to move, 0 when the player passes
+- player: the player to move, 0 for black and 1 for white
+- move: the bit number of the move played, -1 for a pass
+- result: the difference of pawns (black - white) at the end of the game
+
+The shards are memory-mapped files preallocated with 'shard_positions' positions, a
+new shard is started when one is full, so a dataset is never held in memory. The
+workers of the pool write their own shards, the file MANIFEST of the directory gives the
+shards and their number of positions. 'Dataset' reads the shards back as memory-mapped
+arrays, without parsing.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from batch import BatchBoards
+
+POSITION = np.dtype([('black', '<u8'), ('white', '<u8'), ('legal', '<u8'), ('player', 'u1'),
+                     ('move', 'i1'), ('result', 'i1')])
+MANIFEST = 'manifest.json'
+
+class ShardWriter():
+    """Writer of positions in shards of 'shard_positions' positions.
+
+    directory: the directory of the shards
+    prefix: the start of the names of the shards, they are '<prefix>-<number>.npy'
+    shard_positions: the number of positions of a shard
+    """
+
+    def __init__(self, directory: str, prefix: str, shard_positions: int) -> None:
+        assert shard_positions > 0
+        self.directory = directory
+        self.prefix = prefix
+        self.shard_positions = shard_positions
+        self.shards = []  # list of [name, number of positions]
+        self.array = None
+
+    def open_shard(self):
+        """Procedure who close the current shard and start a new one."""
+        self.flush()
+        name = f'{self.prefix}-{len(self.shards):05d}.npy'
+        self.array = np.lib.format.open_memmap(os.path.join(self.directory, name), mode='w+',
+                                               dtype=POSITION, shape=(self.shard_positions, ))
+        self.shards.append([name, 0])
+
+    def write(self, positions: np.ndarray):
+        """Procedure who append positions to the shards.
+
+        positions: array of POSITION
+        """
+        start = 0
+        while start < len(positions):
+            if self.array is None or self.shards[-1][1] == self.shard_positions:
+                self.open_shard()
+            count = self.shards[-1][1]
+            end = min(len(positions), start + self.shard_positions - count)
+            self.array[count:count + end - start] = positions[start:end]
+            self.shards[-1][1] += end - start
+            start = end
+
+    def flush(self):
+        """Procedure who write the current shard on the disk."""
+        if self.array is not None:
+            self.array.flush()
+
+    def close(self) -> list:
+        """Function who close the last shard, cut it to its number of positions and return
+        the list of (name, number of positions) of the shards."""
+        if self.array is not None:
+            name, count = self.shards[-1]
+            path = os.path.join(self.directory, name)
+            self.flush()
+            if count < self.shard_positions:
+                # the shape is in the header of the file, the positions are copied in a
+                # shard of the right size
+                short_path = path + '.tmp'
+                short = np.lib.format.open_memmap(short_path, mode='w+', dtype=POSITION,
+                                                  shape=(count, ))
+                short[:] = self.array[:count]
+                short.flush()
+                del short
+                os.replace(short_path, path)
+            self.array = None
+        return [tuple(shard) for shard in self.shards]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def play_games(batch: BatchBoards, generator) -> np.ndarray:
+    """Function who play a random game on each board of 'batch' from the start position
+    and return the array of POSITION of the games, game after game.
+
+    batch: the BatchBoards
+    generator: a numpy random Generator
+    """
+    batch.reset()
+    steps = []
+    while True:
+        moves = batch.update_over()
+        playing = np.flatnonzero(~batch.over)
+        if not len(playing):
+            break
+        cells = batch.random_cells(moves, generator)
+        black, white = batch.masks()
+        positions = np.empty(len(playing), dtype=POSITION)
+        positions['black'] = black[playing]
+        positions['white'] = white[playing]
+        positions['legal'] = moves[playing]
+        positions['player'] = batch.player[playing]
+        positions['move'] = cells[playing]
+        steps.append((playing, positions))
+        batch.play(cells)
+
+    black, white = batch.counts()
+    results = black - white
+    games = np.concatenate([playing for playing, _ in steps])
+    positions = np.concatenate([step_positions for _, step_positions in steps])
+    positions['result'] = results[games]
+    return positions[np.argsort(games, kind='stable')]
+
+def generate_shards(task: dict) -> dict:
+    """Function who play the games of a worker, write them in its shards and return
+    {'shards': list of (name, number of positions), 'games', 'elapsed'}.
+
+    task: dict of the directory, worker, nb_games, size, batch_size, shard_positions
+    and seed of the worker
+    """
+    start = time.perf_counter()
+    generator = np.random.default_rng(task['seed'])
+    nb_games = 0
+    with ShardWriter(task['directory'], f"shard-{task['worker']:03d}",
+                     task['shard_positions']) as writer:
+        while nb_games < task['nb_games']:
+            batch = BatchBoards(min(task['batch_size'], task['nb_games'] - nb_games), task['size'])
+            writer.write(play_games(batch, generator))
+            nb_games += batch.nb_boards
+        shards = writer.close()
+    return {'shards': shards, 'games': nb_games, 'elapsed': time.perf_counter() - start}
+
+def generate_dataset(directory: str, nb_games: int, workers: int = None, size: int = 8,
+                     batch_size: int = 4096, shard_mb: float = 256, seed: int = 0) -> dict:
+    """Function who play random games in a pool of processes, write their positions in
+    the shards of 'directory' and return the manifest of the dataset.
+
+    directory: the directory of the dataset, created if it does not exist
+    nb_games: the number of games
+    workers: the number of worker processes, the number of CPU by default
+    size: the size of the board, 8 or less
+    batch_size: the number of games played at the same time by a worker
+    shard_mb: the size of a shard in megabytes
+    seed: the seed of the random moves, each worker has its own seed from it
+    """
+    if size * size > 64:
+        raise ValueError("the positions have at most 64 cells")
+    os.makedirs(directory, exist_ok=True)
+    workers = workers or os.cpu_count()
+    shard_positions = max(int(shard_mb * 2 ** 20) // POSITION.itemsize, 1)
+    tasks = [{'directory': directory, 'worker': worker, 'size': size, 'batch_size': batch_size,
+              'shard_positions': shard_positions, 'seed': [seed, worker],
+              'nb_games': nb_games // workers + (worker < nb_games % workers)}
+             for worker in range(workers)]
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.map(generate_shards, tasks, chunksize=1)
+    elapsed = time.perf_counter() - start
+
+    shards = [{'name': name, 'positions': count}
+              for result in results for name, count in result['shards']]
+    manifest = {
+        'size': size,
+        'dtype': POSITION.descr,
+        'games': sum(result['games'] for result in results),
+        'positions': sum(shard['positions'] for shard in shards),
+        'shards': shards,
+        'elapsed': elapsed,
+    }
+    with open(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+class Dataset():
+    """Reader of the positions of a dataset written by 'generate_dataset'.
+
+    The shards are memory-mapped: 'dataset[index]' reads one position, 'dataset.shards'
+    is the list of the arrays of the shards and 'sample' reads random positions.
+
+    directory: the directory of the dataset
+    """
+
+    def __init__(self, directory: str) -> None:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as file:
+            self.manifest = json.load(file)
+        self.size = self.manifest['size']
+        self.shards = [np.load(os.path.join(directory, shard['name']), mmap_mode='r')
+                       for shard in self.manifest['shards']]
+        self.ends = np.cumsum([len(shard) for shard in self.shards])
+
+    def __len__(self) -> int:
+        return int(self.ends[-1]) if len(self.ends) else 0
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        shard = int(np.searchsorted(self.ends, index, side='right'))
+        return self.shards[shard][index - (self.ends[shard - 1] if shard else 0)]
+
+    def __iter__(self):
+        return iter(self.shards)
+
+    def sample(self, nb_positions: int, generator=None) -> np.ndarray:
+        """Function who return an array of POSITION of random positions of the dataset.
+
+        nb_positions: the number of positions
+        generator: a numpy random Generator, a new one by default
+        """
+        if generator is None:
+            generator = np.random.default_rng()
+        indexes = np.sort(generator.integers(0, len(self), nb_positions))
+        shards = np.searchsorted(self.ends, indexes, side='right')
+        positions = np.empty(nb_positions, dtype=POSITION)
+        for shard in np.unique(shards):
+            selected = shards == shard
+            start = self.ends[shard - 1] if shard else 0
+            positions[selected] = self.shards[shard][indexes[selected] - start]
+        return positions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write the positions of random self-play "
+                                                 "games in memory-mapped NumPy shards.")
+    parser.add_argument('directory')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of worker processes, the number of CPU by default")
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=4096, help="games played at the same time")
+    parser.add_argument('--shard-mb', type=float, default=256)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    dataset_manifest = generate_dataset(args.directory, args.games, args.workers, args.size,
+                                        args.batch, args.shard_mb, args.seed)
+    print(f"{dataset_manifest['games']} games, {dataset_manifest['positions']} positions in "
+          f"{len(dataset_manifest['shards'])} shards, "
+          f"{dataset_manifest['positions'] / dataset_manifest['elapsed']:.0f} positions/s")
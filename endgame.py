@@ -0,0 +1,320 @@
+"""Reversi endgame solver file"""
+
+import argparse
+import math
+import time
+from collections import namedtuple
+
+from riversi import bitboard_tables
+
+SolveResult = namedtuple('SolveResult', ['move', 'score', 'nodes', 'elapsed'])
+SolveResult.__doc__ = """Result of 'EndgameSolver.solve'.
+
+    move: the best move, None if the player have to pass
+    score: the exact final difference of pawns for the player to move
+    nodes: the number of visited positions
+    elapsed: the solving time in seconds
+    """
+
+# number of nodes between two checks of the deadline
+CHECK_NODES = 256
+
+class SolveTimeout(Exception):
+    """Exception raised inside the solver when the deadline is over."""
+
+class EndgameSolver():
+    """Exact solver of the end of a game, who search all the moves until the end.
+
+    The positions are pairs of masks (player to move, opponent) like in 'BitBoard'.
+    The moves are searched fastest-first (the move who leaves the fewest moves to the
+    opponent first) and in the regions (quarters of the board) with an odd number of
+    empty cells first. The last 'small_empties' cells are solved on the list of the
+    empty cells without move generation.
+
+    size: the size of the board
+    small_empties: number of empty cells under which the special solver is used
+    fastest_first_empties: number of empty cells under which the moves are only ordered
+    by parity, the mobility of each move costs more than it saves near the end
+    """
+
+    def __init__(self, size: int = 8, small_empties: int = 4,
+                 fastest_first_empties: int = 7) -> None:
+        self.size = size
+        self.small_empties = small_empties
+        self.fastest_first_empties = fastest_first_empties
+        self.full, directions = bitboard_tables(size)
+        self.left = [(shift, mask) for shift, mask, _ in directions if shift > 0]
+        self.right = [(-shift, mask) for shift, mask, _ in directions if shift < 0]
+        self.steps = range(size - 3)
+
+        half = size // 2
+        self.regions = [0, 0, 0, 0]
+        self.region_of = []
+        for index in range(size * size):
+            region = 2 * (index // size >= half) + (index % size >= half)
+            self.regions[region] |= 1 << index
+            self.region_of.append(region)
+
+        self.nodes = 0
+        self.deadline = None
+        self.next_check = math.inf  # the number of nodes of the next check of the deadline
+
+    def moves(self, own: int, opponent: int) -> int:
+        """Function who return the mask of the possible moves of 'own'.
+
+        own: mask of the pawns of the player to move
+        opponent: mask of the pawns of the opponent
+        """
+        empty = self.full & ~(own | opponent)
+        steps = self.steps
+        moves = 0
+        for shift, mask in self.left:
+            mask_opponent = mask & opponent
+            line = (own << shift) & mask_opponent
+            for _ in steps:
+                line |= (line << shift) & mask_opponent
+            moves |= (line << shift) & mask
+        for shift, mask in self.right:
+            mask_opponent = mask & opponent
+            line = (own >> shift) & mask_opponent
+            for _ in steps:
+                line |= (line >> shift) & mask_opponent
+            moves |= (line >> shift) & mask
+        return moves & empty
+
+    def flips(self, own: int, opponent: int, index: int) -> int:
+        """Function who return the mask of the pawns flipped if 'own' plays on 'index'.
+
+        own: mask of the pawns of the player to move
+        opponent: mask of the pawns of the opponent
+        index: the bit number of the move
+        """
+        move = 1 << index
+        flipped = 0
+        for shift, mask in self.left:
+            line = 0
+            cell = (move << shift) & mask
+            while cell & opponent:
+                line |= cell
+                cell = (cell << shift) & mask
+            if cell & own:
+                flipped |= line
+        for shift, mask in self.right:
+            line = 0
+            cell = (move >> shift) & mask
+            while cell & opponent:
+                line |= cell
+                cell = (cell >> shift) & mask
+            if cell & own:
+                flipped |= line
+        return flipped
+
+    def solve(self, board, time_limit=None) -> SolveResult:
+        """Function who return the SolveResult of the position of 'board'.
+
+        board: a reversi Board of size 'self.size', it is not modified
+        time_limit: optional time budget in seconds, SolveTimeout is raised when it is over
+        """
+        assert board.boardsize == self.size
+        masks = getattr(board, 'masks', None)
+        if masks is None:
+            masks = [0, 0]
+            for row_index in range(self.size):
+                for column_index in range(self.size):
+                    cell = board.get_cell(row_index, column_index)
+                    if cell is not None:
+                        masks[cell] |= 1 << (row_index * self.size + column_index)
+        return self.solve_masks(masks[board.player], masks[1 - board.player], time_limit)
+
+    def solve_masks(self, own: int, opponent: int, time_limit=None) -> SolveResult:
+        """Function who return the SolveResult of the position (own, opponent),
+        'own' is the player to move.
+
+        own: mask of the pawns of the player to move
+        opponent: mask of the pawns of the opponent
+        time_limit: optional time budget in seconds, SolveTimeout is raised when it is over
+        """
+        start = time.perf_counter()
+        self.deadline = None if time_limit is None else start + time_limit
+        self.nodes = 1
+        self.next_check = math.inf if time_limit is None else CHECK_NODES
+
+        nb_empty = (self.full & ~(own | opponent)).bit_count()
+        moves = self.moves(own, opponent)
+        if not moves:
+            score = -self.search(opponent, own, -self.size * self.size,
+                                 self.size * self.size, True, nb_empty)
+            return SolveResult(None, score, self.nodes, time.perf_counter() - start)
+
+        alpha, beta = -self.size * self.size - 1, self.size * self.size
+        best_move = None
+        for index, flipped in self.ordered_moves(own, opponent, moves, nb_empty):
+            score = -self.search(opponent & ~flipped, own | flipped | (1 << index),
+                                 -beta, -alpha, False, nb_empty - 1)
+            if score > alpha:
+                alpha, best_move = score, divmod(index, self.size)
+        return SolveResult(best_move, alpha, self.nodes, time.perf_counter() - start)
+
+    def ordered_moves(self, own: int, opponent: int, moves: int, nb_empty: int) -> list:
+        """Function who return the list of (index, flipped) of the moves, in search order.
+
+        own: mask of the pawns of the player to move
+        opponent: mask of the pawns of the opponent
+        moves: mask of the possible moves
+        nb_empty: number of empty cells
+        """
+        empty = self.full & ~(own | opponent)
+        odd_regions = [(empty & region).bit_count() & 1 for region in self.regions]
+        fastest_first = nb_empty > self.fastest_first_empties
+
+        ordered = []
+        while moves:
+            bit = moves & -moves
+            moves ^= bit
+            index = bit.bit_length() - 1
+            flipped = self.flips(own, opponent, index)
+            priority = 0 if odd_regions[self.region_of[index]] else 1
+            if fastest_first:
+                priority += 2 * self.moves(opponent & ~flipped, own | flipped | bit).bit_count()
+            ordered.append((priority, index, flipped))
+        ordered.sort()
+        return [(index, flipped) for _, index, flipped in ordered]
+
+    def search(self, own: int, opponent: int, alpha: int, beta: int, passed: bool,
+               nb_empty: int) -> int:
+        """Recursive function who return the exact final difference of pawns for 'own'.
+
+        own: mask of the pawns of the player to move
+        opponent: mask of the pawns of the opponent
+        alpha: the lower bound of the search window
+        beta: the upper bound of the search window
+        passed: true if the previous player passed
+        nb_empty: number of empty cells
+        """
+        self.nodes += 1
+        # the nodes of 'search_small' are not checked, the next check is by threshold
+        if self.nodes >= self.next_check:
+            self.next_check = self.nodes + CHECK_NODES
+            if time.perf_counter() > self.deadline:
+                raise SolveTimeout
+
+        if nb_empty <= self.small_empties:
+            empties = []
+            empty = self.full & ~(own | opponent)
+            # the cells of the odd regions first
+            for region in sorted(self.regions, key=lambda r: not (empty & r).bit_count() & 1):
+                region_empty = empty & region
+                while region_empty:
+                    bit = region_empty & -region_empty
+                    region_empty ^= bit
+                    empties.append(bit.bit_length() - 1)
+            return self.search_small(own, opponent, alpha, beta, passed, empties)
+
+        moves = self.moves(own, opponent)
+        if not moves:
+            if passed:
+                return own.bit_count() - opponent.bit_count()
+            return -self.search(opponent, own, -beta, -alpha, True, nb_empty)
+
+        best_score = -self.size * self.size - 1
+        for index, flipped in self.ordered_moves(own, opponent, moves, nb_empty):
+            score = -self.search(opponent & ~flipped, own | flipped | (1 << index),
+                                 -beta, -alpha, False, nb_empty - 1)
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    def search_small(self, own: int, opponent: int, alpha: int, beta: int, passed: bool,
+                     empties: list) -> int:
+        """Recursive function who solve the last empty cells 'empties' by trying each of
+        them, without move generation.
+
+        own: mask of the pawns of the player to move
+        opponent: mask of the pawns of the opponent
+        alpha: the lower bound of the search window
+        beta: the upper bound of the search window
+        passed: true if the previous player passed
+        empties: list of the bit number of the empty cells, in search order
+        """
+        self.nodes += 1
+        if len(empties) == 1:
+            index = empties[0]
+            difference = own.bit_count() - opponent.bit_count()
+            flipped = self.flips(own, opponent, index).bit_count()
+            if flipped:
+                return difference + 2 * flipped + 1
+            flipped = self.flips(opponent, own, index).bit_count()
+            if flipped:
+                return difference - 2 * flipped - 1
+            return difference
+
+        best_score = None
+        for position, index in enumerate(empties):
+            flipped = self.flips(own, opponent, index)
+            if not flipped:
+                continue
+            score = -self.search_small(opponent & ~flipped, own | flipped | (1 << index),
+                                       -beta, -alpha, False,
+                                       empties[:position] + empties[position + 1:])
+            if best_score is None or score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score is None:
+            if passed:
+                return own.bit_count() - opponent.bit_count()
+            return -self.search_small(opponent, own, -beta, -alpha, True, empties)
+        return best_score
+
+# (player to move, opponent, exact score) of 8x8 positions from seeded random games
+BENCHMARK_POSITIONS = [
+    (0x22b129356865131d, 0x484ed6ca9692ac80, 6),
+    (0x4000003c9edcfe08, 0x2f7eff4261210133, -4),
+    (0xfffa302a020c1c02, 0x00044cd4fdd3237c, 54),
+    (0x2e0c403d3d5dbd3e, 0x80b0bec2c2020201, -40),
+    (0x04021f4b19010008, 0xfafda0b4e66cfc14, 14),
+    (0x022441e367fcfce4, 0xf8d8ba1c18010008, -22),
+    (0x30341c1703c16773, 0x00ca6068fc3c180c, 6),
+    (0x32121c30543040e0, 0x0c0de30f8bcdbd12, -2),
+    (0x003a7c0004ac988e, 0x090503fffa522760, 4),
+    (0x3037001038446878, 0x0908fceec7aa1602, -6),
+    (0x2272aaf3e28060f2, 0x0404040c1c7c1f0c, -18),
+    (0x07021206667a3806, 0xf0752d7919050301, -20),
+]
+
+def benchmark(max_empties: int = 14) -> dict:
+    """Function who solve the benchmark positions with at most 'max_empties' empty cells,
+    print the nodes/sec and the time of each one and return the totals.
+
+    max_empties: the maximal number of empty cells of the solved positions
+    """
+    solver = EndgameSolver(8)
+    total_nodes = 0
+    total_time = 0.0
+    print(f"{'empties':>7} {'score':>6} {'nodes':>10} {'time (s)':>9} {'nodes/s':>10}")
+    for own, opponent, expected in BENCHMARK_POSITIONS:
+        nb_empty = 64 - (own | opponent).bit_count()
+        if nb_empty > max_empties:
+            continue
+        result = solver.solve_masks(own, opponent)
+        assert result.score == expected, f"wrong score {result.score}, expected {expected}"
+        total_nodes += result.nodes
+        total_time += result.elapsed
+        print(f"{nb_empty:>7} {result.score:>6} {result.nodes:>10} {result.elapsed:>9.3f} "
+              f"{result.nodes / result.elapsed:>10.0f}")
+    print(f"total: {total_nodes} nodes in {total_time:.3f} s, "
+          f"{total_nodes / total_time:.0f} nodes/s")
+    return {'nodes': total_nodes, 'time': total_time, 'nodes_per_second': total_nodes / total_time}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of the endgame solver.")
+    parser.add_argument('--max-empties', type=int, default=14,
+                        help="solve the positions with at most this number of empty cells")
+    benchmark(parser.parse_args().max_empties)
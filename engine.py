@@ -0,0 +1,294 @@
+"""Reversi engine file"""
+
+import random
+import time
+from collections import namedtuple
+
+from endgame import EndgameSolver, SolveTimeout
+from symmetry import INVERSE_TRANSFORMS, canonical_key, transform_cord
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+WIN_SCORE = 10000  # score of a won game, plus the difference of pawns
+
+SearchResult = namedtuple('SearchResult', ['move', 'score', 'depth', 'nodes', 'elapsed'])
+SearchResult.__doc__ = """Result of 'AlphaBetaPlayer.search'.
+
+    move: the best move found, None if the player have to pass
+    score: the score of the move for the player to move
+    depth: the depth of the last completed iteration
+    nodes: the number of visited positions
+    elapsed: the search time in seconds
+    """
+
+class SearchTimeout(Exception):
+    """Exception raised inside the search when the time budget is over."""
+
+_SQUARE_WEIGHTS = {}
+
+def square_weights(size: int) -> dict:
+    """Function who return the dict {cord: weight} of the cells who matter the most:
+    the corners and the cells next to them, who give a corner to the other player.
+
+    size: int who represents the size of the board
+    """
+    if size not in _SQUARE_WEIGHTS:
+        weights = {}
+        last = size - 1
+        for row, column, row_step, column_step in ((0, 0, 1, 1), (0, last, 1, -1),
+                                                    (last, 0, -1, 1), (last, last, -1, -1)):
+            weights[(row, column)] = 25
+            weights[(row + row_step, column + column_step)] = -10
+            weights[(row + row_step, column)] = -4
+            weights[(row, column + column_step)] = -4
+        _SQUARE_WEIGHTS[size] = weights
+    return _SQUARE_WEIGHTS[size]
+
+def evaluate(board) -> int:
+    """Function who return the heuristic score of the board for the player 'board.player'.
+
+    The score counts the mobility and the weighted corner cells.
+
+    board: a reversi Board
+    """
+    player = board.player
+    score = 5 * (len(board.legal_moves(player)) - len(board.legal_moves(1 - player)))
+    for (row, column), weight in square_weights(board.boardsize).items():
+        cell = board.get_cell(row, column)
+        if cell is not None:
+            score += weight if cell == player else -weight
+    return score
+
+def final_score(board) -> int:
+    """Function who return the score of a finished game for the player 'board.player'.
+
+    board: a reversi Board
+    """
+    count = board.nb_of_pawn_by_color()
+    difference = count[board.player] - count[1 - board.player]
+    if difference > 0:
+        return WIN_SCORE + difference
+    if difference < 0:
+        return -WIN_SCORE + difference
+    return 0
+
+class RandomPlayer():
+    """Computer player who plays a random possible move.
+
+    seed: optional seed of the random generator
+    """
+
+    def __init__(self, seed=None) -> None:
+        self.generator = random.Random(seed)
+
+    def choose_move(self, board):
+        """Function who return a random move for the player 'board.player'.
+
+        board: the reversi Board of the game, it is not modified
+        """
+        moves = board.legal_moves()
+        return self.generator.choice(moves) if moves else None
+
+class AlphaBetaPlayer():
+    """Computer player who search the best move with a negamax alpha-beta search.
+
+    The search is done by iterative deepening until the time budget is over, the moves
+    are ordered with the best move of the previous iteration (or of the transposition
+    table) first, then the corners.
+
+    With 'endgame_empties' empty cells or less, the player first tries to solve the game
+    exactly with an EndgameSolver during half of its time budget.
+
+    time_limit: the time budget of a move in seconds
+    max_depth: the maximal depth of the search
+    table: the TranspositionTable of the player, a new 16 MB table by default
+    endgame_empties: number of empty cells from which the endgame solver is used, 0 to never use it
+    symmetric: if true, the positions are stored in the table with their canonical key
+    (see 'symmetry.canonical_key'), the symmetric positions share one entry
+    evaluator: optional object with a method 'evaluate(board)' used instead of the function
+    'evaluate', like 'pattern.PatternEvaluator'
+    """
+
+    def __init__(self, time_limit: float = 1.0, max_depth: int = 64, table=None,
+                 endgame_empties: int = 12, symmetric: bool = False, evaluator=None) -> None:
+        assert time_limit > 0
+        assert max_depth >= 1
+
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.table = TranspositionTable() if table is None else table
+        self.endgame_empties = endgame_empties
+        self.symmetric = symmetric
+        self.evaluate = evaluate if evaluator is None else evaluator.evaluate
+        self.solvers = {}
+        self.nodes = 0
+        self.deadline = None
+        self.last_result = None
+
+    def choose_move(self, board):
+        """Function who return the move chosen for the player 'board.player'.
+
+        board: the reversi Board of the game, it is not modified
+        """
+        self.last_result = self.search(board.copy())
+        return self.last_result.move
+
+    def order_moves(self, board, moves: list, first=None) -> list:
+        """Function who return the moves sorted: 'first', then the corners, then the
+        other cells by weight.
+
+        board: the reversi Board
+        moves: list of the possible moves
+        first: optional move to search first
+        """
+        weights = square_weights(board.boardsize)
+        moves = sorted(moves, key=lambda cord: -weights.get(cord, 0))
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def out_of_time(self) -> bool:
+        """Function who return true when the search have to stop, checked every 64 nodes."""
+        return time.perf_counter() > self.deadline
+
+    def can_start_depth(self, start: float) -> bool:
+        """Function who return true when the search can start a new depth, false when
+        more than half of the time is used: the next depth would not end in time.
+
+        start: the start of the search, as a time.perf_counter() value
+        """
+        return time.perf_counter() - start < (self.deadline - start) / 2
+
+    def search(self, board) -> SearchResult:
+        """Function who return the SearchResult of the iterative deepening search.
+
+        board: the reversi Board to search, it is restored at the end of the search
+        """
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit
+        self.nodes = 0
+
+        moves = board.legal_moves()
+        if not moves:
+            return SearchResult(None, 0, 0, 0, 0.0)
+
+        nb_empty = board.boardsize * board.boardsize - sum(board.nb_of_pawn_by_color())
+        if nb_empty <= self.endgame_empties:
+            if board.boardsize not in self.solvers:
+                self.solvers[board.boardsize] = EndgameSolver(board.boardsize)
+            solver = self.solvers[board.boardsize]
+            try:
+                result = solver.solve(board, self.time_limit / 2)
+            except SolveTimeout:
+                self.nodes += solver.nodes
+            else:
+                score = result.score
+                if score:
+                    score += WIN_SCORE if score > 0 else -WIN_SCORE
+                return SearchResult(result.move, score, nb_empty, result.nodes,
+                                    time.perf_counter() - start)
+
+        best_move, best_score, completed_depth = moves[0], 0, 0
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best_move, best_score = self.search_root(board, moves, depth, best_move)
+            except SearchTimeout:
+                break
+            completed_depth = depth
+            if depth >= nb_empty or abs(best_score) >= WIN_SCORE \
+                    or not self.can_start_depth(start):
+                break
+        return SearchResult(best_move, best_score, completed_depth, self.nodes,
+                            time.perf_counter() - start)
+
+    def search_root(self, board, moves: list, depth: int, first) -> tuple:
+        """Function who return the (move, score) of the best move at depth 'depth'.
+
+        board: the reversi Board
+        moves: list of the possible moves
+        depth: the depth of the search
+        first: the best move of the previous iteration
+        """
+        alpha, beta = -2 * WIN_SCORE, 2 * WIN_SCORE
+        best_move = None
+        for cord in self.order_moves(board, moves, first):
+            record = board.make_move(cord)
+            try:
+                score = -self.negamax(board, depth - 1, -beta, -alpha)
+            finally:
+                board.unmake_move(record)
+            if best_move is None or score > alpha:
+                best_move, alpha = cord, score
+        return best_move, alpha
+
+    def negamax(self, board, depth: int, alpha: int, beta: int) -> int:
+        """Recursive function who return the score of the board for the player 'board.player'.
+
+        board: the reversi Board
+        depth: the remaining depth
+        alpha: the lower bound of the search window
+        beta: the upper bound of the search window
+        """
+        self.nodes += 1
+        if self.nodes & 63 == 0 and self.out_of_time():
+            raise SearchTimeout
+
+        moves = board.legal_moves()
+        if not moves:
+            if not board.legal_moves(1 - board.player):
+                return final_score(board)
+            record = board.make_move(None)
+            try:
+                return -self.negamax(board, depth, -beta, -alpha)
+            finally:
+                board.unmake_move(record)
+
+        if depth <= 0:
+            return self.evaluate(board)
+
+        if self.symmetric:
+            key, transform = canonical_key(board)
+        else:
+            key, transform = board.position_key(), 0
+        entry = self.table.probe(key)
+        table_move = None
+        if entry is not None:
+            move, entry_depth, flag, score = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+            if move >= 0:
+                table_move = transform_cord(divmod(move, board.boardsize), board.boardsize,
+                                            INVERSE_TRANSFORMS[transform])
+
+        original_alpha = alpha
+        best_move = None
+        best_score = -2 * WIN_SCORE
+        for cord in self.order_moves(board, moves, table_move):
+            record = board.make_move(cord)
+            try:
+                score = -self.negamax(board, depth - 1, -beta, -alpha)
+            finally:
+                board.unmake_move(record)
+            if score > best_score:
+                best_score, best_move = score, cord
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        row, column = transform_cord(best_move, board.boardsize, transform)
+        self.table.store(key, row * board.boardsize + column, depth, flag, best_score)
+        return best_score
@@ -0,0 +1,316 @@
+"""Reversi load test file
+
+The load test starts a 'server.GameServer' in a process of its own and plays matches on
+it with bots: asyncio clients who speak the protocol of the 'protocol' module, like a
+'clientserver.ClientServeur', and play random moves. Each bot plays games until the end
+of its stage, the number of concurrent matches grows from a stage to the next one.
+
+For each stage the report gives the games and moves played, the moves per second, the
+percentiles of the round trip of a move (from the send of a move of a bot to the
+reception of the move of its opponent, without the think time of the opponent), the
+CPU use and the peak resident memory of the server with its growth by match since the
+start of the server (read in /proc, None on the systems without it) and the CPU use of
+the bots. When the bots use all their CPU, the measures are limited
+by the bots rather than by the server.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import signal
+import subprocess
+import sys
+import time
+
+import protocol
+from protocol import END, MOVE, PASS, START, FrameDecoder, ProtocolError, PASS_FRAME, encode
+from riversi import BitBoard
+
+def process_usage(pid: int):
+    """Function who return (CPU seconds, resident memory in bytes) of the process 'pid',
+    None when /proc can not be read.
+
+    pid: the process id
+    """
+    try:
+        with open(f'/proc/{pid}/stat', encoding='ascii') as file:
+            fields = file.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/status', encoding='ascii') as file:
+            rss = next(int(line.split()[1]) * 1024 for line in file if line.startswith('VmRSS'))
+    except (OSError, StopIteration):
+        return None
+    # utime and stime are the fields 14 and 15 of the stat file
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK'), rss
+
+def percentiles(values: list) -> dict:
+    """Function who return the {'p50', 'p95', 'p99', 'max'} of 'values' in milliseconds.
+
+    values: list of times in seconds
+    """
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    values = sorted(values)
+
+    def rank(fraction):
+        return values[min(len(values) - 1, int(fraction * len(values)))] * 1000
+
+    return {'p50': rank(0.5), 'p95': rank(0.95), 'p99': rank(0.99), 'max': values[-1] * 1000}
+
+class StageStats():
+    """Measures of the bots of a stage."""
+
+    def __init__(self) -> None:
+        self.games = 0
+        self.moves = 0
+        self.errors = 0
+        self.ends = {}  # number of games by end reason
+        self.round_trips = []
+
+async def play_bot(host: str, port: int, size: int, generator, stats: StageStats,
+                   think_time: float = 0.0, start_deadline=None):
+    """Coroutine who play one game on the server with random moves.
+
+    host: the address of the server
+    port: the port of the players
+    size: the size of the board of the server
+    generator: the random Generator of the moves
+    stats: the StageStats where the game is counted
+    think_time: the time waited before each move, in seconds
+    start_deadline: None, or the time of the event loop after which the bot leaves if
+    its game has not started, when there is no more bot to play with it
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats.errors += 1
+        await asyncio.sleep(0.1)
+        return
+    decoder = FrameDecoder(256)
+    board = BitBoard(size)
+    color = None
+    sent_at = None
+    try:
+        while True:
+            if color is None and start_deadline is not None:
+                try:
+                    data = await asyncio.wait_for(reader.read(4096),
+                                                  max(start_deadline - loop.time(), 0.1))
+                except asyncio.TimeoutError:
+                    return
+            else:
+                data = await reader.read(4096)
+            if not data:
+                stats.errors += 1
+                return
+            decoder.feed(data)
+            for kind, fields in decoder.frames():
+                if kind == START:
+                    color = fields[0]
+                elif kind in (MOVE, PASS):
+                    board.make_move(fields if kind == MOVE else None)
+                    if sent_at is not None:
+                        stats.round_trips.append(time.perf_counter() - sent_at - think_time)
+                        sent_at = None
+                elif kind == protocol.PING:
+                    writer.write(encode(protocol.PONG, *fields))
+                elif kind == END:
+                    reason = protocol.REASONS[fields[0]]
+                    stats.ends[reason] = stats.ends.get(reason, 0) + 1
+                    # both players receive END, the game is counted by black
+                    stats.games += color == 0
+                    return
+            if color is not None and board.player == color:
+                moves = board.legal_moves()
+                if not moves and not board.legal_moves(1 - color):
+                    continue  # the END of the server comes
+                if think_time:
+                    await asyncio.sleep(think_time)
+                cord = generator.choice(moves) if moves else None
+                writer.write(PASS_FRAME if cord is None else encode(MOVE, *cord))
+                board.make_move(cord)
+                stats.moves += 1
+                sent_at = time.perf_counter()
+    except (OSError, ProtocolError):
+        stats.errors += 1
+    finally:
+        writer.close()
+
+async def run_stage(host: str, port: int, size: int, matches: int, duration: float,
+                    think_time: float = 0.0, server_pid=None, seed: int = 0) -> dict:
+    """Coroutine who play 'matches' concurrent matches during 'duration' seconds and
+    return the report of the stage.
+
+    host: the address of the server
+    port: the port of the players
+    size: the size of the board of the server
+    matches: the number of concurrent matches, there are two bots by match
+    duration: the time after which the bots do not start new games, in seconds
+    think_time: the time waited by a bot before each move, in seconds
+    server_pid: None, or the process id of the server for its CPU and memory
+    seed: the seed of the random moves
+    """
+    stats = StageStats()
+    loop = asyncio.get_running_loop()
+    end = loop.time() + duration
+    generator = random.Random(seed)
+    memory = []
+
+    async def bot():
+        while loop.time() < end:
+            await play_bot(host, port, size, generator, stats, think_time, end + 1)
+
+    async def sample_memory():
+        while True:
+            usage = process_usage(server_pid)
+            if usage is not None:
+                memory.append(usage[1])
+            await asyncio.sleep(0.2)
+
+    server_start = process_usage(server_pid) if server_pid is not None else None
+    bots_start = os.times()
+    start = time.perf_counter()
+    sampler = asyncio.create_task(sample_memory()) if server_start is not None else None
+    await asyncio.gather(*(bot() for _ in range(2 * matches)))
+    elapsed = time.perf_counter() - start
+    bots_end = os.times()
+    if sampler is not None:
+        sampler.cancel()
+
+    report = {
+        'matches': matches,
+        'bots': 2 * matches,
+        'elapsed': elapsed,
+        'games': stats.games,
+        'moves': stats.moves,
+        'moves_per_second': stats.moves / elapsed,
+        'round_trip_ms': percentiles(stats.round_trips),
+        'errors': stats.errors,
+        'ends': stats.ends,
+        'bots_cpu_percent': 100 * (bots_end.user + bots_end.system - bots_start.user
+                                   - bots_start.system) / elapsed,
+        'server_cpu_percent': None,
+        'server_rss_bytes': None,
+    }
+    server_end = process_usage(server_pid) if server_pid is not None else None
+    if server_start is not None and server_end is not None:
+        report['server_cpu_percent'] = 100 * (server_end[0] - server_start[0]) / elapsed
+        report['server_rss_bytes'] = max(memory + [server_end[1]])
+    return report
+
+def start_server(size: int, idle_timeout: float, server_args=()) -> tuple:
+    """Function who start 'server.py' on a free port of localhost and return
+    (process, port).
+
+    size: the size of the board
+    idle_timeout: the time given to a player for a move
+    server_args: other arguments of server.py, like '--profile'
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+    process = subprocess.Popen([sys.executable, '-u', path, '--host', '127.0.0.1', '--port', '0',
+                                '--size', str(size), '--idle-timeout', str(idle_timeout),
+                                *server_args], stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('Start server on port'):
+        process.kill()
+        raise RuntimeError(f"the server did not start: {line!r}")
+    return process, int(line.split()[4].rstrip('.'))
+
+def stop_server(process):
+    """Procedure who stop the server started by 'start_server' like with Ctrl+C."""
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def raise_file_limit(nb_files: int):
+    """Procedure who raise the limit of open files of the process to 'nb_files' if the
+    system allows it, each bot has a socket."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < nb_files:
+        wanted = nb_files if hard == resource.RLIM_INFINITY else min(nb_files, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+def load_test(ramp: list, duration: float = 10.0, size: int = 8, think_time: float = 0.0,
+              idle_timeout: float = 30.0, server_args=(), host=None, port=None,
+              seed: int = 0) -> dict:
+    """Function who run a stage for each number of concurrent matches of 'ramp' and
+    return the report {'settings', 'server_idle_rss_bytes', 'stages'}.
+
+    ramp: the list of the numbers of concurrent matches of the stages
+    duration: the duration of a stage in seconds
+    size: the size of the board
+    think_time: the time waited by a bot before each move, in seconds
+    idle_timeout: the time given to a player for a move by the server
+    server_args: other arguments of server.py
+    host, port: the address of a running server, by default a server is started
+    seed: the seed of the random moves
+    """
+    raise_file_limit(2 * max(ramp) + 64)
+    process = None
+    if port is None:
+        process, port = start_server(size, idle_timeout, server_args)
+        host = '127.0.0.1'
+    server_pid = process.pid if process is not None else None
+    try:
+        idle = process_usage(server_pid) if server_pid is not None else None
+        stages = []
+        for stage, matches in enumerate(ramp):
+            report = asyncio.run(run_stage(host, port, size, matches, duration, think_time,
+                                           server_pid, seed + stage))
+            if idle is not None and report['server_rss_bytes'] is not None:
+                report['server_bytes_per_match'] = (report['server_rss_bytes'] - idle[1]) / matches
+            stages.append(report)
+    finally:
+        if process is not None:
+            stop_server(process)
+    return {
+        'settings': {'ramp': ramp, 'duration': duration, 'size': size, 'think_time': think_time,
+                     'idle_timeout': idle_timeout, 'seed': seed},
+        'server_idle_rss_bytes': idle[1] if idle is not None else None,
+        'stages': stages,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play bot matches on a game server with a "
+                                                 "growing number of concurrent matches.")
+    parser.add_argument('--ramp', default='1,10,100,500',
+                        help="numbers of concurrent matches of the stages, comma separated")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds by stage")
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--think', type=float, default=0.0, help="think time of the bots")
+    parser.add_argument('--idle-timeout', type=float, default=30.0)
+    parser.add_argument('--connect', default=None,
+                        help="HOST:PORT of a running server, a server is started by default")
+    parser.add_argument('--server-profile', default=None,
+                        help="JSON file of the profiler of the started server")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help="JSON file of the report")
+    args = parser.parse_args()
+
+    server_host = server_port = None
+    if args.connect is not None:
+        server_host, _, server_port = args.connect.rpartition(':')
+        server_port = int(server_port)
+    extra_args = ('--profile', args.server_profile) if args.server_profile else ()
+    result = load_test([int(matches) for matches in args.ramp.split(',')], args.duration,
+                       args.size, args.think, args.idle_timeout, extra_args, server_host,
+                       server_port, args.seed)
+
+    for stage_report in result['stages']:
+        round_trip = stage_report['round_trip_ms']
+        server_cpu = stage_report['server_cpu_percent']
+        print(f"{stage_report['matches']:5d} matches: {stage_report['moves_per_second']:8.0f} "
+              f"moves/s, round trip p50 {round_trip['p50'] or 0:.2f} ms "
+              f"p95 {round_trip['p95'] or 0:.2f} ms p99 {round_trip['p99'] or 0:.2f} ms, "
+              f"server CPU {'-' if server_cpu is None else f'{server_cpu:.0f}%'}, "
+              f"bots CPU {stage_report['bots_cpu_percent']:.0f}%, "
+              f"{stage_report['errors']} errors")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(result, json_file, indent=2)
@@ -0,0 +1,309 @@
+"""Reversi Monte Carlo tree search file"""
+
+import argparse
+import math
+import random
+import sys
+import time
+
+from riversi import BitBoard
+
+try:
+    import numpy as np
+    from batch import BatchBoards
+except ImportError:  # the playouts are played one by one without numpy
+    np = None
+
+class Node():
+    """A position of the search tree.
+
+    move: the move who leads to the node from its parent, None for a pass
+    parent: the parent Node, None for the root
+    player: the player to move in the position
+    key: the 'position_key' of the position
+    untried: list of the moves without child node, None until the node is expanded
+    """
+
+    __slots__ = ('move', 'parent', 'player', 'key', 'untried', 'children', 'visits', 'value')
+
+    def __init__(self, move, parent, player: int, key: int) -> None:
+        self.move = move
+        self.parent = parent
+        self.player = player
+        self.key = key
+        self.untried = None
+        self.children = []
+        self.visits = 0
+        self.value = 0.0  # sum of the results for the player who played 'move'
+
+# estimation of the memory of a node with its lists
+NODE_BYTES = sys.getsizeof(Node(None, None, 0, 0)) + 2 * sys.getsizeof([]) + 16
+
+class MCTSPlayer():
+    """Computer player who search the best move with a Monte Carlo tree search.
+
+    The children are selected with UCT. Each iteration selects 'leaves_per_batch'
+    leaves (the selected nodes get a virtual loss so that the next selections go
+    elsewhere) and plays 'playouts_per_leaf' random games from each leaf, all at the same
+    time with 'batch.BatchBoards'. Without NumPy or on a board of more than 64 cells,
+    the random games are played one after the other on a BitBoard, so the number of
+    leaves and of games of an iteration is sized from the measured speed of the games
+    and the remaining time (see 'batch_shape'). At least one iteration is done for each
+    move.
+    The tree of the last search is kept for the next move when the position of the next
+    move is in it.
+
+    time_limit: the time budget of a move in seconds
+    max_iterations: optional maximal number of iterations
+    max_nodes: the maximal number of nodes of the tree
+    max_memory_mb: the maximal estimated memory of the tree in megabytes
+    exploration: the exploration constant of UCT
+    leaves_per_batch: the number of leaves of an iteration
+    playouts_per_leaf: the number of random games from each leaf
+    seed: optional seed of the random moves
+    """
+
+    def __init__(self, time_limit: float = 1.0, max_iterations=None, max_nodes: int = 1000000,
+                 max_memory_mb: float = 256, exploration: float = 1.4,
+                 leaves_per_batch: int = 32, playouts_per_leaf: int = 16, seed=None) -> None:
+        assert time_limit > 0
+        assert leaves_per_batch >= 1 and playouts_per_leaf >= 1
+
+        self.time_limit = time_limit
+        self.max_iterations = max_iterations
+        self.max_nodes = min(max_nodes, int(max_memory_mb * 2 ** 20 / NODE_BYTES))
+        self.exploration = exploration
+        self.leaves_per_batch = leaves_per_batch
+        self.playouts_per_leaf = playouts_per_leaf
+        self.generator = random.Random(seed)
+        self.numpy_generator = np.random.default_rng(seed) if np is not None else None
+        self.batches = {}
+        self.playout_rates = {}  # random games per second one by one, by size of board
+        self.root = None
+        self.nb_nodes = 0
+        self.last_stats = None
+
+    def choose_move(self, board):
+        """Function who return the move chosen for the player 'board.player'.
+
+        board: the reversi Board of the game, it is not modified
+        """
+        search_board = BitBoard(board.boardsize)
+        search_board.set_position(*board.position_masks(), board.player)
+        search_board.turn_pass = board.turn_pass
+        if not search_board.legal_moves():
+            return None
+
+        start = time.perf_counter()
+        reused = self.reuse_tree(search_board)
+        root = self.root
+        iterations = playouts = 0
+        while not root.children or (
+                time.perf_counter() - start < self.time_limit
+                and (self.max_iterations is None or iterations < self.max_iterations)):
+            nb_nodes = self.nb_nodes
+            remaining = start + self.time_limit - time.perf_counter()
+            playouts += self.iterate(search_board,
+                                     *self.batch_shape(search_board.boardsize, remaining))
+            iterations += 1
+            if not root.children and self.nb_nodes == nb_nodes:
+                break  # the tree is full, the root can not be expanded
+        elapsed = time.perf_counter() - start
+
+        if not root.children:
+            self.root = None
+            return self.generator.choice(search_board.legal_moves())
+        best = max(root.children, key=lambda child: child.visits)
+        self.last_stats = {
+            'iterations': iterations,
+            'playouts': playouts,
+            'playouts_per_second': playouts / elapsed if elapsed else 0.0,
+            'elapsed': elapsed,
+            'tree_nodes': self.nb_nodes,
+            'reused_nodes': reused,
+            'memory_bytes': self.nb_nodes * NODE_BYTES,
+            'root_visits': root.visits,
+            'best_visits': best.visits,
+            'best_score': best.value / best.visits if best.visits else 0.0,
+        }
+        self.root = best
+        return best.move
+
+    def reuse_tree(self, board) -> int:
+        """Function who find the position of 'board' in the children and grandchildren
+        of the last root, make it the new root and return its number of nodes.
+
+        board: the BitBoard of the search
+        """
+        key = board.position_key()
+        if self.root is not None:
+            for node in [self.root] + self.root.children:
+                for child in [node] + node.children:
+                    if child.key == key:
+                        child.parent = None
+                        child.move = None
+                        self.root = child
+                        self.nb_nodes = count_nodes(child)
+                        return self.nb_nodes
+        self.root = Node(None, None, board.player, key)
+        self.nb_nodes = 1
+        return 0
+
+    def select(self, board, records: list) -> Node:
+        """Function who go down the tree from the root with UCT until a node who is not
+        expanded or who has untried moves, play the moves on 'board' and return the leaf.
+        A new child is added to the leaf when the tree is not full.
+
+        board: the BitBoard of the root position, the moves are played on it
+        records: list where the MoveRecord of each move played is added
+        """
+        node = self.root
+        while True:
+            if node.untried is None:
+                moves = board.legal_moves()
+                if not moves and board.legal_moves(1 - board.player):
+                    moves = [None]
+                node.untried = moves
+            if node.untried and self.nb_nodes < self.max_nodes:
+                move = node.untried.pop(self.generator.randrange(len(node.untried)))
+                records.append(board.make_move(move))
+                child = Node(move, node, board.player, board.position_key())
+                node.children.append(child)
+                self.nb_nodes += 1
+                return child
+            if not node.children:
+                return node
+
+            log_visits = math.log(node.visits)
+            exploration = self.exploration
+            node = max(node.children, key=lambda child: (
+                child.value / child.visits
+                + exploration * math.sqrt(log_visits / child.visits)))
+            records.append(board.make_move(node.move))
+
+    def iterate(self, board, nb_leaves: int, count: int) -> int:
+        """Function who do one iteration of the search and return its number of playouts.
+
+        board: the BitBoard of the root position, it is restored at the end
+        nb_leaves: the number of leaves selected
+        count: the number of random games from each leaf
+        """
+        leaves = []
+        for _ in range(nb_leaves):
+            records = []
+            leaf = self.select(board, records)
+            leaves.append((leaf, board.position_masks(), board.player))
+            node = leaf
+            while node is not None:
+                node.visits += count  # virtual loss until the results
+                node = node.parent
+            for record in reversed(records):
+                board.unmake_move(record)
+
+        results = self.playouts(board.boardsize, leaves, count)
+        for (leaf, _, _), black_wins in zip(leaves, results):
+            node = leaf
+            while node.parent is not None:
+                wins = black_wins if node.parent.player == 0 else count - black_wins
+                node.value += wins
+                node = node.parent
+        return nb_leaves * count
+
+    def batched(self, size: int) -> bool:
+        """Function who return true when the random games are played together with
+        'batch.BatchBoards' on the boards of size 'size'."""
+        return np is not None and size * size <= 64
+
+    def batch_shape(self, size: int, remaining: float) -> tuple:
+        """Function who return the (number of leaves, random games by leaf) of the next
+        iteration. The batched games use 'leaves_per_batch' and 'playouts_per_leaf', the
+        games one by one are limited to the half of the remaining time at their measured
+        speed, and to a single game while the speed is not known.
+
+        size: the size of the board
+        remaining: the remaining time of the search in seconds
+        """
+        if self.batched(size):
+            return self.leaves_per_batch, self.playouts_per_leaf
+        rate = self.playout_rates.get(size)
+        if rate is None:
+            return 1, 1
+        nb_games = int(rate * remaining / 2)
+        nb_leaves = max(1, min(self.leaves_per_batch, nb_games // self.playouts_per_leaf))
+        return nb_leaves, max(1, min(self.playouts_per_leaf, nb_games // nb_leaves))
+
+    def playouts(self, size: int, leaves: list, count: int) -> list:
+        """Function who play the random games of the leaves and return for each leaf the
+        number of games won by black (a draw counts a half).
+
+        size: the size of the board
+        leaves: list of (leaf, masks, player to move) of the leaves
+        count: the number of random games from each leaf
+        """
+        if self.batched(size):
+            nb_boards = len(leaves) * count
+            if nb_boards not in self.batches:
+                self.batches[nb_boards] = BatchBoards(nb_boards, size)
+            batch = self.batches[nb_boards]
+            batch.load([masks[0] for _, masks, _ in leaves for _ in range(count)],
+                       [masks[1] for _, masks, _ in leaves for _ in range(count)],
+                       [player for _, _, player in leaves for _ in range(count)])
+            batch.play_random(self.numpy_generator)
+            black, white = batch.counts()
+            scores = ((black > white) + 0.5 * (black == white)).reshape(len(leaves), count)
+            return scores.sum(axis=1).tolist()
+
+        results = []
+        board = BitBoard(size)
+        start = time.perf_counter()
+        for _, masks, player in leaves:
+            black_wins = 0.0
+            for _ in range(count):
+                board.set_position(*masks, player)
+                black, white = random_game(board, self.generator)
+                black_wins += 1.0 if black > white else 0.5 if black == white else 0.0
+            results.append(black_wins)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self.playout_rates[size] = len(leaves) * count / elapsed
+        return results
+
+def random_game(board, generator) -> tuple:
+    """Function who play random moves on 'board' until the end and return the number of
+    (black, white) pawns.
+
+    board: a reversi Board
+    generator: a random.Random
+    """
+    while True:
+        moves = board.legal_moves()
+        if not moves:
+            if not board.legal_moves(1 - board.player):
+                return tuple(board.nb_of_pawn_by_color())
+            board.make_move(None)
+        else:
+            board.make_move(generator.choice(moves))
+
+def count_nodes(root: Node) -> int:
+    """Function who return the number of nodes of the tree of 'root'."""
+    nb_nodes = 0
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        nb_nodes += 1
+        nodes.extend(node.children)
+    return nb_nodes
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Search the start position with MCTS and "
+                                                 "print the statistics of the search.")
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--time', type=float, default=1.0, help="the time of the search")
+    parser.add_argument('--leaves', type=int, default=32, help="the leaves of an iteration")
+    parser.add_argument('--playouts', type=int, default=16, help="the random games by leaf")
+    args = parser.parse_args()
+
+    player = MCTSPlayer(args.time, leaves_per_batch=args.leaves, playouts_per_leaf=args.playouts)
+    print(f"best move: {player.choose_move(BitBoard(args.size))}")
+    for name, stat in player.last_stats.items():
+        print(f"{name}: {stat:.3f}" if isinstance(stat, float) else f"{name}: {stat}")
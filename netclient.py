@@ -0,0 +1,221 @@
+"""Reversi network client file
+
+The network of a graphical client runs in an asyncio event loop in its own thread, so
+the interface never waits for the network. The interface calls 'host', 'connect',
+'send_move', 'wait_move' and 'close', who return at once, and reads the events of the
+network with 'poll', who never blocks (for example from a Kivy Clock callback).
+
+An event is a tuple (kind, value):
+
+- (CONNECTED, (color, size)): the game starts, 'color' is the color of the player
+- (MOVE_RECEIVED, cord): the move (row, column) of the opponent, None for a pass
+- (CLOSED, reason): the connection is closed, 'reason' is one of 'protocol.REASONS':
+  DISCONNECTED when the opponent is gone or cannot be reached, TIMEOUT when the move
+  of the opponent did not come in time, WRONG_MOVE for an unexpected message, or the
+  reason of the END message of a server
+"""
+
+import asyncio
+import queue
+import threading
+
+import protocol
+from protocol import (DISCONNECTED, END, MOVE, PASS, START, TIMEOUT, WRONG_MOVE,
+                      FrameDecoder, ProtocolError, PASS_FRAME, encode)
+
+CONNECTED, MOVE_RECEIVED, CLOSED = 'connected', 'move', 'closed'
+
+class NetworkClient():
+    """Connection of a player with the opponent, run in a thread of its own.
+
+    size: the size of the board of the games
+    connect_timeout: the time to connect and to receive the START message, in seconds
+    move_timeout: the time given to the opponent after 'wait_move', None for no limit
+    check_interval: the time between two checks of 'move_timeout', in seconds
+    """
+
+    def __init__(self, size: int, connect_timeout: float = 10, move_timeout=300,
+                 check_interval: float = 0.5) -> None:
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self.move_timeout = move_timeout
+        self.check_interval = check_interval
+        self.events = queue.Queue()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.task = None
+        self.writer = None
+        self.deadline = None
+
+    def host(self, host: str, port: int = 55555):
+        """Procedure who wait for an opponent on (host, port), the player is black.
+
+        host: the address of the listening socket
+        port: the port of the listening socket
+        """
+        self.start(self.host_game(host, port))
+
+    def connect(self, host: str, port: int = 55555):
+        """Procedure who connect to a host or to a 'server.GameServer', who choose the
+        color of the player.
+
+        host: the ip address of the host
+        port: the port of the host
+        """
+        self.start(self.join_game(host, port))
+
+    def send_move(self, cord):
+        """Procedure who send a move, or a pass if 'cord' is None."""
+        frame = PASS_FRAME if cord is None else encode(MOVE, *cord)
+        self.loop.call_soon_threadsafe(self.write, frame)
+
+    def wait_move(self):
+        """Procedure who start the time of the opponent, stopped by its move."""
+        self.loop.call_soon_threadsafe(self.start_timer)
+
+    def close(self):
+        """Procedure who close the connection, no event comes after it."""
+        self.loop.call_soon_threadsafe(self.stop)
+
+    def poll(self) -> list:
+        """Function who return the list of the events received since the last call."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def start(self, coroutine):
+        """Procedure who close the current connection and run 'coroutine' in the loop."""
+        def run():
+            self.stop()
+            self.task = self.loop.create_task(coroutine)
+        self.loop.call_soon_threadsafe(run)
+
+    def stop(self):
+        """Procedure who cancel the current connection, called in the loop."""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.deadline = None
+
+    def write(self, frame: bytes):
+        """Procedure who send a frame, called in the loop."""
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(frame)
+
+    def start_timer(self):
+        """Procedure who set the deadline of the move of the opponent, called in the loop."""
+        if self.move_timeout is not None:
+            self.deadline = self.loop.time() + self.move_timeout
+
+    async def host_game(self, host: str, port: int):
+        """Coroutine who accept one opponent, send the START message and play."""
+        accepted = self.loop.create_future()
+
+        def accept(reader, writer):
+            if accepted.done():
+                writer.close()
+            else:
+                accepted.set_result((reader, writer))
+
+        try:
+            server = await asyncio.start_server(accept, host, port)
+        except OSError:
+            self.finish(DISCONNECTED)
+            return
+        try:
+            reader, self.writer = await accepted
+        finally:
+            server.close()
+        self.writer.write(encode(START, 1, self.size))
+        self.events.put((CONNECTED, (0, self.size)))
+        await self.read_moves(reader, FrameDecoder())
+
+    async def join_game(self, host: str, port: int):
+        """Coroutine who connect to the host, wait for the START message and play."""
+        decoder = FrameDecoder()
+        try:
+            reader, self.writer = await asyncio.wait_for(asyncio.open_connection(host, port),
+                                                         self.connect_timeout)
+            frames = await asyncio.wait_for(self.read_frames(reader, decoder),
+                                            self.connect_timeout)
+        except (OSError, asyncio.TimeoutError, ProtocolError):
+            self.finish(DISCONNECTED)
+            return
+        kind, fields = frames[0]
+        if kind != START or fields[1] != self.size:
+            self.finish(WRONG_MOVE)
+            return
+        self.events.put((CONNECTED, (fields[0], self.size)))
+        for kind, fields in frames[1:]:
+            if not self.handle_frame(kind, fields):
+                return
+        await self.read_moves(reader, decoder)
+
+    @staticmethod
+    async def read_frames(reader, decoder: FrameDecoder) -> list:
+        """Coroutine who return the list of the first complete messages received."""
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                raise ConnectionError
+            decoder.feed(data)
+            frames = decoder.frames()
+            if frames:
+                return frames
+
+    async def read_moves(self, reader, decoder: FrameDecoder):
+        """Coroutine who put the moves of the opponent in the events until the end of the
+        connection."""
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(reader.read(4096), self.check_interval)
+                except asyncio.TimeoutError:
+                    if self.deadline is not None and self.loop.time() > self.deadline:
+                        self.finish(TIMEOUT)
+                        return
+                    continue
+                if not data:
+                    self.finish(DISCONNECTED)
+                    return
+                decoder.feed(data)
+                for kind, fields in decoder.frames():
+                    if not self.handle_frame(kind, fields):
+                        return
+        except (OSError, ProtocolError):
+            self.finish(DISCONNECTED)
+
+    def handle_frame(self, kind: int, fields) -> bool:
+        """Function who handle a received message and return false at the end of the
+        connection."""
+        if kind == MOVE:
+            self.deadline = None
+            self.events.put((MOVE_RECEIVED, fields))
+        elif kind == PASS:
+            self.deadline = None
+            self.events.put((MOVE_RECEIVED, None))
+        elif kind == protocol.PING:
+            self.write(encode(protocol.PONG, *fields))
+        elif kind == END:
+            self.finish(fields[0])
+            return False
+        else:
+            self.finish(WRONG_MOVE)
+            return False
+        return True
+
+    def finish(self, reason: int):
+        """Procedure who close the connection and put the CLOSED event."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.deadline = None
+        self.task = None
+        self.events.put((CLOSED, reason))
@@ -0,0 +1,371 @@
+"""Reversi parallel search file
+
+The search runs in a pool of worker processes who share one transposition table in a
+'multiprocessing.shared_memory' block, two modes are possible:
+
+- 'lazy' (Lazy SMP): every worker searches the whole position, the helpers try the
+  moves in another order and the workers find the results of the others in the table.
+  The first worker who ends its search stops the others.
+- 'root': the moves of the root are split between the workers at each depth of the
+  iterative deepening, the best move is the best of all the parts.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import struct
+import time
+from multiprocessing import shared_memory
+
+from engine import WIN_SCORE, AlphaBetaPlayer, SearchResult, SearchTimeout
+from riversi import BitBoard
+from transposition import BUCKET_SIZE, ENTRY, TranspositionTable
+
+MODES = ('lazy', 'root')
+
+DATA = struct.Struct('<hbBi')  # the fields of an entry after the key
+
+class SharedTranspositionTable(TranspositionTable):
+    """Transposition table written by several processes at the same time.
+
+    The key of each entry is stored xored with the other fields of the entry: an entry
+    half written by a process while another one reads it does not match its key and
+    is ignored.
+    """
+
+    def probe(self, key: int):
+        offset = (key & self.mask) * BUCKET_SIZE
+        first_key, *first = ENTRY.unpack_from(self.buffer, offset)
+        if first_key ^ self.checksum(first) == key:
+            self.hits += 1
+            return tuple(first)
+        second_key, *second = ENTRY.unpack_from(self.buffer, offset + ENTRY.size)
+        if second_key ^ self.checksum(second) == key:
+            self.hits += 1
+            return tuple(second)
+        self.misses += 1
+        if first_key or second_key:
+            self.collisions += 1
+        return None
+
+    def store(self, key: int, move: int, depth: int, flag: int, score: int):
+        offset = (key & self.mask) * BUCKET_SIZE
+        first_key, *first = ENTRY.unpack_from(self.buffer, offset)
+        checksum = self.checksum((move, depth, flag, score))
+        if first_key ^ self.checksum(first) == key or first_key == 0 or depth >= first[1]:
+            ENTRY.pack_into(self.buffer, offset, key ^ checksum, move, depth, flag, score)
+        else:
+            ENTRY.pack_into(self.buffer, offset + ENTRY.size, key ^ checksum,
+                            move, depth, flag, score)
+        self.stores += 1
+
+    @staticmethod
+    def checksum(fields) -> int:
+        """Function who return the fields (move, depth, flag, score) of an entry as an
+        integer of 8 bytes."""
+        return int.from_bytes(DATA.pack(*fields), 'little')
+
+class HelperPlayer(AlphaBetaPlayer):
+    """AlphaBetaPlayer of a worker process, stopped by the event 'stop'.
+
+    The helper number 'helper' above 0 rotates the moves after the first one so that
+    the workers do not search the same moves at the same time.
+
+    table: the SharedTranspositionTable of the workers
+    stop: the multiprocessing Event who stops the search
+    """
+
+    def __init__(self, table, stop) -> None:
+        super().__init__(table=table)
+        self.stop = stop
+        self.helper = 0
+
+    def out_of_time(self) -> bool:
+        return self.stop.is_set() or super().out_of_time()
+
+    def order_moves(self, board, moves: list, first=None) -> list:
+        moves = super().order_moves(board, moves, first)
+        if self.helper and len(moves) > 2:
+            shift = self.helper % (len(moves) - 1)
+            moves = moves[:1] + moves[1 + shift:] + moves[1:1 + shift]
+        return moves
+
+_WORKER = {}
+
+def init_worker(name: str, stop):
+    """Procedure who prepare a worker process of the pool.
+
+    name: the name of the shared memory of the transposition table
+    stop: the multiprocessing Event who stops the searches
+    """
+    memory = shared_memory.SharedMemory(name)
+    _WORKER['memory'] = memory
+    _WORKER['player'] = HelperPlayer(SharedTranspositionTable(buffer=memory.buf), stop)
+    _WORKER['stop'] = stop
+
+def search_task(task: dict) -> dict:
+    """Function who do the search of 'task' in a worker process and return its result.
+
+    task: dict of the position (black, white, player, size, turn_pass), of the search
+    (time_limit, max_depth, helper) and, for the root mode, of the moves of the worker,
+    the depth and the first move to search (moves, depth, first)
+    """
+    board = BitBoard(task['size'])
+    board.set_position(task['black'], task['white'], task['player'])
+    board.turn_pass = task['turn_pass']
+    player = _WORKER['player']
+    player.time_limit = task['time_limit']
+    player.max_depth = task['max_depth']
+    player.helper = task['helper']
+
+    start = time.perf_counter()
+    if task['moves'] is None:
+        result = player.search(board)
+        if not _WORKER['stop'].is_set():
+            _WORKER['stop'].set()
+        move, score, depth, completed = result.move, result.score, result.depth, True
+    else:
+        player.deadline = start + task['time_limit']
+        player.nodes = 0
+        depth = task['depth']
+        try:
+            move, score = player.search_root(board, task['moves'], depth, task['first'])
+            completed = True
+        except SearchTimeout:
+            move, score, completed = None, 0, False
+    return {'helper': task['helper'], 'worker': os.getpid(), 'move': move, 'score': score,
+            'depth': depth, 'completed': completed, 'nodes': player.nodes,
+            'elapsed': time.perf_counter() - start}
+
+class ParallelPlayer():
+    """Computer player who search the best move in a pool of worker processes.
+
+    The pool and the shared memory live until 'close', the player is also a context
+    manager.
+
+    workers: the number of worker processes, the number of CPU by default
+    time_limit: the time budget of a move in seconds
+    max_depth: the maximal depth of the search
+    table_mb: the size of the shared transposition table in megabytes
+    mode: 'lazy' or 'root', see the documentation of the module
+    """
+
+    def __init__(self, workers: int = None, time_limit: float = 1.0, max_depth: int = 64,
+                 table_mb: float = 64, mode: str = 'lazy') -> None:
+        assert mode in MODES
+        assert time_limit > 0
+        assert max_depth >= 1
+
+        self.workers = workers or os.cpu_count()
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.mode = mode
+        self.memory = shared_memory.SharedMemory(create=True,
+                                                 size=TranspositionTable.table_bytes(table_mb))
+        self.table = SharedTranspositionTable(buffer=self.memory.buf)
+        self.table.clear()
+        self.stop = multiprocessing.Event()
+        self.pool = multiprocessing.Pool(self.workers, init_worker, (self.memory.name, self.stop))
+        self.last_result = None
+        self.last_stats = None
+
+    def choose_move(self, board):
+        """Function who return the move chosen for the player 'board.player'.
+
+        board: the reversi Board of the game, it is not modified
+        """
+        self.last_result = self.search(board)
+        return self.last_result.move
+
+    def search(self, board) -> SearchResult:
+        """Function who return the SearchResult of the parallel search of 'board'.
+
+        board: the reversi Board to search, it is not modified
+        """
+        black, white = board.position_masks()
+        position = {'black': black, 'white': white, 'player': board.player,
+                    'size': board.boardsize, 'turn_pass': board.turn_pass,
+                    'time_limit': self.time_limit, 'max_depth': self.max_depth}
+        start = time.perf_counter()
+        moves = board.legal_moves()
+        if not moves:
+            return SearchResult(None, 0, 0, 0, 0.0)
+        if self.mode == 'lazy':
+            move, score, depth, results = self.search_lazy(position)
+        else:
+            move, score, depth, results = self.search_root_split(board, position, moves, start)
+        elapsed = time.perf_counter() - start
+
+        workers = {}
+        for result in results:
+            worker = workers.setdefault(result['worker'], {'nodes': 0, 'busy': 0.0})
+            worker['nodes'] += result['nodes']
+            worker['busy'] += result['elapsed']
+        for worker in workers.values():
+            worker['nodes_per_second'] = worker['nodes'] / worker['busy'] if worker['busy'] else 0.0
+        nodes = sum(worker['nodes'] for worker in workers.values())
+        self.last_stats = {
+            'mode': self.mode,
+            'depth': depth,
+            'nodes': nodes,
+            'elapsed': elapsed,
+            'nodes_per_second': nodes / elapsed if elapsed else 0.0,
+            'workers': workers,
+        }
+        return SearchResult(move, score, depth, nodes, elapsed)
+
+    def search_lazy(self, position: dict) -> tuple:
+        """Function who search the position with every worker and return (move, score,
+        depth, results of 'search_task'), the move of the deepest search.
+
+        position: dict of the position and of the search, see 'search_task'
+        """
+        self.stop.clear()
+        tasks = [dict(position, helper=helper, moves=None) for helper in range(self.workers)]
+        results = self.pool.map(search_task, tasks, chunksize=1)
+        best = max(results, key=lambda result: (result['depth'], -result['helper']))
+        return best['move'], best['score'], best['depth'], results
+
+    def search_root_split(self, board, position: dict, moves: list, start: float) -> tuple:
+        """Function who search the position by iterative deepening with the moves of the
+        root split between the workers and return (move, score, depth, results of
+        'search_task').
+
+        board: the reversi Board
+        position: dict of the position and of the search, see 'search_task'
+        moves: list of the possible moves
+        start: the start time of the search
+        """
+        self.stop.clear()
+        weights_player = AlphaBetaPlayer(table=self.table)
+        nb_empty = board.boardsize * board.boardsize - sum(board.nb_of_pawn_by_color())
+        best_move, best_score, completed_depth = moves[0], 0, 0
+        all_results = []
+        for depth in range(1, self.max_depth + 1):
+            remaining = self.time_limit - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            ordered = weights_player.order_moves(board, moves, best_move)
+            parts = [ordered[helper::self.workers] for helper in range(self.workers)]
+            tasks = [dict(position, helper=helper, moves=part, depth=depth,
+                          first=best_move, time_limit=remaining)
+                     for helper, part in enumerate(parts) if part]
+            results = self.pool.map(search_task, tasks, chunksize=1)
+            all_results += results
+            if not all(result['completed'] for result in results):
+                break
+            best = max(results, key=lambda result: (result['score'], -result['helper']))
+            best_move, best_score, completed_depth = best['move'], best['score'], depth
+            if depth >= nb_empty or abs(best_score) >= WIN_SCORE:
+                break
+        return best_move, best_score, completed_depth, all_results
+
+    def close(self):
+        """Procedure who stop the workers and free the shared memory."""
+        self.pool.terminate()
+        self.pool.join()
+        self.table.buffer = None
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def benchmark_positions(nb_positions: int = 8, size: int = 8, plies: int = 12,
+                        seed: int = 0) -> list:
+    """Function who return the list of (black, white, player) of positions after 'plies'
+    random moves, the same positions for the same arguments.
+
+    nb_positions: the number of positions
+    size: the size of the board
+    plies: the number of random moves
+    seed: the seed of the random moves
+    """
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < nb_positions:
+        board = BitBoard(size)
+        for _ in range(plies):
+            moves = board.legal_moves()
+            if not moves:
+                break
+            board.make_move(generator.choice(moves))
+        if board.legal_moves():
+            positions.append((*board.position_masks(), board.player))
+    return positions
+
+def benchmark(worker_counts: list, depth: int = 6, mode: str = 'lazy', positions=None,
+              table_mb: float = 64) -> dict:
+    """Function who search the positions to a fixed depth in one process and in
+    parallel, print and return the time, the speedup and the nodes by second.
+
+    The transposition tables are cleared before each position.
+
+    worker_counts: list of the numbers of workers
+    depth: the depth of the searches
+    mode: 'lazy' or 'root'
+    positions: list of (black, white, player), 'benchmark_positions' by default
+    table_mb: the size of the transposition tables in megabytes
+    """
+    positions = benchmark_positions() if positions is None else positions
+    board = BitBoard(8)
+
+    single = AlphaBetaPlayer(3600, depth, TranspositionTable(table_mb))
+    elapsed = nodes = 0
+    for black, white, player in positions:
+        board.set_position(black, white, player)
+        single.table.clear()
+        result = single.search(board)
+        elapsed += result.elapsed
+        nodes += result.nodes
+    report = {'mode': mode, 'depth': depth, 'positions': len(positions),
+              'single': {'elapsed': elapsed, 'nodes': nodes, 'nodes_per_second': nodes / elapsed},
+              'parallel': []}
+    print(f"1 process: {elapsed:.2f} s, {nodes / elapsed:.0f} nodes/s")
+
+    for nb_workers in worker_counts:
+        with ParallelPlayer(nb_workers, 3600, depth, table_mb, mode) as parallel_player:
+            elapsed = nodes = 0
+            workers = {}
+            for black, white, player in positions:
+                board.set_position(black, white, player)
+                parallel_player.table.clear()
+                result = parallel_player.search(board)
+                elapsed += result.elapsed
+                nodes += result.nodes
+                for pid, stats in parallel_player.last_stats['workers'].items():
+                    worker = workers.setdefault(pid, {'nodes': 0, 'busy': 0.0})
+                    worker['nodes'] += stats['nodes']
+                    worker['busy'] += stats['busy']
+        per_worker = [worker['nodes'] / worker['busy'] if worker['busy'] else 0.0
+                      for worker in workers.values()]
+        line = {'workers': nb_workers, 'elapsed': elapsed, 'nodes': nodes,
+                'nodes_per_second': nodes / elapsed,
+                'speedup': report['single']['elapsed'] / elapsed,
+                'nodes_per_second_by_worker': per_worker}
+        report['parallel'].append(line)
+        print(f"{nb_workers} workers: {elapsed:.2f} s, speedup {line['speedup']:.2f}, "
+              f"{line['nodes_per_second']:.0f} nodes/s, by worker "
+              f"{', '.join(f'{speed:.0f}' for speed in per_worker)}")
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the parallel search with the "
+                                                 "search in one process.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--mode', choices=MODES, default='lazy')
+    parser.add_argument('--positions', type=int, default=8)
+    parser.add_argument('--json', default=None, help="file where the report is written")
+    args = parser.parse_args()
+
+    benchmark_report = benchmark(args.workers, args.depth, args.mode,
+                                 benchmark_positions(args.positions))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as report_file:
+            json.dump(benchmark_report, report_file, indent=2)
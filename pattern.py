@@ -0,0 +1,385 @@
+"""Reversi pattern evaluation file
+
+The evaluation of a position is the sum of the weights of its patterns: the edges, the
+3x3 corners and the diagonals of the board (with more than MAX_LINE cells by side, only
+the 8 cells of the edges and of the diagonals from each corner). A pattern of L cells
+is a number in base 3 (0 for an empty cell, 1 for black, 2 for white) who indexes a
+table of 3 ** L weights, and the symmetric instances of a pattern share the same table.
+The game is split in phases by the number of pawns, each phase has its own tables.
+The score is the expected difference of pawns (black - white) at the end of the game.
+
+The indexes of the patterns of a board are updated at each placed or flipped pawn
+('PatternIndexes'), an evaluation is then one table lookup by pattern. The positions
+given as arrays of masks are evaluated all at once with NumPy ('evaluate_masks').
+
+The weights are fitted on recorded games by 'tune': a regularized least squares on the
+final differences of pawns, solved with conjugate gradients on NumPy arrays.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from batch import BatchBoards, popcount
+from record import PASS_MOVE, RecordReader
+from riversi import BitBoard
+from symmetry import NB_TRANSFORMS, transform_cord
+
+MAX_LINE = 10
+
+_PATTERN_TABLES = {}
+
+def pattern_tables(size: int) -> tuple:
+    """Function who return the patterns of the boards of size 'size':
+    (kinds, instances, offsets, nb_features).
+
+    kinds: list of the names of the patterns
+    instances: list of (kind, cells) of the instances of the patterns, 'kind' is the
+    number of the pattern and the cell k of the list 'cells' is the digit 3 ** k
+    offsets: list of the index of the first weight of each pattern in a phase
+    nb_features: the number of weights of a phase
+
+    size: the size of the board
+    """
+    if size not in _PATTERN_TABLES:
+        length = size if size <= MAX_LINE else 8
+        bases = [('edge', [(0, column) for column in range(length)]),
+                 ('corner', [(row, column) for row in range(3) for column in range(3)]),
+                 ('diagonal', [(index, index) for index in range(length)]),
+                 ('bias', [])]
+        kinds, instances, offsets = [], [], []
+        nb_features = 0
+        for kind, (name, cells) in enumerate(bases):
+            kinds.append(name)
+            offsets.append(nb_features)
+            nb_features += 3 ** len(cells)
+            images = []
+            for transform in range(NB_TRANSFORMS):
+                image = [transform_cord(cord, size, transform) for cord in cells]
+                if image not in images:
+                    images.append(image)
+            instances += [(kind, image) for image in images]
+        _PATTERN_TABLES[size] = (kinds, instances, offsets, nb_features)
+    return _PATTERN_TABLES[size]
+
+class PatternIndexes():
+    """Indexes of the patterns of a board in the weights of a phase, updated by the
+    board at each placed and removed pawn (see 'Board.patterns').
+
+    evaluator: the PatternEvaluator
+    board: the reversi Board, its method 'index' gives the cells of the updates
+    """
+
+    def __init__(self, evaluator, board) -> None:
+        self.evaluator = evaluator
+        size = board.boardsize
+        _, instances, offsets, _ = pattern_tables(size)
+        self.bit_cells = [board.index(*divmod(bit, size)) for bit in range(size * size)]
+        self.updates = [()] * (max(self.bit_cells) + 1)  # (instance, power) of each cell
+        for number, (kind, cells) in enumerate(instances):
+            for digit, (row, column) in enumerate(cells):
+                index = board.index(row, column)
+                self.updates[index] = self.updates[index] + ((number, 3 ** digit), )
+        self.starts = [offsets[kind] for kind, _ in instances]
+        self.set_position(*board.position_masks())
+
+    def set_position(self, black: int, white: int):
+        """Procedure who compute the indexes of a position.
+
+        black: the mask of the black pawns
+        white: the mask of the white pawns
+        """
+        self.indexes = list(self.starts)
+        self.nb_pawns = 0
+        for value, mask in ((1, black), (2, white)):
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                for number, power in self.updates[self.bit_cells[bit.bit_length() - 1]]:
+                    self.indexes[number] += value * power
+                self.nb_pawns += 1
+
+    def flip(self, flipped, delta: int):
+        """Procedure who add 'delta' to the digits of the flipped cells.
+
+        flipped: list of the indexes of the cells, or mask of the bits of the cells
+        delta: 1 for the pawns who become white, -1 for the pawns who become black
+        """
+        indexes, updates = self.indexes, self.updates
+        if isinstance(flipped, int):
+            while flipped:
+                bit = flipped & -flipped
+                flipped ^= bit
+                for number, power in updates[bit.bit_length() - 1]:
+                    indexes[number] += delta * power
+        else:
+            for index in flipped:
+                for number, power in updates[index]:
+                    indexes[number] += delta * power
+
+    def place(self, color: int, index: int, flipped):
+        """Procedure who update the indexes after a pawn placed by 'Board.place_pawn'.
+
+        color: the color of the placed pawn
+        index: the index of the cell of the pawn on the board
+        flipped: the flipped pawns, see 'flip'
+        """
+        value = color + 1
+        indexes = self.indexes
+        for number, power in self.updates[index]:
+            indexes[number] += value * power
+        self.flip(flipped, 2 * color - 1)
+        self.nb_pawns += 1
+
+    def remove(self, color: int, index: int, flipped):
+        """Procedure who cancel a 'place'."""
+        value = color + 1
+        indexes = self.indexes
+        for number, power in self.updates[index]:
+            indexes[number] -= value * power
+        self.flip(flipped, 1 - 2 * color)
+        self.nb_pawns -= 1
+
+    def value(self) -> float:
+        """Function who return the score of the position for black."""
+        weights = self.evaluator.tables[self.evaluator.phases[self.nb_pawns]]
+        return sum(map(weights.__getitem__, self.indexes))
+
+class PatternEvaluator():
+    """Evaluation of the positions with pattern weights, it can replace the function
+    'engine.evaluate' of an AlphaBetaPlayer.
+
+    size: the size of the board
+    nb_phases: the number of phases of the game
+    weights: optional array (nb_phases, nb_features) of the weights, 0 by default
+    """
+
+    def __init__(self, size: int = 8, nb_phases: int = 4, weights=None) -> None:
+        _, instances, offsets, nb_features = pattern_tables(size)
+        self.size = size
+        self.nb_phases = nb_phases
+        self.nb_features = nb_features
+        if weights is None:
+            weights = np.zeros((nb_phases, nb_features))
+        self.weights = np.asarray(weights, dtype=np.float64)
+        assert self.weights.shape == (nb_phases, nb_features)
+        self.tables = [phase_weights.tolist() for phase_weights in self.weights]
+        nb_cells = size * size
+        self.phases = [nb_pawns * nb_phases // (nb_cells + 1) for nb_pawns in range(nb_cells + 1)]
+
+        # the digits of the cells of a position times 'projection' give the indexes
+        self.projection = np.zeros((nb_cells, len(instances)), dtype=np.float32)
+        for number, (_, cells) in enumerate(instances):
+            for digit, (row, column) in enumerate(cells):
+                self.projection[row * size + column, number] = 3 ** digit
+        self.starts = np.array([offsets[kind] for kind, _ in instances], dtype=np.int64)
+
+    @classmethod
+    def load(cls, path: str) -> 'PatternEvaluator':
+        """Function who return the evaluator of a weights file written by 'save'."""
+        with np.load(path) as data:
+            return cls(int(data['size']), int(data['nb_phases']), data['weights'])
+
+    def save(self, path: str):
+        """Procedure who write the weights in a NumPy file."""
+        with open(path, 'wb') as file:
+            np.savez(file, size=self.size, nb_phases=self.nb_phases, weights=self.weights)
+
+    def attach(self, board) -> PatternIndexes:
+        """Function who give to 'board' the PatternIndexes of its position and return it.
+
+        board: a reversi Board of size 'size'
+        """
+        assert board.boardsize == self.size
+        board.patterns = PatternIndexes(self, board)
+        return board.patterns
+
+    def evaluate(self, board) -> int:
+        """Function who return the score of the board for the player 'board.player'.
+
+        board: a reversi Board, the indexes are attached to it by the first call
+        """
+        patterns = board.patterns
+        if patterns is None or patterns.evaluator is not self:
+            patterns = self.attach(board)
+        score = round(patterns.value())
+        return score if board.player == 0 else -score
+
+    def features(self, black, white) -> np.ndarray:
+        """Function who return the array (number of positions, number of instances) of
+        the indexes of the weights of the patterns, in 'weights.ravel()'.
+
+        black: array of the masks of the black pawns, the board has 64 cells or less
+        white: array of the masks of the white pawns
+        """
+        if self.size * self.size > 64:
+            raise ValueError("the masks of the positions have at most 64 cells")
+        black = np.asarray(black, dtype=np.uint64)
+        white = np.asarray(white, dtype=np.uint64)
+        nb_cells = self.size * self.size
+        digits = np.unpackbits(black.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1,
+                               bitorder='little')[:, :nb_cells].astype(np.float32)
+        digits += 2 * np.unpackbits(white.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1,
+                                    bitorder='little')[:, :nb_cells]
+
+        # the indexes are below 3 ** MAX_LINE, exact in float32
+        features = (digits @ self.projection).astype(np.int64)
+        phases = np.array(self.phases)[popcount(black | white)]
+        features += self.starts + (phases * self.nb_features)[:, None]
+        return features
+
+    def evaluate_masks(self, black, white) -> np.ndarray:
+        """Function who return the array of the scores for black of the positions.
+
+        black: array of the masks of the black pawns, the board has 64 cells or less
+        white: array of the masks of the white pawns
+        """
+        return self.weights.ravel()[self.features(black, white)].sum(axis=1)
+
+def training_positions(record_paths: list, size: int = 8) -> tuple:
+    """Function who return the arrays (black, white, target) of the positions of the
+    recorded games, 'target' is the final difference of pawns (black - white).
+
+    record_paths: list of the paths of the record files
+    size: the size of the board, the games of other sizes are ignored
+    """
+    black, white, target = [], [], []
+    board = BitBoard(size)
+    start = board.start_position()
+    for record_path in record_paths:
+        with RecordReader(record_path) as reader:
+            for game in reader:
+                if game.size != size:
+                    continue
+                board.set_position(*start, 0)
+                for index in game.moves:
+                    black.append(board.masks[0])
+                    white.append(board.masks[1])
+                    board.make_move(None if index == PASS_MOVE else board.legal_moves()[index])
+                black.append(board.masks[0])
+                white.append(board.masks[1])
+                target += [game.black - game.white] * (len(game.moves) + 1)
+    return (np.array(black, dtype=np.uint64), np.array(white, dtype=np.uint64),
+            np.array(target, dtype=np.float64))
+
+def tune(record_paths: list, size: int = 8, nb_phases: int = 4, iterations: int = 100,
+         ridge: float = 1.0) -> tuple:
+    """Function who fit the weights on recorded games and return (PatternEvaluator,
+    statistics of the fit).
+
+    The weights minimize |A w - target| ** 2 + ridge * |w| ** 2 where the row of A of a
+    position has a 1 for each of its patterns, the conjugate gradients only need the
+    products by A (a sum of weights by row) and by its transpose (a 'bincount').
+
+    record_paths: list of the paths of the record files
+    size: the size of the board
+    nb_phases: the number of phases of the game
+    iterations: the maximal number of iterations of the conjugate gradients
+    ridge: the regularization of the weights, the weights of the patterns who are
+    never seen stay at 0
+    """
+    start = time.perf_counter()
+    black, white, target = training_positions(record_paths, size)
+    evaluator = PatternEvaluator(size, nb_phases)
+    features = evaluator.features(black, white)
+    nb_weights = evaluator.weights.size
+    flat_features = features.ravel()
+
+    def product(weights):
+        return weights[features].sum(axis=1)
+
+    def transposed(residual):
+        return np.bincount(flat_features, weights=np.repeat(residual, features.shape[1]),
+                           minlength=nb_weights)
+
+    weights = np.zeros(nb_weights)
+    residual = target.copy()
+    gradient = transposed(residual)
+    direction = gradient.copy()
+    gamma = gradient @ gradient
+    tolerance = 1e-10 * gamma
+    iteration = 0
+    for iteration in range(1, iterations + 1):
+        if gamma <= tolerance:
+            break
+        step_product = product(direction)
+        alpha = gamma / (step_product @ step_product + ridge * (direction @ direction))
+        weights += alpha * direction
+        residual -= alpha * step_product
+        gradient = transposed(residual) - ridge * weights
+        new_gamma = gradient @ gradient
+        direction = gradient + new_gamma / gamma * direction
+        gamma = new_gamma
+
+    evaluator = PatternEvaluator(size, nb_phases, weights.reshape(nb_phases, -1))
+    return evaluator, {
+        'positions': len(target),
+        'iterations': iteration,
+        'rmse': float(np.sqrt(np.mean(residual ** 2))) if len(target) else 0.0,
+        'baseline_rmse': float(np.sqrt(np.mean(target ** 2))) if len(target) else 0.0,
+        'elapsed': time.perf_counter() - start,
+    }
+
+def benchmark(evaluator: PatternEvaluator, nb_positions: int = 100000, seed: int = 0) -> dict:
+    """Function who evaluate random positions in a batch and one by one with the
+    indexes of a board, print and return the evaluations by second.
+
+    evaluator: the PatternEvaluator
+    nb_positions: the number of positions of the batch
+    seed: the seed of the random moves
+    """
+    batch = BatchBoards(nb_positions, evaluator.size)
+    generator = np.random.default_rng(seed)
+    steps = generator.integers(0, evaluator.size * evaluator.size - 4, nb_positions)
+    for step in range(int(steps.max(initial=0))):
+        moves = batch.update_over()
+        batch.over |= steps <= step
+        batch.play(batch.random_cells(moves, generator))
+    black, white = batch.masks()
+
+    start = time.perf_counter()
+    evaluator.evaluate_masks(black, white)
+    batch_speed = nb_positions / (time.perf_counter() - start)
+
+    board = BitBoard(evaluator.size)
+    patterns = evaluator.attach(board)
+    nb_moves = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < 1:
+        board.set_position(*board.start_position(), 0)
+        while True:
+            moves = board.legal_moves()
+            if not moves:
+                if not board.legal_moves(1 - board.player):
+                    break
+                board.make_move(None)
+                continue
+            board.make_move(moves[nb_moves % len(moves)])
+            patterns.value()
+            nb_moves += 1
+    board_speed = nb_moves / (time.perf_counter() - start)
+    print(f"batch: {batch_speed:.0f} evaluations/s, board: {board_speed:.0f} moves and "
+          f"evaluations/s")
+    return {'batch_per_second': batch_speed, 'board_per_second': board_speed}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fit the pattern weights on record files.")
+    parser.add_argument('path', help="the weights file")
+    parser.add_argument('records', nargs='*', help="the record files, benchmark the "
+                                                   "evaluation of the weights without "
+                                                   "record files")
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--phases', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--ridge', type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.records:
+        tuned, fit = tune(args.records, args.size, args.phases, args.iterations, args.ridge)
+        tuned.save(args.path)
+        print(f"{fit['positions']} positions, {fit['iterations']} iterations, "
+              f"rmse {fit['rmse']:.2f} (without patterns {fit['baseline_rmse']:.2f}) "
+              f"in {fit['elapsed']:.1f} s")
+    else:
+        benchmark(PatternEvaluator.load(args.path))
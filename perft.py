@@ -0,0 +1,92 @@
+"""Reversi move generator benchmark file"""
+
+import argparse
+import sys
+import time
+
+from riversi import BitBoard, BoardWithoutGUI
+
+BACKENDS = {
+    'array': lambda size: BoardWithoutGUI(size),
+    'array-incremental': lambda size: BoardWithoutGUI(size, incremental=True),
+    'bitboard': BitBoard,
+}
+
+# name: (size, black mask, white mask, player to move, counts of depth 1, 2, ...)
+# The counts of 'start-8' are the published ones, the others come from an independent
+# implementation of the rules and agree with every backend.
+POSITIONS = {
+    'start-4': (4, 0x240, 0x420, 0,
+                [4, 12, 44, 128, 424, 1256, 3624, 9116, 20044, 36540, 50704, 57436]),
+    'start-6': (6, 0x108000, 0x204000, 0, [4, 12, 56, 244, 1364, 7604, 47740]),
+    'start-8': (8, 0x810000000, 0x1008000000, 0,
+                [4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288]),
+    'start-10': (10, 0x40200000000000, 0x80100000000000, 0, [4, 12, 56, 244, 1396]),
+    # black has no move, the first move is a pass
+    'pass-8': (8, 0x1018180c0200, 0x81c, 0, [1, 3, 8, 58, 359, 3070]),
+    'middle-8': (8, 0x400068426262, 0x207c142c0800, 0, [12, 161, 1933, 26065, 301264]),
+    'end-8': (8, 0x22b129356865131d, 0x484ed6ca9692ac80, 0,
+              [8, 43, 264, 1238, 5598, 20366, 58447, 135897]),
+}
+
+def perft(board, depth: int) -> int:
+    """Recursive function who return the number of positions at 'depth' moves of the board.
+
+    A pass is a move when the opponent can play, a finished game counts as one position.
+
+    board: a reversi Board, it is restored at the end
+    depth: the number of moves
+    """
+    if depth == 0:
+        return 1
+    moves = board.legal_moves()
+    if not moves:
+        if not board.legal_moves(1 - board.player):
+            return 1
+        moves = [None]
+    elif depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for cord in moves:
+        record = board.make_move(cord)
+        nodes += perft(board, depth - 1)
+        board.unmake_move(record)
+    return nodes
+
+def run(names: list, backends: list, max_depth: int) -> bool:
+    """Function who run perft on the positions 'names' with each backend until 'max_depth',
+    print the counts and the nodes/sec and return true if every count is right.
+
+    names: list of keys of POSITIONS
+    backends: list of keys of BACKENDS
+    max_depth: the maximal depth
+    """
+    success = True
+    print(f"{'position':<10} {'backend':<18} {'depth':>5} {'nodes':>10} {'time (s)':>9} "
+          f"{'nodes/s':>10}")
+    for name in names:
+        size, black, white, player, counts = POSITIONS[name]
+        for backend in backends:
+            board = BACKENDS[backend](size)
+            board.set_position(black, white, player)
+            for depth in range(1, min(max_depth, len(counts)) + 1):
+                start = time.perf_counter()
+                nodes = perft(board, depth)
+                elapsed = time.perf_counter() - start
+                status = '' if nodes == counts[depth - 1] else f" WRONG, expected {counts[depth - 1]}"
+                success = success and not status
+                print(f"{name:<10} {backend:<18} {depth:>5} {nodes:>10} {elapsed:>9.3f} "
+                      f"{nodes / elapsed if elapsed else 0:>10.0f}{status}")
+    return success
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Count the positions at each depth and "
+                                                 "check them with the reference counts.")
+    parser.add_argument('--depth', type=int, default=5, help="the maximal depth")
+    parser.add_argument('--positions', nargs='+', choices=sorted(POSITIONS),
+                        default=sorted(POSITIONS))
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS),
+                        default=sorted(BACKENDS))
+    args = parser.parse_args()
+    sys.exit(0 if run(args.positions, args.backends, args.depth) else 1)
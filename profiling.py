@@ -0,0 +1,508 @@
+"""Reversi profiling file
+
+A Profiler measures the functions of the game without change of their code: 'enable'
+replaces each function of the targets by a wrapper who times its calls, 'disable' puts
+the original functions back. A disabled profiler costs nothing, the functions are the
+original ones.
+
+A target is 'module:Class.function' or 'module:function'. For each function the
+profiler keeps the number of calls, the cumulated time and a reservoir of call times
+for the percentiles. The functions who return an object with a 'nodes' attribute (like
+'engine.SearchResult') also give the number of positions searched per second.
+
+With 'connections', each connection of a 'server.GameServer' (players and spectators)
+counts its bytes and its messages in both directions until it is closed. The closed
+connections are added to totals, only the last 'max_closed' ones are kept one by one,
+so the memory of the profiler of a long running server does not grow.
+
+'report' returns the measures as a dict, 'dump_json' writes it and 'dump_trace' writes
+the calls as a Chrome trace-event file (with 'trace'), to open in chrome://tracing or
+Perfetto.
+"""
+
+import argparse
+import collections
+import functools
+import importlib
+import inspect
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from protocol import HEADER
+
+DEFAULT_TARGETS = (
+    'riversi:Board.is_possible_play',
+    'riversi:Board.add_next_move',
+    'riversi:Board.add_move_at',
+    'riversi:Board.next_move',
+    'riversi:Board.place_pawn',
+    'riversi:Board.legal_moves',
+    'riversi:Board.make_move',
+    'riversi:BitBoard.is_possible_play',
+    'riversi:BitBoard.next_move',
+    'riversi:BitBoard.place_pawn',
+    'riversi:BitBoard.legal_moves',
+    'riversi:BitBoard.make_move',
+    'engine:AlphaBetaPlayer.search',
+    'endgame:EndgameSolver.solve_masks',
+    'clientserver:ClientServeur.handle_connection',
+    'clientserver:BoardWithoutGUIClientServer.handle_connection',
+    'server:GameServer.handle_client',
+    'server:Connection.read_loop',
+    'server:Connection.write_loop',
+    'server:Match.run',
+)
+
+# the totals of the closed connections
+CLOSED_TOTALS = ('connections', 'bytes_in', 'bytes_out', 'messages_in', 'messages_out',
+                 'seconds')
+
+class FunctionStats():
+    """Measures of the calls of a function.
+
+    name: the name of the function
+    max_samples: the size of the reservoir of call times used for the percentiles
+    """
+
+    __slots__ = ('name', 'calls', 'total', 'maximum', 'nodes', 'samples', 'max_samples')
+
+    def __init__(self, name: str, max_samples: int) -> None:
+        self.name = name
+        self.calls = 0
+        self.total = 0  # nanoseconds
+        self.maximum = 0
+        self.nodes = 0
+        self.samples = []
+        self.max_samples = max_samples
+
+    def add(self, duration: int):
+        """Procedure who add a call of 'duration' nanoseconds."""
+        self.calls += 1
+        self.total += duration
+        if duration > self.maximum:
+            self.maximum = duration
+        if len(self.samples) < self.max_samples:
+            self.samples.append(duration)
+        else:
+            # reservoir sampling: each call has the same chance to be in the samples
+            index = random.randrange(self.calls)
+            if index < self.max_samples:
+                self.samples[index] = duration
+
+    def summary(self) -> dict:
+        """Function who return the measures as a dict, the times are in milliseconds."""
+        samples = sorted(self.samples)
+
+        def percentile(rank):
+            return samples[min(len(samples) - 1, int(rank * len(samples)))] / 1e6
+
+        summary = {
+            'calls': self.calls,
+            'total_ms': self.total / 1e6,
+            'mean_ms': self.total / self.calls / 1e6 if self.calls else 0.0,
+            'p50_ms': percentile(0.5) if samples else 0.0,
+            'p90_ms': percentile(0.9) if samples else 0.0,
+            'p99_ms': percentile(0.99) if samples else 0.0,
+            'max_ms': self.maximum / 1e6,
+        }
+        if self.nodes:
+            summary['nodes'] = self.nodes
+            summary['nodes_per_second'] = self.nodes / (self.total / 1e9) if self.total else 0.0
+        return summary
+
+class FrameCounter():
+    """Counter of the frames of the 'protocol' module in a stream of bytes, it only
+    reads the headers."""
+
+    def __init__(self) -> None:
+        self.header = bytearray()
+        self.skip = 0
+        self.frames = 0
+
+    def feed(self, data):
+        """Procedure who count the frames of the next bytes of the stream."""
+        position, end = 0, len(data)
+        while position < end:
+            if self.skip:
+                step = min(self.skip, end - position)
+                self.skip -= step
+                position += step
+                continue
+            step = min(HEADER.size - len(self.header), end - position)
+            self.header += data[position:position + step]
+            position += step
+            if len(self.header) == HEADER.size:
+                self.skip = HEADER.unpack(self.header)[0]
+                self.header.clear()
+                self.frames += 1
+
+class ConnectionStats():
+    """Bytes and messages of a connection in each direction.
+
+    name: the name of the connection, with the address of the client
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.received = FrameCounter()
+        self.sent = FrameCounter()
+        self.opened = time.perf_counter()
+        self.closed = None
+
+    def receive(self, data):
+        """Procedure who count received bytes."""
+        self.bytes_in += len(data)
+        self.received.feed(data)
+
+    def send(self, data):
+        """Procedure who count sent bytes."""
+        self.bytes_out += len(data)
+        self.sent.feed(data)
+
+    def summary(self) -> dict:
+        """Function who return the measures as a dict, 'seconds' is the time from the
+        opening to the closing, or to now for an open connection."""
+        return {
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'messages_in': self.received.frames,
+            'messages_out': self.sent.frames,
+            'seconds': (time.perf_counter() if self.closed is None else self.closed)
+                       - self.opened,
+            'open': self.closed is None,
+        }
+
+class CountingReader():
+    """asyncio StreamReader who counts the received bytes in 'stats'."""
+
+    def __init__(self, reader, stats: ConnectionStats) -> None:
+        self.reader = reader
+        self.stats = stats
+
+    async def read(self, nb_bytes: int = -1) -> bytes:
+        data = await self.reader.read(nb_bytes)
+        self.stats.receive(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
+
+class CountingWriter():
+    """asyncio StreamWriter who counts the sent bytes in 'stats' and calls
+    'on_close(stats)' when it is closed."""
+
+    def __init__(self, writer, stats: ConnectionStats, on_close) -> None:
+        self.writer = writer
+        self.stats = stats
+        self.on_close = on_close
+
+    def write(self, data):
+        self.stats.send(data)
+        self.writer.write(data)
+
+    def writelines(self, lines):
+        lines = list(lines)
+        for data in lines:
+            self.stats.send(data)
+        self.writer.writelines(lines)
+
+    def close(self):
+        self.writer.close()
+        self.on_close(self.stats)
+
+    def __getattr__(self, name):
+        return getattr(self.writer, name)
+
+def find_module(name: str):
+    """Function who return the module 'name', the running script when it is this module
+    (for example 'server' when 'python server.py' runs)."""
+    main = sys.modules.get('__main__')
+    main_file = getattr(main, '__file__', None)
+    if main_file and os.path.splitext(os.path.basename(main_file))[0] == name:
+        return main
+    return importlib.import_module(name)
+
+def resolve(target: str) -> tuple:
+    """Function who return (owner, attribute name) of a target 'module:Class.function'.
+
+    target: the target, the class part is optional
+    """
+    module_name, _, path = target.partition(':')
+    owner = find_module(module_name)
+    *classes, name = path.split('.')
+    for class_name in classes:
+        owner = getattr(owner, class_name)
+    if name not in vars(owner):
+        raise AttributeError(f"{target} is not defined in {owner.__name__}")
+    return owner, name
+
+class Profiler():
+    """Switchable measures of the functions and of the connections.
+
+    max_samples: the number of call times kept by function for the percentiles
+    trace: if true, each call is kept as an event of the Chrome trace
+    max_events: the maximal number of events of the trace, the next ones are not kept
+    max_closed: the number of closed connections kept one by one in the report
+    """
+
+    def __init__(self, max_samples: int = 10000, trace: bool = False,
+                 max_events: int = 1000000, max_closed: int = 100) -> None:
+        assert max_samples > 0
+        self.max_samples = max_samples
+        self.trace = trace
+        self.max_events = max_events
+        self.functions = {}
+        self.counters = {}
+        self.connections = {}  # the open connections
+        self.closed_connections = collections.deque(maxlen=max_closed)
+        self.closed_totals = dict.fromkeys(CLOSED_TOTALS, 0)
+        self.events = []
+        self.patched = []  # list of (owner, name, original function)
+        self.enabled_at = None
+        self.elapsed = 0.0
+
+    def enable(self, targets=DEFAULT_TARGETS, connections: bool = True):
+        """Procedure who start the measures.
+
+        targets: the functions to measure, see 'resolve'
+        connections: if true, the connections of the server are measured
+        """
+        for target in targets:
+            self.instrument(target)
+        if connections:
+            server = find_module('server')
+            self.patch(server.Connection, '__init__',
+                       self.counting_init(server.Connection.__init__, 'player'))
+            self.patch(server.Spectator, '__init__',
+                       self.counting_init(server.Spectator.__init__, 'spectator'))
+        self.enabled_at = time.perf_counter()
+
+    def disable(self):
+        """Procedure who stop the measures and put the original functions back, the
+        measures are kept."""
+        while self.patched:
+            owner, name, original = self.patched.pop()
+            setattr(owner, name, original)
+        if self.enabled_at is not None:
+            self.elapsed += time.perf_counter() - self.enabled_at
+            self.enabled_at = None
+
+    def reset(self):
+        """Procedure who clear the measures."""
+        self.functions.clear()
+        self.counters.clear()
+        self.connections.clear()
+        self.closed_connections.clear()
+        self.closed_totals = dict.fromkeys(CLOSED_TOTALS, 0)
+        self.events.clear()
+        self.elapsed = 0.0
+        if self.enabled_at is not None:
+            self.enabled_at = time.perf_counter()
+
+    def instrument(self, target: str):
+        """Procedure who measure the function of a target, see 'resolve'."""
+        owner, name = resolve(target)
+        if any(owner is patched and name == patched_name
+               for patched, patched_name, _ in self.patched):
+            return
+        label = target.partition(':')[2]
+        self.patch(owner, name, self.wrap(label, vars(owner)[name]))
+
+    def patch(self, owner, name: str, replacement):
+        """Procedure who replace the attribute 'name' of 'owner' until 'disable'."""
+        self.patched.append((owner, name, vars(owner)[name]))
+        setattr(owner, name, replacement)
+
+    def wrap(self, label: str, function):
+        """Function who return the wrapper of 'function' who measures its calls."""
+        stats = self.functions.get(label)
+        if stats is None:
+            stats = self.functions[label] = FunctionStats(label, self.max_samples)
+        clock = time.perf_counter_ns
+
+        def record(start, result):
+            duration = clock() - start
+            stats.add(duration)
+            nodes = getattr(result, 'nodes', None)
+            if isinstance(nodes, int):
+                stats.nodes += nodes
+            if self.trace and len(self.events) < self.max_events:
+                self.events.append((label, start, duration, threading.get_ident()))
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                start, result = clock(), None
+                try:
+                    result = await function(*args, **kwargs)
+                    return result
+                finally:
+                    record(start, result)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start, result = clock(), None
+                try:
+                    result = function(*args, **kwargs)
+                    return result
+                finally:
+                    record(start, result)
+        return wrapper
+
+    def counting_init(self, init, kind: str):
+        """Function who return the __init__ of the server connections who counts their
+        bytes and messages, 'init' is the original __init__."""
+        profiler = self
+
+        @functools.wraps(init)
+        def wrapper(connection, *args, **kwargs):
+            init(connection, *args, **kwargs)
+            # the read and write coroutines are created but have not started yet
+            peer = connection.writer.get_extra_info('peername')
+            stats = profiler.connection(f"{kind} {peer[0]}:{peer[1]}" if peer else kind)
+            connection.writer = CountingWriter(connection.writer, stats,
+                                               profiler.connection_closed)
+            if hasattr(connection, 'reader'):
+                connection.reader = CountingReader(connection.reader, stats)
+        return wrapper
+
+    def count(self, name: str, value: int = 1):
+        """Procedure who add 'value' to the counter 'name'."""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def connection(self, name: str) -> ConnectionStats:
+        """Function who return a new ConnectionStats named 'name', followed by a number
+        when the name is already used."""
+        unique, number = name, 1
+        while unique in self.connections or any(stats.name == unique
+                                                for stats in self.closed_connections):
+            number += 1
+            unique = f'{name} #{number}'
+        stats = self.connections[unique] = ConnectionStats(unique)
+        return stats
+
+    def connection_closed(self, stats: ConnectionStats):
+        """Procedure who move a closed connection from the open connections to the
+        totals and to the last closed connections."""
+        if stats.closed is not None:
+            return
+        stats.closed = time.perf_counter()
+        self.connections.pop(stats.name, None)
+        self.closed_connections.append(stats)
+        summary = stats.summary()
+        self.closed_totals['connections'] += 1
+        for name in CLOSED_TOTALS[1:]:
+            self.closed_totals[name] += summary[name]
+
+    def report(self) -> dict:
+        """Function who return the measures: {'elapsed', 'functions', 'counters',
+        'connections', 'closed_connections', 'last_closed_connections'}, the functions are
+        sorted by cumulated time, 'connections' are the open connections and
+        'closed_connections' the totals of the closed ones."""
+        elapsed = self.elapsed
+        if self.enabled_at is not None:
+            elapsed += time.perf_counter() - self.enabled_at
+        functions = sorted(self.functions.values(), key=lambda stats: -stats.total)
+        return {
+            'elapsed': elapsed,
+            'functions': {stats.name: stats.summary() for stats in functions if stats.calls},
+            'counters': dict(self.counters),
+            'connections': {name: stats.summary() for name, stats in self.connections.items()},
+            'closed_connections': dict(self.closed_totals),
+            'last_closed_connections': {stats.name: stats.summary()
+                                        for stats in self.closed_connections},
+        }
+
+    def dump_json(self, path: str):
+        """Procedure who write the report in the JSON file 'path'."""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+
+    def dump_trace(self, path: str):
+        """Procedure who write the calls in the Chrome trace-event file 'path'."""
+        pid = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'ts': start / 1000, 'dur': duration / 1000,
+                   'pid': pid, 'tid': tid} for name, start, duration, tid in self.events]
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.disable()
+
+def workload(nb_games: int, size: int, search_time: float, seed: int = 0):
+    """Procedure who play random games with the moves of 'next_possible_move' on each
+    backend, like the interfaces, then the first moves of a game between two
+    AlphaBetaPlayer.
+
+    nb_games: the number of random games of each backend
+    size: the size of the board
+    search_time: the time of a move of the AlphaBetaPlayer, 0 for no search
+    seed: the seed of the random moves
+    """
+    from engine import AlphaBetaPlayer
+    from riversi import BitBoard, BoardWithoutGUI
+
+    generator = random.Random(seed)
+    for backend in (BoardWithoutGUI, BitBoard):
+        for _ in range(nb_games):
+            board = backend(size)
+            player, turn_pass = 0, 0
+            while turn_pass < 2:
+                board.next_move(player)
+                if board.next_possible_move:
+                    cord = generator.choice(list(board.next_possible_move))
+                    board.place_pawn(player, cord, board.next_possible_move[cord])
+                    turn_pass = 0
+                else:
+                    turn_pass += 1
+                player = 1 - player
+    if search_time > 0:
+        board = BitBoard(size)
+        players = (AlphaBetaPlayer(search_time), AlphaBetaPlayer(search_time))
+        for _ in range(4):
+            board.make_move(players[board.player].choose_move(board))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Profile the hot functions of the game "
+                                                 "on a workload.")
+    parser.add_argument('--games', type=int, default=50, help="random games of each backend")
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--search-time', type=float, default=0.5)
+    parser.add_argument('--json', default=None, help="JSON file of the report")
+    parser.add_argument('--trace', default=None, help="Chrome trace-event file of the calls")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    workload(args.games, args.size, 0)
+    disabled_time = time.perf_counter() - start
+
+    profiler = Profiler(trace=args.trace is not None)
+    with profiler:
+        start = time.perf_counter()
+        workload(args.games, args.size, 0)
+        enabled_time = time.perf_counter() - start
+        workload(0, args.size, args.search_time)
+
+    workload(args.games, args.size, 0)  # check that the original functions are back
+    profile = profiler.report()
+    print(f"random games: {disabled_time:.3f}s disabled, {enabled_time:.3f}s enabled")
+    print(f"{'function':40} {'calls':>9} {'total ms':>10} {'p50 us':>8} {'p99 us':>8}")
+    for function_name, measures in profile['functions'].items():
+        print(f"{function_name:40} {measures['calls']:9d} {measures['total_ms']:10.1f} "
+              f"{measures['p50_ms'] * 1000:8.1f} {measures['p99_ms'] * 1000:8.1f}"
+              + (f"  {measures['nodes_per_second']:.0f} nodes/s"
+                 if 'nodes_per_second' in measures else ''))
+    if args.json:
+        profiler.dump_json(args.json)
+    if args.trace:
+        profiler.dump_trace(args.trace)
@@ -0,0 +1,189 @@
+"""Reversi network protocol file
+
+Every message is a frame: a header of 4 bytes (length of the payload on 2 bytes, version
+of the protocol, kind of the message) followed by the payload. The numbers are little
+endian. The kinds and their fields are:
+
+- START (color, size): sent to each player at the start of a game
+- MOVE (row, column): a move of the player to move
+- PASS (): sent by the player to move when it has no move and the opponent has one,
+  the game ends without message when no player can move
+- STATE (player, size, black, white): a snapshot of the board, with the masks of the
+  pawns of each color (the bit 'row * size + column' is the cell (row, column))
+- RESIGN (color,): the player 'color' gives up
+- PING (token,) and PONG (token,): the answer of a PING is a PONG with the same token
+- END (reason, color, black, white): end of the game hosted by a server, with one of
+  the reasons of REASONS, the color of the player concerned and the number of pawns
+- WATCH (match_id,): sent by a spectator to follow a match of a server (LAST_MATCH for
+  the last started one), it receives a STATE then the MOVE, PASS, RESIGN and END of
+  the match, and a new STATE when it is too slow to receive all the moves
+"""
+
+import struct
+
+VERSION = 1
+
+HEADER = struct.Struct('<HBB')
+
+START, MOVE, PASS, STATE, RESIGN, PING, PONG, END, WATCH = range(1, 10)
+
+LAST_MATCH = 0xFFFFFFFF
+
+# reasons of the END frames
+FINISHED, RESIGNED, TIMEOUT, DISCONNECTED, WRONG_MOVE, SHUTDOWN = range(6)
+REASONS = ('finished', 'resigned', 'timeout', 'disconnected', 'wrong_move', 'shutdown')
+
+# the payload of each kind, STATE has a variable length after its fixed part
+PAYLOADS = {
+    START: struct.Struct('<BB'),
+    MOVE: struct.Struct('<BB'),
+    PASS: struct.Struct('<'),
+    STATE: struct.Struct('<BB'),
+    RESIGN: struct.Struct('<B'),
+    PING: struct.Struct('<I'),
+    PONG: struct.Struct('<I'),
+    END: struct.Struct('<BBHH'),
+    WATCH: struct.Struct('<I'),
+}
+
+class ProtocolError(ValueError):
+    """Exception raised when a received frame is not valid."""
+
+def mask_bytes(size: int) -> int:
+    """Function who return the number of bytes of a mask of the pawns of a board.
+
+    size: the size of the board
+    """
+    return (size * size + 7) // 8
+
+def encode(kind: int, *fields) -> bytes:
+    """Function who return the frame of a message.
+
+    kind: the kind of the message, one of START, MOVE, PASS, STATE, RESIGN, PING, PONG, END,
+    WATCH
+    fields: the fields of the message, see the documentation of the module
+    """
+    if kind == STATE:
+        player, size, black, white = fields
+        length = mask_bytes(size)
+        payload = PAYLOADS[STATE].pack(player, size) + black.to_bytes(length, 'little') \
+            + white.to_bytes(length, 'little')
+    else:
+        payload = PAYLOADS[kind].pack(*fields)
+    return HEADER.pack(len(payload), VERSION, kind) + payload
+
+def encode_into(buffer: bytearray, kind: int, *fields):
+    """Procedure who append the frame of a message to 'buffer', to send many messages
+    with one call.
+
+    buffer: the bytearray of the frames to send
+    kind: the kind of the message
+    fields: the fields of the message
+    """
+    if kind == STATE:
+        buffer += encode(kind, *fields)
+        return
+    payload = PAYLOADS[kind]
+    offset = len(buffer)
+    buffer.extend(bytes(HEADER.size + payload.size))
+    HEADER.pack_into(buffer, offset, payload.size, VERSION, kind)
+    payload.pack_into(buffer, offset + HEADER.size, *fields)
+
+PASS_FRAME = encode(PASS)
+
+class FrameDecoder():
+    """Decoder of the frames of a stream.
+
+    The received bytes are kept in one buffer, the frames are decoded in it without copy
+    and the decoded bytes are removed once for all the complete frames of the buffer.
+
+    capacity: the initial size of the buffer in bytes
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.buffer = bytearray(capacity)
+        self.start = 0
+        self.end = 0
+        self.pending = []
+
+    def make_room(self, nb_bytes: int):
+        """Procedure who move the undecoded bytes at the start of the buffer and grow it
+        if it has less than 'nb_bytes' free bytes."""
+        if self.start:
+            remaining = self.end - self.start
+            self.buffer[:remaining] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, remaining
+        if len(self.buffer) - self.end < nb_bytes:
+            self.buffer.extend(bytes(max(nb_bytes, len(self.buffer))))
+
+    def feed(self, data):
+        """Procedure who add received bytes to the buffer.
+
+        data: bytes-like object
+        """
+        if len(self.buffer) - self.end < len(data):
+            self.make_room(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def receive(self, sock) -> int:
+        """Function who receive the available bytes of a socket directly in the buffer and
+        return their number, 0 when the connection is closed.
+
+        sock: a connected socket
+        """
+        if len(self.buffer) - self.end < 1024:
+            self.make_room(1024)
+        with memoryview(self.buffer) as view, view[self.end:] as free:
+            nb_bytes = sock.recv_into(free)
+        self.end += nb_bytes
+        return nb_bytes
+
+    def frames(self) -> list:
+        """Function who return the list of the (kind, fields) of the complete frames of
+        the buffer and remove them."""
+        buffer = self.buffer
+        offset, end = self.start, self.end
+        frames = []
+        while end - offset >= HEADER.size:
+            length, version, kind = HEADER.unpack_from(buffer, offset)
+            if end - offset < HEADER.size + length:
+                break
+            if version != VERSION:
+                raise ProtocolError(f"unknown protocol version {version}")
+            payload = PAYLOADS.get(kind)
+            if payload is None:
+                raise ProtocolError(f"unknown frame kind {kind}")
+            start = offset + HEADER.size
+            if kind == STATE:
+                player, size = payload.unpack_from(buffer, start)
+                nb_bytes = mask_bytes(size)
+                if length != payload.size + 2 * nb_bytes:
+                    raise ProtocolError("wrong length of a STATE frame")
+                with memoryview(buffer) as view:
+                    black = int.from_bytes(view[start + 2:start + 2 + nb_bytes], 'little')
+                    white = int.from_bytes(view[start + 2 + nb_bytes:start + length], 'little')
+                frames.append((kind, (player, size, black, white)))
+            else:
+                if length != payload.size:
+                    raise ProtocolError(f"wrong length of a frame of kind {kind}")
+                frames.append((kind, payload.unpack_from(buffer, start)))
+            offset = start + length
+
+        if offset == end:
+            self.start = self.end = 0
+        else:
+            self.start = offset
+        return frames
+
+    def next_frame(self, sock):
+        """Function who return the next (kind, fields) received on a blocking socket,
+        None when the connection is closed.
+
+        sock: a connected socket
+        """
+        while not self.pending:
+            if not self.receive(sock):
+                return None
+            self.pending = self.frames()
+        return self.pending.pop(0)
@@ -0,0 +1,263 @@
+"""Reversi game record file
+
+A record file starts with MAGIC, then the games are appended one after the other.
+A game is a header (RECORD: size of the board, reason of the end, number of black and
+white pawns, number of moves), the names of the black and the white players (one byte
+of length then the utf-8 bytes) and one byte by move: the index of the move in the
+list of the possible moves in row order ('legal_moves'), or PASS_MOVE for a pass.
+The games start on the usual start position.
+
+The file '<path>.idx' keeps the offset of each game on 8 bytes, it gives the games by
+index without reading the file.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+from protocol import FINISHED, REASONS
+
+MAGIC = b'RVR\x01'
+RECORD = struct.Struct('<BBHHH')
+OFFSET = struct.Struct('<Q')
+PASS_MOVE = 0xFF
+
+Game = namedtuple('Game', ['size', 'names', 'reason', 'black', 'white', 'moves'])
+Game.__doc__ = """A recorded game.
+
+    size: the size of the board
+    names: tuple of the names of the black and the white players
+    reason: the reason of the end, one of 'protocol.REASONS'
+    black: the number of black pawns at the end
+    white: the number of white pawns at the end
+    moves: bytes of the moves, see the documentation of the module
+    """
+
+def encode_game(game: Game) -> bytes:
+    """Function who return the bytes of a game in a record file."""
+    data = bytearray(RECORD.pack(game.size, game.reason, game.black, game.white,
+                                 len(game.moves)))
+    for name in game.names:
+        # cut on a character boundary, a cut utf-8 character could not be decoded
+        name = name.encode('utf-8')[:255].decode('utf-8', 'ignore').encode('utf-8')
+        data.append(len(name))
+        data += name
+    data += game.moves
+    return bytes(data)
+
+def decode_game(buffer, offset: int) -> tuple:
+    """Function who return the (Game, offset of the next game) of the game at 'offset'.
+
+    buffer: bytes-like object of the record file
+    offset: the offset of the game
+    """
+    size, reason, black, white, nb_moves = RECORD.unpack_from(buffer, offset)
+    offset += RECORD.size
+    names = []
+    for _ in range(2):
+        length = buffer[offset]
+        names.append(bytes(buffer[offset + 1:offset + 1 + length]).decode('utf-8'))
+        offset += 1 + length
+    moves = bytes(buffer[offset:offset + nb_moves])
+    return Game(size, tuple(names), reason, black, white, moves), offset + nb_moves
+
+class RecordWriter():
+    """Writer who append the games at the end of a record file and of its index.
+
+    The index of a record file without one is rebuilt (see 'build_index') before the
+    first game is appended, and the index of a new record file is emptied.
+
+    path: the path of the record file, created if it does not exist
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, 'ab')
+        index_mode = 'ab'
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+            index_mode = 'wb'
+        elif not os.path.exists(path + '.idx'):
+            build_index(path)
+        self.index_file = open(path + '.idx', index_mode)
+        self.nb_games = self.index_file.tell() // OFFSET.size
+
+    def write_game(self, game: Game) -> int:
+        """Function who append a game and return its index in the file."""
+        offset = self.file.tell()
+        self.file.write(encode_game(game))
+        self.index_file.write(OFFSET.pack(offset))
+        self.nb_games += 1
+        return self.nb_games - 1
+
+    def flush(self):
+        """Procedure who write the buffered games in the files."""
+        self.file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        """Procedure who close the files."""
+        self.file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class GameRecorder():
+    """Recorder of the moves of the games played on a board, called by the game loops
+    before each move and at the end of each game.
+
+    writer: the RecordWriter of the games
+    size: the size of the board
+    names: tuple of the names of the black and the white players
+    """
+
+    def __init__(self, writer: RecordWriter, size: int, names: tuple = ('', '')) -> None:
+        self.writer = writer
+        self.size = size
+        self.names = names
+        self.moves = bytearray()
+
+    def record(self, index=None):
+        """Procedure who record a move.
+
+        index: the index of the move in the list of the possible moves, None for a pass
+        """
+        self.moves.append(PASS_MOVE if index is None else index)
+
+    def record_cord(self, board, cord):
+        """Procedure who record a move before it is played on 'board'.
+
+        board: the reversi Board
+        cord: the tuple (row, column) of the move, None for a pass
+        """
+        self.record(None if cord is None else board.legal_moves().index(cord))
+
+    def finish(self, black: int, white: int, reason: int = FINISHED) -> int:
+        """Function who write the game, start a new one and return the index of the game.
+
+        The passes at the end of the moves are not written, the game is over anyway.
+
+        black: the number of black pawns at the end
+        white: the number of white pawns at the end
+        reason: the reason of the end, one of 'protocol.REASONS'
+        """
+        moves = bytes(self.moves).rstrip(bytes([PASS_MOVE]))
+        self.moves = bytearray()
+        index = self.writer.write_game(Game(self.size, self.names, reason, black, white, moves))
+        self.writer.flush()
+        return index
+
+class RecordReader():
+    """Reader of a record file.
+
+    The file and its index are memory-mapped: 'reader[index]' reads one game and
+    iterating on the reader reads the games one after the other, without loading the
+    whole file.
+
+    path: the path of the record file
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if not os.path.exists(path + '.idx'):
+            build_index(path)
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a record file")
+        self.offsets = None
+        with open(path + '.idx', 'rb') as file:
+            if os.fstat(file.fileno()).st_size:
+                self.index_data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.offsets = memoryview(self.index_data).cast('Q')
+
+    def __len__(self) -> int:
+        return 0 if self.offsets is None else len(self.offsets)
+
+    def __getitem__(self, index: int) -> Game:
+        return decode_game(self.data, self.offsets[index])[0]
+
+    def __iter__(self):
+        offset = len(MAGIC)
+        while offset < len(self.data):
+            game, offset = decode_game(self.data, offset)
+            yield game
+
+    def close(self):
+        """Procedure who close the memory maps."""
+        if self.offsets is not None:
+            self.offsets.release()
+            self.index_data.close()
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def build_index(path: str) -> int:
+    """Function who write the index file of a record file and return the number of games.
+
+    path: the path of the record file
+    """
+    nb_games = 0
+    with open(path, 'rb') as file, open(path + '.idx', 'wb') as index_file:
+        if os.fstat(file.fileno()).st_size <= len(MAGIC):
+            return 0
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = len(MAGIC)
+            while offset < len(data):
+                index_file.write(OFFSET.pack(offset))
+                offset = decode_game(data, offset)[1]
+                nb_games += 1
+    return nb_games
+
+def encode_moves(board, moves: list) -> bytes:
+    """Function who play the moves on 'board' and return their bytes in a record.
+
+    board: a reversi Board on the position before the moves
+    moves: list of tuples (row, column), None for a pass
+    """
+    data = bytearray()
+    for cord in moves:
+        data.append(PASS_MOVE if cord is None else board.legal_moves().index(cord))
+        board.make_move(cord)
+    return bytes(data)
+
+def replay(game: Game, board, plies=None):
+    """Generator who play the moves of a game on 'board' and yield the move played,
+    a tuple (row, column) or None for a pass, after each move.
+
+    board: a reversi Board on the start position of size 'game.size'
+    plies: optional maximal number of moves
+    """
+    assert board.boardsize == game.size
+    moves = game.moves if plies is None else game.moves[:plies]
+    for index in moves:
+        cord = None if index == PASS_MOVE else board.legal_moves()[index]
+        board.make_move(cord)
+        yield cord
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print the games of a record file.")
+    parser.add_argument('path')
+    parser.add_argument('--index', type=int, default=None, help="print only this game")
+    parser.add_argument('--build-index', action='store_true',
+                        help="write the index file again from the record file")
+    args = parser.parse_args()
+
+    if args.build_index:
+        print(f"{build_index(args.path)} games")
+    with RecordReader(args.path) as reader:
+        games = [reader[args.index]] if args.index is not None else reader
+        for record_game in games:
+            print(f"{record_game.names[0] or '?'} - {record_game.names[1] or '?'}: "
+                  f"{record_game.black}-{record_game.white} ({REASONS[record_game.reason]}), "
+                  f"{len(record_game.moves)} moves on {record_game.size}x{record_game.size}")
@@ -1,5 +1,19 @@
 """Reversi board class file"""
 
+import argparse
+from collections import namedtuple
+
+from zobrist import SIDE_KEY, zobrist_keys
+
+MoveRecord = namedtuple('MoveRecord', ['cord', 'flipped', 'player', 'turn_pass'])
+MoveRecord.__doc__ = """Undo record returned by 'Board.make_move'.
+
+    cord: the cell where the pawn was placed, None for a pass
+    flipped: the mask of the flipped pawns, as returned by 'place_pawn'
+    player: the player who made the move
+    turn_pass: the value of 'turn_pass' before the move
+    """
+
 class Pawn():
   """
     Class of a reversi Pawn.
@@ -28,30 +42,199 @@ class Pawn():
   def __str__(self):
     return str(self.get_color())
 
+class ReadOnlyPawn(Pawn):
+  """
+    Pawn of a 'BoardView', a copy of a cell who can not be turned.
+    """
+
+  def reterned(self):
+    raise TypeError("the pawns of 'Board.board' are read-only, the board is changed with "
+                    "'place_pawn' or 'make_move'")
+
+class BoardView():
+  """
+    Read-only view of the cells of a Board, who replace the old list of lists 'board':
+    'board.board[row_index][column_index]' is a ReadOnlyPawn, or None for an empty cell.
+
+    Each row is a tuple built from 'get_cell' when it is read, so a write raises a
+    TypeError instead of being lost. The new code reads the cells with 'get_cell'.
+
+    owner: the Board of the cells
+    """
+
+  __slots__ = ('owner',)
+
+  def __init__(self, owner) -> None:
+    self.owner = owner
+
+  def __len__(self) -> int:
+    return self.owner.boardsize
+
+  def __getitem__(self, row_index: int) -> tuple:
+    size = self.owner.boardsize
+    row_index = range(size)[row_index]
+    get_cell = self.owner.get_cell
+    return tuple(None if cell is None else ReadOnlyPawn(cell)
+                 for cell in (get_cell(row_index, column_index) for column_index in range(size)))
+
+  def __iter__(self):
+    for row_index in range(self.owner.boardsize):
+      yield self[row_index]
+
+EMPTY = 2  # value of an empty cell in 'Board.cells'
+# smallest size where the possible moves are cached by default, the cache costs more than
+# it saves on smaller boards
+INCREMENTAL_MIN_SIZE = 14
+BORDER = 3  # value of the sentinel cells around the board
+
+_BOARD_TABLES = {}
+
+def board_tables(size: int) -> tuple:
+  """
+    Function who return the precomputed tables of a board of size 'size'.
+
+    The board is a flat array with a sentinel border: the cell (row, column) is at
+    the index (row + 1) * (size + 1) + column + 1, one sentinel column is shared
+    between two rows. Return a tuple
+    (template, squares, cords, offsets, neighbors, rays, keys, bits):
+
+    template: bytearray of an empty board with its border
+    squares: list of the index of each cell, row by row
+    cords: dict who gives the (row, column) of an index
+    offsets: dict who gives the index offset of a vector
+    neighbors: dict who gives for each index the list of (offset, vector) of the neighbor cells
+    rays: dict who gives for each index the list of (offset, vector) of the directions
+          with at least two cells, the only ones where pawns can be flipped
+    keys: dict who gives the Zobrist keys of an index (see 'zobrist_keys')
+    bits: dict who gives the bit of an index in the masks of 'Board.set_position'
+
+    size: int who represents the size of the board
+    """
+  if size not in _BOARD_TABLES:
+    width = size + 1
+    template = bytearray([BORDER]) * ((size + 2) * width + 1)
+    offsets = {(i, j): i * width + j for i in range(-1, 2) for j in range(-1, 2) if (i, j) != (0, 0)}
+
+    squares = []
+    cords = {}
+    for row_index in range(size):
+      for column_index in range(size):
+        index = (row_index + 1) * width + column_index + 1
+        template[index] = EMPTY
+        squares.append(index)
+        cords[index] = (row_index, column_index)
+
+    neighbors = {}
+    rays = {}
+    for index in squares:
+      neighbors[index] = [(offset, vector) for vector, offset in offsets.items()
+                          if template[index + offset] != BORDER]
+      rays[index] = [(offset, vector) for offset, vector in neighbors[index]
+                     if template[index + 2 * offset] != BORDER]
+
+    keys = dict(zip(squares, zobrist_keys(size)))
+    bits = {index: 1 << number for number, index in enumerate(squares)}
+
+    _BOARD_TABLES[size] = (template, squares, cords, offsets, neighbors, rays, keys, bits)
+  return _BOARD_TABLES[size]
+
 class Board():
   """
     Abstract Class of a reversi Game Board. 
+
+    The cells are stored in the bytearray 'cells' (see 'board_tables'),
+    a cell is 0 for black, 1 for white, EMPTY or BORDER.
+
+    'frontier' is the set of the empty cells next to a pawn, the only cells where a move
+    can be possible, and 'nb_neighbors' the number of pawns next to each cell. With
+    incremental=True, the possible moves of each color are kept between two calls of
+    'next_move' and only the cells near the placed and flipped pawns are checked again.
+    By default (incremental=None) the moves are cached from INCREMENTAL_MIN_SIZE. The
+    copies made for a search ('copy') are never incremental: 'unmake_move' changes
+    the same cells again and the cache does not pay there.
+
+    'patterns' is None, or the 'pattern.PatternIndexes' of the board updated at each
+    placed and removed pawn (see 'pattern.PatternEvaluator.attach').
     """
 
-  def __init__(self, size) -> None:
+  def __init__(self, size, incremental=None) -> None:
     assert size >= 4
     self.boardsize = size
+    self.incremental = size >= INCREMENTAL_MIN_SIZE if incremental is None else incremental
     self.create_new_board()
     raise NotImplementedError
 
   def create_new_board(self)->None:
-    """Procedure who permit the initialization of the board in the variable self.board.
+    """Procedure who permit the initialization of the board in the variable self.cells.
     """
-    self.board = [[None for _ in range(self.boardsize)] for _ in range(self.boardsize)]
-    self.board[self.boardsize // 2 - 1][self.boardsize // 2 - 1] = Pawn(1)
-    self.board[self.boardsize // 2][self.boardsize // 2] = Pawn(1)
-    self.board[self.boardsize // 2 - 1][self.boardsize // 2] = Pawn(0)
-    self.board[self.boardsize // 2][self.boardsize // 2 - 1] = Pawn(0)
+    (self.template, self.squares, self.cords, self.offsets, self.neighbors,
+     self.rays, self.keys, self.bits) = board_tables(self.boardsize)
+    self.patterns = None
+
+    self.set_position(*self.start_position(), 0)
+
+  def start_position(self) -> tuple:
+    """
+        Function who return the masks (black, white) of the pawns at the start of a game.
+        """
+    middle = self.boardsize // 2
+    black = (1 << (middle - 1) * self.boardsize + middle) | (1 << middle * self.boardsize + middle - 1)
+    white = (1 << (middle - 1) * self.boardsize + middle - 1) | (1 << middle * self.boardsize + middle)
+    return black, white
 
-    self.next_possible_move = []
-    self.player = 0
+  def set_position(self, black: int, white: int, player: int):
+    """Procedure who set the pawns of the board and the player to move.
+
+        black: mask of the black pawns, the bit row * boardsize + column is the cell (row, column)
+        white: mask of the white pawns
+        player: the player to move
+        """
+    assert not black & white
+
+    self.cells = bytearray(self.template)
+    for number, index in enumerate(self.squares):
+      if black >> number & 1:
+        self.cells[index] = 0
+      elif white >> number & 1:
+        self.cells[index] = 1
+
+    self.frontier = set()
+    self.nb_neighbors = bytearray(len(self.cells))
+    self.zobrist_key = 0
+    for index in self.squares:
+      if self.cells[index] < EMPTY:
+        self.update_frontier(index)
+        self.zobrist_key ^= self.keys[index][self.cells[index]]
+    self.legal_moves_by_color = [None, None]
+    self.changed_cells = [set(), set()]
+    if self.patterns is not None:
+      self.patterns.set_position(black, white)
+
+    self.next_possible_move = {}
+    self.player = player
     self.turn_pass = 0
 
+  def index(self, row_index: int, column_index: int) -> int:
+    """
+        Function who return the index in 'cells' of the cell (row_index, column_index).
+        """
+    return (row_index + 1) * (self.boardsize + 1) + column_index + 1
+
+  def get_cell(self, row_index: int, column_index: int):
+    """
+        Function who return the color of the pawn on the cell (row_index, column_index),
+        or None if the cell is empty.
+        """
+    cell = self.cells[self.index(row_index, column_index)]
+    return cell if cell < EMPTY else None
+
+  @property
+  def board(self) -> BoardView:
+    """
+        Read-only view of the cells as rows of Pawn, see 'BoardView'.
+        """
+    return BoardView(self)
+
   def list_empty_neighbor(self, row_index: int, column_index: int) -> list:
     """
         Function who return the list of all the empty cells next to a specific pown.
@@ -62,28 +245,19 @@ class Board():
     assert isinstance(row_index, int)
     assert isinstance(column_index, int)
 
-    assert isinstance(self.board[row_index][column_index], Pawn)
-
-    list_possible = []
-
-    matrix = [(i, j) for i in range(-1, 2) for j in range(-1, 2)]
-    matrix.remove((0, 0))
+    index = self.index(row_index, column_index)
+    assert self.cells[index] < EMPTY
 
-    for vector in matrix:
-      try:
-        if self.board[row_index + vector[0]][column_index + vector[1]] is None:
-          list_possible.append(vector)
-      except IndexError:
-        pass
-    return list_possible
+    return [vector for offset, vector in self.neighbors[index]
+            if self.cells[index + offset] == EMPTY]
 
   def is_possible_play(self, color: int, row_index: int, column_index: int,
                        vector: tuple) -> bool:
     """
-        Recursive function who return a boolean. 
+        Function who return a boolean. 
 
-        Return true if it's possible to play in this empty cell
-        and false if it's not possible. 
+        Return true if the pawns after the pawn (row_index, column_index) in the direction
+        'vector' are of the other color and are followed by a pawn of color 'color'.
 
         color: int who represents a color, 0 corresponds to black and 1 to white
         row_index: an int who represents the row postion of the pown in the board
@@ -96,27 +270,121 @@ class Board():
     assert isinstance(row_index, int)
     assert isinstance(column_index, int)
 
-    assert isinstance(self.board[row_index][column_index], Pawn)
-    assert isinstance(vector, tuple)
+    index = self.index(row_index, column_index)
+    assert self.cells[index] < EMPTY
+    assert vector in self.offsets
 
-    assert len(vector) >= 2
-    assert isinstance(vector[0], int) and isinstance(vector[1], int)
+    offset = self.offsets[vector]
+    index += offset
+    while self.cells[index] == 1 - color:
+      index += offset
+    return self.cells[index] == color
 
-    try:
-      cell = self.board[row_index + vector[0]][column_index + vector[1]]
-      if cell is None:
-        return False
-      if cell.get_color() == color:
-        return True
-      return self.is_possible_play(color, row_index + vector[0],
-                                   column_index + vector[1], vector)
-    except IndexError:
-      return False
+  def move_vectors(self, color: int, index: int) -> list:
+    """
+        Function who return the list of path directions in which pawns are flipped
+        if the player 'color' plays on the empty cell 'index'.
+
+        color: int who represents a color, 0 corresponds to black and 1 to white
+        index: the index of the cell in 'cells'
+        """
+    cells = self.cells
+    opponent = 1 - color
+    vectors = []
+    for offset, vector in self.rays[index]:
+      next_index = index + offset
+      if cells[next_index] == opponent:
+        next_index += offset
+        while cells[next_index] == opponent:
+          next_index += offset
+        if cells[next_index] == color:
+          vectors.append(vector)
+    return vectors
+
+  def update_frontier(self, index: int):
+    """
+        Procedure who update the set 'frontier' after a pawn is placed on or removed from
+        the cell 'index'. 'nb_neighbors' counts the pawns next to each cell, so only the
+        neighbors of the cell are visited.
+
+        index: the index of the cell in 'cells'
+        """
+    cells = self.cells
+    nb_neighbors = self.nb_neighbors
+    frontier = self.frontier
+    if cells[index] < EMPTY:
+      frontier.discard(index)
+      for offset, _ in self.neighbors[index]:
+        neighbor = index + offset
+        nb_neighbors[neighbor] += 1
+        if cells[neighbor] == EMPTY:
+          frontier.add(neighbor)
+    else:
+      if nb_neighbors[index]:
+        frontier.add(index)
+      for offset, _ in self.neighbors[index]:
+        neighbor = index + offset
+        nb_neighbors[neighbor] -= 1
+        if not nb_neighbors[neighbor]:
+          frontier.discard(neighbor)
+
+  def mark_changed(self, indexes):
+    """
+        Procedure who mark the cells whose possible moves can have changed
+        after a change of the cells 'indexes'.
+
+        A move on an empty cell only depends of the pawns on its rays until the first
+        empty cell, so the cells to check are the empty cells at the end of the rays
+        of pawns starting from each changed cell.
+
+        indexes: iterable of the index of the changed cells in 'cells'
+        """
+    cells = self.cells
+    changed = set()
+    for index in indexes:
+      changed.add(index)
+      for offset in self.offsets.values():
+        next_index = index + offset
+        while cells[next_index] < EMPTY:
+          next_index += offset
+        if cells[next_index] == EMPTY:
+          changed.add(next_index)
+
+    for color in range(2):
+      if self.legal_moves_by_color[color] is not None:
+        self.changed_cells[color] |= changed
+
+  def update_legal_moves(self, color: int) -> dict:
+    """
+        Function who return the dict {index: vectors} of the possible moves of 'color',
+        updated only on the changed cells since the last call.
+
+        color: int who represents a color, 0 corresponds to black and 1 to white
+        """
+    legal_moves = self.legal_moves_by_color[color]
+    if legal_moves is None:
+      legal_moves = {}
+      for index in self.frontier:
+        vectors = self.move_vectors(color, index)
+        if vectors:
+          legal_moves[index] = vectors
+      self.legal_moves_by_color[color] = legal_moves
+    else:
+      for index in self.changed_cells[color]:
+        vectors = self.move_vectors(color, index) if self.cells[index] == EMPTY else None
+        if vectors:
+          legal_moves[index] = vectors
+        else:
+          legal_moves.pop(index, None)
+    self.changed_cells[color].clear()
+    return legal_moves
 
   def add_next_move(self, color: int, row_index: int, column_index: int):
     """
-        Procedure who add to the list 'next_possible_move' the next possible move of player 'color' 
-        for one cell.
+        Procedure who add to the dictionary 'next_possible_move' the next possible moves of
+        player 'color' who flip the pawn of the opponent on one cell: each empty neighbor
+        of the pawn gets the direction from it through the pawn, if pawns are flipped in
+        this direction.
 
         color: int who represents a color, 0 corresponds to black and 1 to white
         row_index: an int who represents the row postion of the pown in the board
@@ -128,35 +396,41 @@ class Board():
     assert isinstance(row_index, int)
     assert isinstance(column_index, int)
 
-    assert isinstance(self.board[row_index][column_index], Pawn)
-
-    assert self.board[row_index][column_index].get_color() == 1 - color, \
+    assert self.get_cell(row_index, column_index) == 1 - color, \
     "the color of the cell have to be at the oposite of the player color"
 
-    empty_neighbor = self.list_empty_neighbor(row_index, column_index)
-    other_neighbor = [
-        tuple(-each for each in vector) for vector in empty_neighbor
-    ]
+    for vector in self.list_empty_neighbor(row_index, column_index):
+      other_vector = (-vector[0], -vector[1])
+      if self.is_possible_play(color, row_index, column_index, other_vector):
+        cord = (row_index + vector[0], column_index + vector[1])
+        self.next_possible_move.setdefault(cord, []).append(other_vector)
+
+  def add_move_at(self, color: int, row_index: int, column_index: int):
+    """
+        Procedure who add to the dictionary 'next_possible_move' the move of player 'color'
+        on one empty cell, if this move is possible: the entry (row_index, column_index)
+        gets the list of the directions of the flipped pawns (see 'move_vectors').
 
-    for i, vector in enumerate(other_neighbor):
-      if self.is_possible_play(color, row_index, column_index, vector):
-        cord = (row_index + empty_neighbor[i][0],
-                column_index + empty_neighbor[i][1])
+        color: int who represents a color, 0 corresponds to black and 1 to white
+        row_index: an int who represents the row postion of the empty cell in the board
+        column_index: an int who represents the column postion of the empty cell in the board
+        """
+    assert isinstance(color, int)
+    assert 0 <= color <= 1
+
+    assert isinstance(row_index, int)
+    assert isinstance(column_index, int)
 
-        # if (cord[0] + vector[0] or cord[1] + vector[1] or cord[0] or cord[1] > -1
-        #     or cord[0] + vector[0] or cord[1] + vector[1] or cord[0] or cord[1]
-        #     > self.boardsize - 1):
+    assert self.get_cell(row_index, column_index) is None
 
-        if 0 <= cord[0] < self.boardsize and 0 <= cord[1] < self.boardsize:
-          if cord not in self.next_possible_move:
-            self.next_possible_move[cord] = [vector]
-          else:
-            self.next_possible_move[cord].append(vector)
+    vectors = self.move_vectors(color, self.index(row_index, column_index))
+    if vectors:
+      self.next_possible_move[(row_index, column_index)] = vectors
 
   def next_move(self, color: int):
     """
-        Add to the list 'next_possible_move' the next_possible_move of the player 'color' 
-        for all the board.
+        Add to the dictionary 'next_possible_move' the next_possible_move of the player 'color' 
+        for all the board, row by row.
 
         color: int who represents a color, 0 corresponds to black and 1 to white
         """
@@ -165,14 +439,53 @@ class Board():
 
     self.next_possible_move = {}
 
-    inverse_color = 1 - color
+    if self.incremental:
+      legal_moves = self.update_legal_moves(color)
+      for index in sorted(legal_moves):
+        self.next_possible_move[self.cords[index]] = legal_moves[index]
+      return
+
+    cells = self.cells
+    opponent = 1 - color
+    rays = self.rays
+    for index in sorted(self.frontier):
+      for offset, _ in rays[index]:
+        if cells[index + offset] == opponent:
+          vectors = self.move_vectors(color, index)
+          if vectors:
+            self.next_possible_move[self.cords[index]] = vectors
+          break
+
+  def legal_moves(self, color=None) -> list:
+    """
+        Function who return the list of the possible moves of 'color' (by default the
+        player 'self.player'), row by row, without building 'next_possible_move'.
 
-    for row_index, row in enumerate(self.board):
-      for column_index, cell in enumerate(
-          row):  # go through the board cell by cell
-        if cell is not None:
-          if cell.get_color() == inverse_color:
-            self.add_next_move(color, row_index, column_index)
+        color: int who represents a color, 0 corresponds to black and 1 to white
+        """
+    if color is None:
+      color = self.player
+    if self.incremental:
+      return [self.cords[index] for index in sorted(self.update_legal_moves(color))]
+    return [self.cords[index] for index in sorted(self.frontier)
+            if self.move_vectors(color, index)]
+
+  def copy(self) -> 'Board':
+    """
+        Function who return a copy of the game state in a new board without interface,
+        used by the players who search in the game tree, so the copy is not incremental.
+        """
+    board = Board.__new__(Board)
+    board.boardsize = self.boardsize
+    board.incremental = False
+    board.create_new_board()
+    board.cells[:] = self.cells
+    board.frontier = set(self.frontier)
+    board.nb_neighbors = bytearray(self.nb_neighbors)
+    board.zobrist_key = self.zobrist_key
+    board.player = self.player
+    board.turn_pass = self.turn_pass
+    return board
 
   def choice_move(self):  #can be move into the class without GUI
     """Player choose what he play and verify is the move exist
@@ -194,6 +507,10 @@ class Board():
   def place_pawn(self, color: int, cord: tuple, vectors: list):
     """Function who place a pawn in the board and flip the pawn on is path 
 
+        Return the mask of the flipped pawns (the bit row * boardsize + column, like in
+        'set_position'), for both backends. The Zobrist key of the board is updated with
+        the placed and the flipped pawns.
+
         color: int who represents a color, 0 corresponds to black and 1 to white
         cord: tuple who reposents the coordinates where the pown have to be place
         vectors: list of path directions in which pawns must be flipped  
@@ -208,26 +525,107 @@ class Board():
 
     assert isinstance(vectors, list)
 
-    self.board[cord[0]][cord[1]] = Pawn(color)
+    index = self.index(cord[0], cord[1])
+    self.cells[index] = color
+    zobrist_key = self.zobrist_key ^ self.keys[index][color]
+    changed = [index]
+    flipped = 0
     for vector in vectors:
+      offset = self.offsets[vector]
+      next_index = index + offset
+      while self.cells[next_index] == 1 - color:
+        self.cells[next_index] = color
+        zobrist_key ^= self.keys[next_index][2]
+        changed.append(next_index)
+        flipped |= self.bits[next_index]
+        next_index += offset
+    self.zobrist_key = zobrist_key
+    if self.patterns is not None:
+      self.patterns.place(color, index, changed[1:])
+
+    self.update_frontier(index)
+    if self.incremental:
+      self.mark_changed(changed)
+    return flipped
+
+  def remove_pawn(self, color: int, cord: tuple, flipped: int):
+    """Procedure who cancel a 'place_pawn': remove the pawn and flip back the pawns
+
+        color: int who represents the color of the removed pawn
+        cord: tuple who reposents the coordinates of the pawn to remove
+        flipped: the mask of the flipped pawns returned by 'place_pawn'
+        """
+    squares = self.squares
+    mask, flipped = flipped, []
+    while mask:
+      bit = mask & -mask
+      mask ^= bit
+      flipped.append(squares[bit.bit_length() - 1])
+    index = self.index(cord[0], cord[1])
+    self.cells[index] = EMPTY
+    self.zobrist_key ^= self.keys[index][color]
+    for flipped_index in flipped:
+      self.cells[flipped_index] = 1 - color
+      self.zobrist_key ^= self.keys[flipped_index][2]
+    if self.patterns is not None:
+      self.patterns.remove(color, index, flipped)
+
+    self.update_frontier(index)
+    if self.incremental:
+      self.mark_changed([index] + flipped)
+
+  def position_key(self) -> int:
+    """
+        Function who return the Zobrist key of the position, with the player to move.
+        """
+    return self.zobrist_key ^ SIDE_KEY if self.player else self.zobrist_key
 
-      new_cord = (cord[0] + vector[0], cord[1] + vector[1])
+  def position_masks(self) -> list:
+    """
+        Function who return the masks [black, white] of the pawns, like in 'set_position'.
+        """
+    masks = [0, 0]
+    for number, index in enumerate(self.squares):
+      cell = self.cells[index]
+      if cell < EMPTY:
+        masks[cell] |= 1 << number
+    return masks
+
+  def make_move(self, cord) -> MoveRecord:
+    """Function who play the move 'cord' for the player 'self.player' and give the turn
+        to the other player.
 
-      while self.board[new_cord[0]][new_cord[1]].get_color() != color:
-        self.board[new_cord[0]][new_cord[1]].reterned()
-        new_cord = (new_cord[0] + vector[0], new_cord[1] + vector[1])
+        Return the 'MoveRecord' who permit to cancel the move with 'unmake_move'.
+
+        cord: tuple of the coordinates of the move, None if the player pass
+        """
+    record = MoveRecord(cord, 0, self.player, self.turn_pass)
+    if cord is None:
+      self.turn_pass += 1
+    else:
+      index = self.index(cord[0], cord[1])
+      vectors = self.move_vectors(self.player, index)
+      assert vectors and self.cells[index] == EMPTY, "the move have to be possible"
+      record = record._replace(flipped=self.place_pawn(self.player, cord, vectors))
+      self.turn_pass = 0
+    self.player = 1 - self.player
+    return record
+
+  def unmake_move(self, record: MoveRecord):
+    """Procedure who restore the board as it was before the 'make_move' who returned 'record'
+
+        record: the MoveRecord of the last move played
+        """
+    if record.cord is not None:
+      self.remove_pawn(record.player, record.cord, record.flipped)
+    self.player = record.player
+    self.turn_pass = record.turn_pass
 
   def nb_of_pawn_by_color(self) -> list:
     """
         Fonction who return a list containing the number of pawn of each color.
         """
-    list_nb_of_pawn = [0, 0]
-    for row in self.board:
-      for cell in row:
-        if cell is not None:
-          list_nb_of_pawn[cell.get_color()] += 1
-
-    return list_nb_of_pawn
+    return [self.cells.count(0), self.cells.count(1)]
 
   def __str__(self):
     str_row = "\n" + (2 * (self.boardsize) + 1) * '-' + "\n"
@@ -254,31 +652,328 @@ class Board():
       str_board += str_row
     return str_board
 
-class BoardSize8(Board):
-  """The riversi board with a 8x8 size.
+_BITBOARD_TABLES = {}
+
+def bitboard_tables(size: int) -> tuple:
+  """
+    Function who return the shift tables of a bitboard of size 'size'.
+
+    The cell (row, column) is the bit number row * size + column.
+    Return a tuple (full, directions) where full is the mask of all the cells
+    and directions a list of (shift, mask, vector). A positive shift is a left shift,
+    mask removes the bits who wrap around the board edges.
+
+    size: int who represents the size of the board
+    """
+  if size not in _BITBOARD_TABLES:
+    full = (1 << (size * size)) - 1
+    first_column = sum(1 << (row * size) for row in range(size))
+    last_column = first_column << (size - 1)
+
+    directions = []
+    for vector in [(i, j) for i in range(-1, 2) for j in range(-1, 2)]:
+      if vector == (0, 0):
+        continue
+      mask = full
+      if vector[1] == 1:
+        mask &= ~first_column
+      elif vector[1] == -1:
+        mask &= ~last_column
+      directions.append((vector[0] * size + vector[1], mask, vector))
+
+    _BITBOARD_TABLES[size] = (full, directions)
+  return _BITBOARD_TABLES[size]
+
+class BitBoard(Board):
+  """Reversi Game Board stored as two bitmasks, one for each color.
+
+    Moves and flips are computed with shift-and-mask operations on all the
+    cells at once. For a 8x8 board the masks are 64-bit integers.
 
     This class is inherited of the Abstract Class 'Board'"""
-  def __init__(self) -> None:
+
+  def __init__(self, size) -> None:
     try:
-      super().__init__(8)
+      super().__init__(size)
     except NotImplementedError:
       pass
-    self.boardsize = 8
+
+  def create_new_board(self) -> None:
+    self.full, self.directions = bitboard_tables(self.boardsize)
+    self.keys = zobrist_keys(self.boardsize)
+    self.patterns = None
+    self.set_position(*self.start_position(), 0)
+
+  def set_position(self, black: int, white: int, player: int):
+    assert not black & white
+
+    self.masks = [black, white]
+    self.zobrist_key = 0
+    for color, mask in enumerate(self.masks):
+      while mask:
+        bit = mask & -mask
+        mask ^= bit
+        self.zobrist_key ^= self.keys[bit.bit_length() - 1][color]
+    if self.patterns is not None:
+      self.patterns.set_position(black, white)
+
+    self.next_possible_move = {}
+    self.player = player
+    self.turn_pass = 0
+
+  def index(self, row_index: int, column_index: int) -> int:
+    """
+        Function who return the bit number of the cell (row_index, column_index).
+        """
+    return row_index * self.boardsize + column_index
+
+  def get_cell(self, row_index: int, column_index: int):
+    bit = 1 << self.index(row_index, column_index)
+    if self.masks[0] & bit:
+      return 0
+    if self.masks[1] & bit:
+      return 1
+    return None
+
+  def next_move(self, color: int):
+    assert isinstance(color, int)
+    assert 0 <= color <= 1
+
+    own = self.masks[color]
+    opponent = self.masks[1 - color]
+    empty = self.full & ~(own | opponent)
+    steps = range(self.boardsize - 3)
+
+    moves = 0
+    moves_by_vector = []
+    for shift, mask, vector in self.directions:
+      mask_opponent = mask & opponent
+      if shift > 0:
+        line = (own << shift) & mask_opponent
+        for _ in steps:
+          line |= (line << shift) & mask_opponent
+        direction_moves = (line << shift) & mask & empty
+      else:
+        line = (own >> -shift) & mask_opponent
+        for _ in steps:
+          line |= (line >> -shift) & mask_opponent
+        direction_moves = (line >> -shift) & mask & empty
+      if direction_moves:
+        moves |= direction_moves
+        # the vector goes from the move to the pawns to flip
+        moves_by_vector.append((direction_moves, (-vector[0], -vector[1])))
+
+    self.next_possible_move = {}
+    while moves:
+      bit = moves & -moves
+      moves ^= bit
+      index = bit.bit_length() - 1
+      self.next_possible_move[divmod(index, self.boardsize)] = [
+          vector for direction_moves, vector in moves_by_vector if direction_moves & bit
+      ]
+
+  def moves_mask(self, color: int) -> int:
+    """
+        Function who return the mask of the possible moves of the player 'color'.
+
+        color: int who represents a color, 0 corresponds to black and 1 to white
+        """
+    own = self.masks[color]
+    opponent = self.masks[1 - color]
+    empty = self.full & ~(own | opponent)
+    steps = range(self.boardsize - 3)
+
+    moves = 0
+    for shift, mask, _ in self.directions:
+      mask_opponent = mask & opponent
+      if shift > 0:
+        line = (own << shift) & mask_opponent
+        for _ in steps:
+          line |= (line << shift) & mask_opponent
+        moves |= (line << shift) & empty & mask
+      else:
+        line = (own >> -shift) & mask_opponent
+        for _ in steps:
+          line |= (line >> -shift) & mask_opponent
+        moves |= (line >> -shift) & empty & mask
+    return moves
+
+  def legal_moves(self, color=None) -> list:
+    moves = self.moves_mask(self.player if color is None else color)
+    legal_moves = []
+    while moves:
+      bit = moves & -moves
+      moves ^= bit
+      legal_moves.append(divmod(bit.bit_length() - 1, self.boardsize))
+    return legal_moves
+
+  def copy(self) -> 'BitBoard':
+    board = BitBoard.__new__(BitBoard)
+    board.boardsize = self.boardsize
+    board.create_new_board()
+    board.masks = list(self.masks)
+    board.zobrist_key = self.zobrist_key
+    board.player = self.player
+    board.turn_pass = self.turn_pass
+    return board
+
+  def position_masks(self) -> list:
+    return list(self.masks)
+
+  def flip_key(self, flipped: int) -> int:
+    """
+        Function who return the xor of the Zobrist keys who flip the pawns of the mask 'flipped'.
+        """
+    zobrist_key = 0
+    while flipped:
+      bit = flipped & -flipped
+      flipped ^= bit
+      zobrist_key ^= self.keys[bit.bit_length() - 1][2]
+    return zobrist_key
+
+  def flips(self, color: int, index: int, vectors=None) -> int:
+    """
+        Function who return the mask of the pawns flipped if 'color' plays on the bit 'index'.
+
+        color: int who represents a color, 0 corresponds to black and 1 to white
+        index: the bit number of the cell, row * boardsize + column
+        vectors: optional list of path directions to check, all the directions by default
+        """
+    own = self.masks[color]
+    opponent = self.masks[1 - color]
+    move = 1 << index
+
+    flipped = 0
+    for shift, mask, vector in self.directions:
+      if vectors is not None and vector not in vectors:
+        continue
+      line = 0
+      if shift > 0:
+        cell = (move << shift) & mask
+        while cell & opponent:
+          line |= cell
+          cell = (cell << shift) & mask
+      else:
+        cell = (move >> -shift) & mask
+        while cell & opponent:
+          line |= cell
+          cell = (cell >> -shift) & mask
+      if cell & own:
+        flipped |= line
+    return flipped
+
+  def list_empty_neighbor(self, row_index: int, column_index: int) -> list:
+    assert isinstance(row_index, int)
+    assert isinstance(column_index, int)
+    assert self.get_cell(row_index, column_index) is not None
+
+    cell = 1 << self.index(row_index, column_index)
+    empty = self.full & ~(self.masks[0] | self.masks[1])
+    list_possible = []
+    for shift, mask, vector in self.directions:
+      neighbor = (cell << shift) & mask if shift > 0 else (cell >> -shift) & mask
+      if neighbor & empty:
+        list_possible.append(vector)
+    return list_possible
+
+  def is_possible_play(self, color: int, row_index: int, column_index: int,
+                       vector: tuple) -> bool:
+    assert isinstance(color, int)
+    assert 0 <= color <= 1
+    assert self.get_cell(row_index, column_index) is not None
+
+    shift, mask = [(shift, mask) for shift, mask, direction in self.directions
+                   if direction == vector][0]
+    cell = 1 << self.index(row_index, column_index)
+    while True:
+      cell = (cell << shift) & mask if shift > 0 else (cell >> -shift) & mask
+      if not cell & self.masks[1 - color]:
+        return bool(cell & self.masks[color])
+
+  def move_vectors(self, color: int, index: int) -> list:
+    return [vector for _, _, vector in self.directions if self.flips(color, index, [vector])]
+
+  def place_pawn(self, color: int, cord: tuple, vectors: list):
+    assert isinstance(color, int)
+    assert 0 <= color <= 1
+
+    assert isinstance(cord, tuple)
+
+    assert len(cord) >= 2
+    assert isinstance(cord[0], int) and isinstance(cord[1], int)
+
+    assert isinstance(vectors, list)
+
+    index = self.index(cord[0], cord[1])
+    flipped = self.flips(color, index, vectors)
+    self.masks[color] |= flipped | (1 << index)
+    self.masks[1 - color] &= ~flipped
+    self.zobrist_key ^= self.keys[index][color] ^ self.flip_key(flipped)
+    if self.patterns is not None:
+      self.patterns.place(color, index, flipped)
+    return flipped
+
+  def remove_pawn(self, color: int, cord: tuple, flipped: int):
+    index = self.index(cord[0], cord[1])
+    self.masks[color] &= ~(flipped | (1 << index))
+    self.masks[1 - color] |= flipped
+    self.zobrist_key ^= self.keys[index][color] ^ self.flip_key(flipped)
+    if self.patterns is not None:
+      self.patterns.remove(color, index, flipped)
+
+  def make_move(self, cord) -> MoveRecord:
+    record = MoveRecord(cord, 0, self.player, self.turn_pass)
+    if cord is None:
+      self.turn_pass += 1
+    else:
+      index = self.index(cord[0], cord[1])
+      move = 1 << index
+      flipped = self.flips(self.player, index)
+      assert flipped and not move & (self.masks[0] | self.masks[1]), \
+      "the move have to be possible"
+      self.masks[self.player] |= flipped | move
+      self.masks[1 - self.player] &= ~flipped
+      self.zobrist_key ^= self.keys[index][self.player] ^ self.flip_key(flipped)
+      if self.patterns is not None:
+        self.patterns.place(self.player, index, flipped)
+      record = record._replace(flipped=flipped)
+      self.turn_pass = 0
+    self.player = 1 - self.player
+    return record
+
+  def nb_of_pawn_by_color(self) -> list:
+    return [self.masks[0].bit_count(), self.masks[1].bit_count()]
+
+class BoardSize8(BitBoard):
+  """The riversi board with a 8x8 size.
+
+    The board is stored as two 64-bit masks, see 'BitBoard'.
+
+    This class is inherited of the Class 'BitBoard'"""
+  def __init__(self) -> None:
+    super().__init__(8)
 
 class BoardWithoutGUI(Board):
   """The reversi game without graphical interface
 
+    players: tuple of the black and the white player, None for a human player who
+    choose with 'choice_move', or a computer player with a 'choose_move(board)' method
+    (see 'engine.AlphaBetaPlayer')
+
     This class is inherited of the Abstract Class 'Board'"""
 
-  def __init__(self, size) -> None:
+  def __init__(self, size, incremental=None, players: tuple = (None, None)) -> None:
     try:
-      super().__init__(size)
+      super().__init__(size, incremental)
     except NotImplementedError:
       pass
+    self.players = players
 
-  def play_game(self):
+  def play_game(self, recorder=None):
     """
     Fonction who permit playing reversi game. 
+
+    recorder: optional 'record.GameRecorder' who records the game
     """
     while self.turn_pass <= 2:
       str_player = 'black' if self.player == 0 else 'white'
@@ -286,27 +981,82 @@ class BoardWithoutGUI(Board):
 
       if len(self.next_possible_move) == 0:
         self.turn_pass += 1
+        if recorder is not None:
+          recorder.record(None)
         print(self)
         print(f"{str_player.capitalize()} player can't play.")
       else:
         print(self)
         print(f"{str_player.capitalize()} pawn's turn.")
 
-        index_of_move = self.choice_move()
-        cord = list(self.next_possible_move.keys())[index_of_move]
+        if self.players[self.player] is None:
+          index_of_move = self.choice_move()
+          cord = list(self.next_possible_move.keys())[index_of_move]
+        else:
+          cord = self.players[self.player].choose_move(self)
+          index_of_move = list(self.next_possible_move.keys()).index(cord)
+          print(f"Computer plays {chr(65 + index_of_move)}")
+        if recorder is not None:
+          recorder.record(index_of_move)
         vector = self.next_possible_move[cord]
         self.place_pawn(self.player, cord, vector)
 
         self.turn_pass = 0
       self.player = 1 - self.player
 
-      print("GAME OVER")
-      black, white = self.nb_of_pawn_by_color()
-      print(f"Number of black pawn : {black}\nNumber of white pawn : {white}")
-      if black > white:
-        print("Black wins")
+    print("GAME OVER")
+    black, white = self.nb_of_pawn_by_color()
+    if recorder is not None:
+      recorder.finish(black, white)
+    print(f"Number of black pawn : {black}\nNumber of white pawn : {white}")
+    if black > white:
+      print("Black wins")
+    else:
+      print("White wins")
+
+  def play_game_without_output(self, recorder=None) -> list:
+    """
+    Fonction who play a game between two computer players without print or input,
+    from the current position until the end.
+
+    Return the list of the played moves, None for a pass.
+
+    recorder: optional 'record.GameRecorder' who records the moves and the end of the game
+    """
+    assert None not in self.players, "the two players have to be computer players"
+
+    moves = []
+    while True:
+      if not self.legal_moves():
+        if not self.legal_moves(1 - self.player):
+          if recorder is not None:
+            recorder.finish(*self.nb_of_pawn_by_color())
+          return moves
+        cord = None
       else:
-        print("White wins")
+        cord = self.players[self.player].choose_move(self)
+      if recorder is not None:
+        recorder.record_cord(self, cord)
+      self.make_move(cord)
+      moves.append(cord)
 
 if __name__ == '__main__':
-  BoardWithoutGUI(8).play_game()
+  parser = argparse.ArgumentParser(description="Play reversi in the terminal.")
+  parser.add_argument('--size', type=int, default=8, help="size of the board")
+  parser.add_argument('--black', choices=['human', 'computer'], default='human')
+  parser.add_argument('--white', choices=['human', 'computer'], default='human')
+  parser.add_argument('--time', type=float, default=1.0,
+                      help="time budget of the computer for a move, in seconds")
+  parser.add_argument('--record', default=None, help="record file where the game is added")
+  args = parser.parse_args()
+
+  from engine import AlphaBetaPlayer
+  game_players = tuple(AlphaBetaPlayer(args.time) if kind == 'computer' else None
+                       for kind in (args.black, args.white))
+  if args.record is None:
+    BoardWithoutGUI(args.size, players=game_players).play_game()
+  else:
+    from record import GameRecorder, RecordWriter
+    with RecordWriter(args.record) as record_writer:
+      game_recorder = GameRecorder(record_writer, args.size, (args.black, args.white))
+      BoardWithoutGUI(args.size, players=game_players).play_game(game_recorder)
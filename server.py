@@ -0,0 +1,495 @@
+"""Reversi game server file"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import signal
+
+import protocol
+from profiling import Profiler
+from protocol import FrameDecoder, ProtocolError, encode
+from riversi import BitBoard
+
+# the time in seconds given to the spectators to receive the end of a match
+SPECTATOR_CLOSE_TIMEOUT = 5.0
+
+class Connection():
+    """A client connection, with a reader and a writer coroutine.
+
+    The messages (kind, fields) received are put in the queue 'incoming' (None when the
+    client is gone), the frames to send are put in the queue 'outgoing' by 'send'.
+    The PING messages are answered here, unless 'max_messages' frames wait to be sent.
+    The client is not read while 'incoming' is full, so a client who floods the server
+    is slowed down by TCP instead of filling the memory.
+
+    reader: the asyncio StreamReader of the client
+    writer: the asyncio StreamWriter of the client
+    max_messages: the maximal number of messages of 'incoming'
+    """
+
+    def __init__(self, reader, writer, max_messages: int = 64) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.max_messages = max_messages
+        self.incoming = asyncio.Queue(max_messages)
+        self.outgoing = asyncio.Queue()
+        self.closed = False
+        self.tasks = [asyncio.create_task(self.read_loop()),
+                      asyncio.create_task(self.write_loop())]
+
+    async def read_loop(self):
+        """Coroutine who put the received messages in 'incoming'."""
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await self.reader.read(4096)
+                if not data:
+                    break
+                decoder.feed(data)
+                for kind, fields in decoder.frames():
+                    if kind == protocol.PING:
+                        if self.outgoing.qsize() < self.max_messages:
+                            self.send(encode(protocol.PONG, *fields))
+                    else:
+                        await self.incoming.put((kind, fields))
+        except (ConnectionError, ProtocolError):
+            pass
+        finally:
+            self.closed = True
+            if self.incoming.full():
+                # the client is gone after filling the queue: its oldest message is
+                # dropped so that the end of the connection is always received
+                self.incoming.get_nowait()
+            self.incoming.put_nowait(None)
+
+    async def write_loop(self):
+        """Coroutine who send the messages of 'outgoing' until a None message."""
+        try:
+            while True:
+                frame = await self.outgoing.get()
+                if frame is None:
+                    break
+                self.writer.write(frame)
+                # the frames queued meanwhile are sent with the same call
+                while not self.outgoing.empty():
+                    frame = self.outgoing.get_nowait()
+                    if frame is None:
+                        return
+                    self.writer.write(frame)
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.closed = True
+            self.writer.close()
+
+    def send(self, frame: bytes):
+        """Procedure who queue a frame to send to the client."""
+        self.outgoing.put_nowait(frame)
+
+    async def close(self):
+        """Coroutine who send the queued messages and close the connection."""
+        self.outgoing.put_nowait(None)
+        await asyncio.gather(self.tasks[1], return_exceptions=True)
+        self.tasks[0].cancel()
+        await asyncio.gather(self.tasks[0], return_exceptions=True)
+
+class Spectator():
+    """A read-only client who follows a match.
+
+    The frames are shared by all the spectators of a match, each spectator keeps at most
+    'max_frames' frames not sent. When a spectator is too slow, its frames are replaced
+    by a snapshot of the board ('resync' policy, the END of the match is kept after the
+    snapshot) or its connection is aborted ('drop' policy), so a peer who stopped
+    reading does not keep the server waiting on it.
+
+    writer: the asyncio StreamWriter of the client
+    max_frames: the maximal number of frames waiting to be sent
+    policy: 'resync' or 'drop'
+    """
+
+    def __init__(self, writer, max_frames: int, policy: str) -> None:
+        assert policy in ('resync', 'drop')
+        self.writer = writer
+        self.max_frames = max_frames
+        self.policy = policy
+        self.frames = collections.deque()
+        self.ready = asyncio.Event()
+        self.closing = False
+        self.closed = False
+        self.resyncs = 0
+        self.task = asyncio.create_task(self.write_loop())
+
+    def push(self, frame: bytes, snapshot) -> bool:
+        """Function who queue a frame and return false if the spectator is dropped.
+
+        frame: the frame to send
+        snapshot: function who return the STATE frame of the board after 'frame'
+        """
+        if self.closing or self.closed:
+            return False
+        if len(self.frames) >= self.max_frames:
+            if self.policy == 'drop':
+                self.abort()
+                return False
+            self.frames.clear()
+            self.frames.append(snapshot())
+            if protocol.HEADER.unpack_from(frame)[2] == protocol.END:
+                # the snapshot does not tell that the match is over
+                self.frames.append(frame)
+            self.resyncs += 1
+        else:
+            self.frames.append(frame)
+        self.ready.set()
+        return True
+
+    async def write_loop(self):
+        """Coroutine who send the queued frames, all the frames of the queue at once."""
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                if self.frames:
+                    frames = list(self.frames)
+                    self.frames.clear()
+                    self.writer.writelines(frames)
+                    await self.writer.drain()
+                if self.closing and not self.frames:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.closed = True
+            self.writer.close()
+
+    def close(self):
+        """Procedure who close the connection after the queued frames."""
+        self.closing = True
+        self.ready.set()
+
+    def abort(self):
+        """Procedure who close the connection at once, the queued frames are lost."""
+        self.closing = True
+        self.frames.clear()
+        self.writer.transport.abort()
+        self.ready.set()
+
+class Match():
+    """A game between two connections, the server keeps the board and checks the moves.
+
+    The messages are the ones of the 'protocol' module: the server sends START to each
+    player, then each player sends its MOVE, PASS or RESIGN and the server sends it to
+    the other player. At the end the server sends END to both players.
+
+    match_id: the number of the match
+    players: the black and the white Connection
+    size: the size of the board
+    idle_timeout: the time in seconds given to a player for a move
+    """
+
+    def __init__(self, match_id: int, players: tuple, size: int, idle_timeout: float) -> None:
+        self.match_id = match_id
+        self.players = players
+        self.board = BitBoard(size)
+        self.idle_timeout = idle_timeout
+        self.result = None
+        self.task = None
+        self.spectators = []
+        self.state_frame = None
+
+    def snapshot(self) -> bytes:
+        """Function who return the STATE frame of the board, computed once by move."""
+        if self.state_frame is None:
+            board = self.board
+            self.state_frame = encode(protocol.STATE, board.player, board.boardsize,
+                                      *board.masks)
+        return self.state_frame
+
+    def add_spectator(self, spectator: Spectator):
+        """Procedure who send the board to a new spectator and add it to the match."""
+        spectator.push(self.snapshot(), self.snapshot)
+        self.spectators.append(spectator)
+
+    def broadcast(self, frame: bytes):
+        """Procedure who send a frame to every spectator, the spectators too slow with
+        the 'drop' policy are removed.
+
+        frame: the frame to send, encoded once for all the spectators
+        """
+        self.state_frame = None
+        if self.spectators:
+            self.spectators = [spectator for spectator in self.spectators
+                               if spectator.push(frame, self.snapshot)]
+
+    async def run(self):
+        """Coroutine who play the match until its end and close the connections."""
+        try:
+            for color, connection in enumerate(self.players):
+                connection.send(encode(protocol.START, color, self.board.boardsize))
+            self.result = await self.play()
+            self.send_end(*self.result)
+        except asyncio.CancelledError:
+            self.send_end(protocol.SHUTDOWN, self.board.player)
+            raise
+        finally:
+            await asyncio.gather(*(connection.close() for connection in self.players),
+                                 self.close_spectators())
+
+    async def close_spectators(self):
+        """Coroutine who close the spectators after their queued frames, the spectators
+        who did not receive them after SPECTATOR_CLOSE_TIMEOUT seconds are aborted."""
+        for spectator in self.spectators:
+            spectator.close()
+        tasks = {spectator.task: spectator for spectator in self.spectators}
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=SPECTATOR_CLOSE_TIMEOUT)
+        for task in pending:
+            tasks[task].abort()
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def send_end(self, reason: int, color: int):
+        """Procedure who send the END message to both players.
+
+        reason: one of the reasons of 'protocol.REASONS'
+        color: the color of the player concerned by the reason
+        """
+        frame = encode(protocol.END, reason, color, *self.board.nb_of_pawn_by_color())
+        for connection in self.players:
+            connection.send(frame)
+        self.broadcast(frame)
+
+    async def play(self) -> tuple:
+        """Coroutine who play the moves until the end and return the (reason, color) of
+        the end.
+
+        Both players are read at the same time, so a RESIGN or a disconnection of the
+        player who waits ends the match at once. Any other message of this player is a
+        move out of turn, a WRONG_MOVE.
+        """
+        board = self.board
+        gets = [None, None]
+        try:
+            while True:
+                player = board.player
+                moves = board.legal_moves()
+                if not moves and not board.legal_moves(1 - player):
+                    return protocol.FINISHED, player
+
+                for color in (0, 1):
+                    if gets[color] is None:
+                        gets[color] = asyncio.ensure_future(self.players[color].incoming.get())
+                done, _ = await asyncio.wait(gets, timeout=self.idle_timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    return protocol.TIMEOUT, player
+
+                other = 1 - player
+                if gets[other] in done:
+                    message = gets[other].result()
+                    gets[other] = None
+                    if message is None:
+                        return protocol.DISCONNECTED, other
+                    if message[0] == protocol.RESIGN:
+                        frame = encode(protocol.RESIGN, other)
+                        self.players[player].send(frame)
+                        self.broadcast(frame)
+                        return protocol.RESIGNED, other
+                    return protocol.WRONG_MOVE, other
+
+                message = gets[player].result()
+                gets[player] = None
+                if message is None:
+                    return protocol.DISCONNECTED, player
+
+                kind, fields = message
+                if kind == protocol.RESIGN:
+                    frame = encode(protocol.RESIGN, player)
+                    self.players[1 - player].send(frame)
+                    self.broadcast(frame)
+                    return protocol.RESIGNED, player
+                if kind == protocol.PASS and not moves:
+                    board.make_move(None)
+                    frame = protocol.PASS_FRAME
+                elif kind == protocol.MOVE and fields in moves:
+                    board.make_move(fields)
+                    frame = encode(protocol.MOVE, *fields)
+                else:
+                    return protocol.WRONG_MOVE, player
+                self.players[1 - player].send(frame)
+                self.broadcast(frame)
+        finally:
+            for get in gets:
+                if get is not None:
+                    get.cancel()
+
+class GameServer():
+    """Server who host many matches at the same time in one process.
+
+    The clients are paired in the order of connection, the first one plays black.
+    The spectators connect to 'watch_port' and send WATCH with the number of a match.
+
+    host: the address of the server
+    port: the connection port of the players
+    size: the size of the boards
+    idle_timeout: the time in seconds given to a player for a move, and to a waiting
+    client to get an opponent
+    watch_port: the connection port of the spectators, None to refuse the spectators
+    spectator_frames: the maximal number of frames waiting to be sent to a spectator
+    slow_policy: what to do with a too slow spectator, 'resync' or 'drop'
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 55555, size: int = 8,
+                 idle_timeout: float = 60.0, watch_port=None, spectator_frames: int = 64,
+                 slow_policy: str = 'resync') -> None:
+        assert slow_policy in ('resync', 'drop')
+        self.host = host
+        self.port = port
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.watch_port = watch_port
+        self.spectator_frames = spectator_frames
+        self.slow_policy = slow_policy
+        self.server = None
+        self.watch_server = None
+        self.waiting = None
+        self.waiting_timer = None
+        self.matches = {}
+        self.match_ids = itertools.count()
+        self.finished_matches = 0
+
+    async def start(self):
+        """Coroutine who start to accept the clients."""
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.watch_port is not None:
+            self.watch_server = await asyncio.start_server(self.handle_spectator, self.host,
+                                                           self.watch_port)
+            self.watch_port = self.watch_server.sockets[0].getsockname()[1]
+
+    async def handle_client(self, reader, writer):
+        """Coroutine called for each new client, who pair it with the waiting client."""
+        connection = Connection(reader, writer)
+        if self.waiting is not None and self.waiting.closed:
+            self.waiting_timer.cancel()
+            waiting, self.waiting = self.waiting, None
+            await waiting.close()
+        if self.waiting is None:
+            self.waiting = connection
+            self.waiting_timer = asyncio.create_task(self.expire_waiting(connection))
+            return
+        players = (self.waiting, connection)
+        self.waiting = None
+        self.waiting_timer.cancel()
+        match = Match(next(self.match_ids), players, self.size, self.idle_timeout)
+        match.task = asyncio.create_task(match.run())
+        self.matches[match.match_id] = match
+        match.task.add_done_callback(lambda _: self.end_match(match.match_id))
+
+    async def expire_waiting(self, connection: Connection):
+        """Coroutine who close the waiting client when it has no opponent after
+        'idle_timeout' seconds."""
+        await asyncio.sleep(self.idle_timeout)
+        if self.waiting is connection:
+            self.waiting = None
+            await connection.close()
+
+    async def handle_spectator(self, reader, writer):
+        """Coroutine called for each new spectator, who add it to the match it asks for."""
+        decoder = FrameDecoder(64)
+        try:
+            while True:
+                data = await asyncio.wait_for(reader.read(64), self.idle_timeout)
+                if not data:
+                    writer.close()
+                    return
+                decoder.feed(data)
+                frames = decoder.frames()
+                if frames:
+                    break
+        except (asyncio.TimeoutError, ConnectionError, ProtocolError):
+            writer.close()
+            return
+
+        kind, fields = frames[0]
+        match_id = fields[0] if kind == protocol.WATCH else None
+        if match_id == protocol.LAST_MATCH and self.matches:
+            match_id = max(self.matches)
+        match = self.matches.get(match_id)
+        if match is None:
+            writer.close()
+            return
+        match.add_spectator(Spectator(writer, self.spectator_frames, self.slow_policy))
+
+    def end_match(self, match_id: int):
+        """Procedure called at the end of a match."""
+        del self.matches[match_id]
+        self.finished_matches += 1
+
+    async def shutdown(self):
+        """Coroutine who stop accepting clients, stop the matches and close the connections."""
+        for server in (self.server, self.watch_server):
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+        tasks = [match.task for match in self.matches.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.waiting is not None:
+            self.waiting_timer.cancel()
+            await self.waiting.close()
+
+async def main(host: str, port: int, size: int, idle_timeout: float, watch_port=None,
+               slow_policy: str = 'resync', profile=None, trace=None):
+    """Coroutine who run a GameServer until SIGINT or SIGTERM.
+
+    profile: None, or the JSON file where the measures of a 'profiling.Profiler' are
+    written at the end
+    trace: None, or the Chrome trace-event file of the calls measured by the profiler
+    """
+    profiler = None
+    if profile is not None or trace is not None:
+        profiler = Profiler(trace=trace is not None)
+        profiler.enable()
+    game_server = GameServer(host, port, size, idle_timeout, watch_port,
+                             slow_policy=slow_policy)
+    await game_server.start()
+    print(f"Start server on port {game_server.port}...")
+    if game_server.watch_port is not None:
+        print(f"Spectators on port {game_server.watch_port}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+    await stop.wait()
+
+    print("Stop server...")
+    await game_server.shutdown()
+    if profiler is not None:
+        profiler.disable()
+        if profile is not None:
+            profiler.dump_json(profile)
+        if trace is not None:
+            profiler.dump_trace(trace)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Host reversi matches.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=55555)
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--idle-timeout', type=float, default=60.0,
+                        help="time in seconds given to a player for a move")
+    parser.add_argument('--watch-port', type=int, default=None,
+                        help="port of the spectators, no spectator by default")
+    parser.add_argument('--slow-policy', choices=('resync', 'drop'), default='resync',
+                        help="what to do with a spectator who can't follow the moves")
+    parser.add_argument('--profile', default=None,
+                        help="JSON file of the measures of the functions and connections")
+    parser.add_argument('--trace', default=None, help="Chrome trace-event file of the calls")
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port, args.size, args.idle_timeout, args.watch_port,
+                     args.slow_policy, args.profile, args.trace))
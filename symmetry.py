@@ -0,0 +1,163 @@
+"""Reversi board symmetries file
+
+A square board has 8 symmetries. The symmetry number 'transform' is made of 3 bits
+applied in this order: 4 swaps the rows and the columns, 2 reverses the rows and 1
+reverses the columns. The canonical key of a position is the smallest Zobrist key
+(see 'Board.position_key') of its 8 symmetric positions, the symmetric positions have
+the same canonical key.
+"""
+
+from operator import itemgetter
+
+from zobrist import SIDE_KEY, zobrist_keys
+
+NB_TRANSFORMS = 8
+INVERSE_TRANSFORMS = (0, 1, 2, 3, 4, 6, 5, 7)  # the symmetry who cancels each symmetry
+
+_SYMMETRY_TABLES = {}
+
+def transform_cord(cord: tuple, size: int, transform: int) -> tuple:
+    """Function who return the cell (row, column) where the symmetry 'transform' sends
+    the cell 'cord', None for a pass.
+
+    cord: the tuple (row, column), or None
+    size: the size of the board
+    transform: the number of the symmetry
+    """
+    if cord is None:
+        return None
+    row, column = cord
+    if transform & 4:
+        row, column = column, row
+    if transform & 2:
+        row = size - 1 - row
+    if transform & 1:
+        column = size - 1 - column
+    return row, column
+
+def symmetry_tables(size: int) -> tuple:
+    """Function who return the tables of the symmetries of the boards of size 'size':
+    (getters, zobrist).
+
+    getters: list of the itemgetter of each symmetry, who gives the characters of the
+    binary string of the transformed mask from the binary string of a mask
+    zobrist: for each color, the list for each byte of a mask of the xor of the Zobrist
+    keys of the 256 values of the byte
+
+    size: the size of the board
+    """
+    if size not in _SYMMETRY_TABLES:
+        nb_cells = size * size
+        destinations = []
+        for transform in range(NB_TRANSFORMS):
+            destination = [0] * nb_cells
+            for index in range(nb_cells):
+                row, column = transform_cord(divmod(index, size), size, transform)
+                destination[index] = row * size + column
+            destinations.append(destination)
+
+        getters = []
+        for transform in range(NB_TRANSFORMS):
+            source = destinations[INVERSE_TRANSFORMS[transform]]
+            # the character k of the binary string is the bit nb_cells - 1 - k
+            getters.append(itemgetter(*[nb_cells - 1 - source[nb_cells - 1 - k]
+                                        for k in range(nb_cells)]))
+
+        keys = zobrist_keys(size)
+        zobrist = []
+        for color in range(2):
+            byte_tables = []
+            for byte in range((nb_cells + 7) // 8):
+                table = [0] * 256
+                for value in range(1, 256):
+                    low = value & -value
+                    bit = byte * 8 + low.bit_length() - 1
+                    key = keys[bit][color] if bit < nb_cells else 0
+                    table[value] = table[value ^ low] ^ key
+                byte_tables.append(table)
+            zobrist.append(byte_tables)
+
+        _SYMMETRY_TABLES[size] = (getters, zobrist)
+    return _SYMMETRY_TABLES[size]
+
+def flip_rows_8(mask: int) -> int:
+    """Function who return the mask of a 8x8 board with the rows in the reverse order."""
+    return int.from_bytes(mask.to_bytes(8, 'little'), 'big')
+
+def flip_columns_8(mask: int) -> int:
+    """Function who return the mask of a 8x8 board with the columns in the reverse order."""
+    mask = ((mask >> 1) & 0x5555555555555555) | ((mask & 0x5555555555555555) << 1)
+    mask = ((mask >> 2) & 0x3333333333333333) | ((mask & 0x3333333333333333) << 2)
+    return ((mask >> 4) & 0x0f0f0f0f0f0f0f0f) | ((mask & 0x0f0f0f0f0f0f0f0f) << 4)
+
+def transpose_8(mask: int) -> int:
+    """Function who return the mask of a 8x8 board with the rows and the columns swapped."""
+    swap = 0x0f0f0f0f00000000 & (mask ^ (mask << 28))
+    mask ^= swap ^ (swap >> 28)
+    swap = 0x3333000033330000 & (mask ^ (mask << 14))
+    mask ^= swap ^ (swap >> 14)
+    swap = 0x5500550055005500 & (mask ^ (mask << 7))
+    return mask ^ swap ^ (swap >> 7)
+
+def transform_mask(mask: int, size: int, transform: int) -> int:
+    """Function who return the mask of the pawns after the symmetry 'transform'.
+
+    mask: the mask of pawns, the bit row * size + column is the cell (row, column)
+    size: the size of the board
+    transform: the number of the symmetry
+    """
+    if size == 8:
+        if transform & 4:
+            mask = transpose_8(mask)
+        if transform & 2:
+            mask = flip_rows_8(mask)
+        if transform & 1:
+            mask = flip_columns_8(mask)
+        return mask
+    getter = symmetry_tables(size)[0][transform]
+    return int(''.join(getter(format(mask, f'0{size * size}b'))), 2)
+
+def symmetric_masks(mask: int, size: int) -> list:
+    """Function who return the list of the 8 symmetric masks of 'mask', in the order of
+    the numbers of the symmetries."""
+    if size != 8:
+        return [transform_mask(mask, size, transform) for transform in range(NB_TRANSFORMS)]
+    masks = []
+    for base in (mask, transpose_8(mask)):
+        rows = flip_rows_8(base)
+        masks += [base, flip_columns_8(base), rows, flip_columns_8(rows)]
+    return masks
+
+def masks_key(black: int, white: int, player: int, size: int) -> int:
+    """Function who return the Zobrist key of a position given by its masks, the same as
+    'Board.position_key'.
+
+    black: the mask of the black pawns
+    white: the mask of the white pawns
+    player: the player to move
+    size: the size of the board
+    """
+    zobrist = symmetry_tables(size)[1]
+    nb_bytes = len(zobrist[0])
+    key = SIDE_KEY if player else 0
+    for table, byte in zip(zobrist[0], black.to_bytes(nb_bytes, 'little')):
+        key ^= table[byte]
+    for table, byte in zip(zobrist[1], white.to_bytes(nb_bytes, 'little')):
+        key ^= table[byte]
+    return key
+
+def canonical_key(board) -> tuple:
+    """Function who return the (canonical key, symmetry) of the position of 'board',
+    the symmetry sends the position of the board to the canonical position.
+
+    board: a reversi Board
+    """
+    size = board.boardsize
+    black, white = board.position_masks()
+    best_key, best_transform = None, 0
+    for transform, (black_mask, white_mask) in enumerate(zip(symmetric_masks(black, size),
+                                                             symmetric_masks(white, size))):
+        key = masks_key(black_mask, white_mask, board.player, size)
+        if best_key is None or key < best_key:
+            best_key, best_transform = key, transform
+    return best_key, best_transform
@@ -0,0 +1,248 @@
+"""Reversi tournament file"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import time
+
+from book import BookPlayer
+from engine import AlphaBetaPlayer, RandomPlayer
+from mcts import MCTSPlayer
+from pattern import PatternEvaluator
+from protocol import FINISHED
+from record import Game, RecordWriter, encode_moves
+from riversi import BitBoard, BoardWithoutGUI
+from transposition import TranspositionTable
+
+def make_player(spec: str, seed: int, table=None):
+    """Function who return the computer player described by 'spec'.
+
+    spec: 'random', 'engine', 'engine:<time per move>', 'engine:<time per move>:<max depth>',
+    'mcts', 'mcts:<time per move>', 'pattern:<path of the weights>:<time per move>' (an
+    engine with a 'pattern.PatternEvaluator') or 'book:<path of the book>:<spec of the
+    player out of the book>'
+    seed: the seed of the random player
+    table: optional TranspositionTable of the engine player
+    """
+    kind, *options = spec.split(':')
+    if kind == 'book':
+        return BookPlayer(options[0], make_player(':'.join(options[1:]) or 'engine', seed, table))
+    if kind == 'random':
+        return RandomPlayer(seed)
+    if kind == 'engine':
+        time_limit = float(options[0]) if options else 0.1
+        max_depth = int(options[1]) if len(options) > 1 else 64
+        return AlphaBetaPlayer(time_limit, max_depth, table)
+    if kind == 'pattern':
+        time_limit = float(options[1]) if len(options) > 1 else 0.1
+        return AlphaBetaPlayer(time_limit, 64, table, evaluator=PatternEvaluator.load(options[0]))
+    if kind == 'mcts':
+        return MCTSPlayer(float(options[0]) if options else 0.1, seed=seed)
+    raise ValueError(f"unknown player {spec!r}")
+
+def derive_seed(seed: int, *keys) -> int:
+    """Function who return the seed of the random stream 'keys' (like a game and a
+    player) of the tournament seed 'seed'. The seed is hashed from all its parts, so the
+    streams of different keys or of close tournament seeds do not overlap.
+
+    seed: the seed of the tournament
+    keys: the ints or strings who name the stream
+    """
+    return random.Random(':'.join(str(key) for key in (seed, *keys))).getrandbits(64)
+
+def opening(size: int, plies: int, seed: int) -> list:
+    """Function who return the list of the 'plies' first moves of a random game,
+    the same list for the same seed.
+
+    size: the size of the board
+    plies: the number of moves of the opening
+    seed: the seed of the opening
+    """
+    generator = random.Random(seed)
+    board = BoardWithoutGUI(size)
+    moves = []
+    for _ in range(plies):
+        legal_moves = board.legal_moves()
+        if not legal_moves:
+            break
+        cord = generator.choice(legal_moves)
+        board.make_move(cord)
+        moves.append(cord)
+    return moves
+
+_WORKER = {}
+
+def init_worker(settings: dict):
+    """Procedure who prepare a worker process of the pool.
+
+    settings: the settings of the tournament, see 'run_tournament'
+    """
+    _WORKER['settings'] = settings
+    _WORKER['tables'] = [TranspositionTable(settings['table_mb']) for _ in range(2)]
+
+def play_tournament_game(game_id: int) -> dict:
+    """Function who play the game 'game_id' of the tournament in a worker process
+    and return its result.
+
+    The games go by pairs on the same opening, the player A is black in the even games
+    and white in the odd games.
+
+    game_id: the number of the game
+    """
+    settings = _WORKER['settings']
+    start = time.perf_counter()
+
+    for table in _WORKER['tables']:
+        table.clear()
+    player_a = make_player(settings['player_a'], derive_seed(settings['seed'], 'a', game_id),
+                           _WORKER['tables'][0])
+    player_b = make_player(settings['player_b'], derive_seed(settings['seed'], 'b', game_id),
+                           _WORKER['tables'][1])
+    color_a = game_id % 2
+    players = (player_a, player_b) if color_a == 0 else (player_b, player_a)
+
+    board = BoardWithoutGUI(settings['size'], players=players)
+    opening_moves = opening(settings['size'], settings['opening_plies'],
+                            derive_seed(settings['seed'], 'opening', game_id // 2))
+    for cord in opening_moves:
+        board.make_move(cord)
+    moves = opening_moves + board.play_game_without_output()
+
+    count = board.nb_of_pawn_by_color()
+    record = encode_moves(BitBoard(settings['size']), moves) if settings['record'] else None
+    if count[color_a] > count[1 - color_a]:
+        score_a = 1.0
+    elif count[color_a] < count[1 - color_a]:
+        score_a = 0.0
+    else:
+        score_a = 0.5
+    return {
+        'game': game_id,
+        'worker': os.getpid(),
+        'color_a': color_a,
+        'black': count[0],
+        'white': count[1],
+        'score_a': score_a,
+        'moves': len(moves),
+        'elapsed': time.perf_counter() - start,
+        'record': record,
+    }
+
+def elo(score: float) -> float:
+    """Function who return the Elo difference of a player who scores 'score' (0 to 1)."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+def summary(results: list, elapsed: float) -> dict:
+    """Function who return the statistics of the tournament.
+
+    The score of the player A has a 95% confidence interval from the variance of
+    the game scores, the Elo interval comes from the score interval.
+
+    results: list of the results of 'play_tournament_game'
+    elapsed: the time of the tournament in seconds
+    """
+    nb_games = len(results)
+    wins = sum(result['score_a'] == 1.0 for result in results)
+    draws = sum(result['score_a'] == 0.5 for result in results)
+    score = (wins + draws / 2) / nb_games
+    variance = sum((result['score_a'] - score) ** 2 for result in results) / nb_games
+    margin = 1.96 * math.sqrt(variance / nb_games)
+
+    workers = {}
+    for result in results:
+        worker = workers.setdefault(result['worker'], {'games': 0, 'busy': 0.0})
+        worker['games'] += 1
+        worker['busy'] += result['elapsed']
+    for worker in workers.values():
+        worker['games_per_second'] = worker['games'] / worker['busy'] if worker['busy'] else 0.0
+
+    return {
+        'games': nb_games,
+        'wins': wins,
+        'draws': draws,
+        'losses': nb_games - wins - draws,
+        'score': score,
+        'score_interval': (max(score - margin, 0.0), min(score + margin, 1.0)),
+        'elo': elo(score),
+        'elo_interval': (elo(max(score - margin, 0.0)), elo(min(score + margin, 1.0))),
+        'elapsed': elapsed,
+        'games_per_second': nb_games / elapsed if elapsed else 0.0,
+        'workers': workers,
+    }
+
+def run_tournament(player_a: str, player_b: str, nb_games: int, workers: int = None,
+                   size: int = 8, opening_plies: int = 4, seed: int = 0,
+                   table_mb: float = 4, on_result=None, record_path=None) -> dict:
+    """Function who play 'nb_games' games between the players A and B in a pool of
+    'workers' processes and return the statistics of 'summary'.
+
+    player_a: the spec of the player A, see 'make_player'
+    player_b: the spec of the player B
+    nb_games: the number of games
+    workers: the number of worker processes, the number of CPU by default
+    size: the size of the board
+    opening_plies: the number of random moves of the openings
+    seed: the seed of the openings and of the random players
+    table_mb: the size of the transposition table of each engine, in megabytes
+    on_result: optional function called with the result of each game when it ends
+    record_path: optional record file where the games are added
+    """
+    settings = {'player_a': player_a, 'player_b': player_b, 'size': size,
+                'opening_plies': opening_plies, 'seed': seed, 'table_mb': table_mb,
+                'record': record_path is not None}
+    start = time.perf_counter()
+    results = []
+    writer = RecordWriter(record_path) if record_path is not None else None
+    try:
+        with multiprocessing.Pool(workers, init_worker, (settings, )) as pool:
+            for result in pool.imap_unordered(play_tournament_game, range(nb_games)):
+                results.append(result)
+                if writer is not None:
+                    names = (player_a, player_b) if result['color_a'] == 0 else (player_b, player_a)
+                    writer.write_game(Game(size, names, FINISHED, result['black'],
+                                           result['white'], result['record']))
+                if on_result is not None:
+                    on_result(result)
+    finally:
+        if writer is not None:
+            writer.close()
+    return summary(results, time.perf_counter() - start)
+
+def print_result(result: dict):
+    """Procedure who print the result of one game."""
+    colors = ('black', 'white')
+    outcome = {1.0: 'wins', 0.5: 'draws', 0.0: 'loses'}[result['score_a']]
+    print(f"game {result['game']:>5} (worker {result['worker']}): A as "
+          f"{colors[result['color_a']]} {outcome} {result['black']}-{result['white']} "
+          f"in {result['elapsed']:.2f} s", flush=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play a tournament between two computer players.")
+    parser.add_argument('player_a', help="'random', 'engine', 'engine:<time>', "
+                                         "'engine:<time>:<depth>', 'mcts', 'mcts:<time>', "
+                                         "'pattern:<weights>:<time>' or 'book:<path>:<player>'")
+    parser.add_argument('player_b', help="the other player, same format")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of worker processes, the number of CPU by default")
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--opening-plies', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--table-mb', type=float, default=4)
+    parser.add_argument('--record', default=None, help="record file where the games are added")
+    args = parser.parse_args()
+
+    stats = run_tournament(args.player_a, args.player_b, args.games, args.workers, args.size,
+                           args.opening_plies, args.seed, args.table_mb, print_result,
+                           args.record)
+    print(f"\n{stats['games']} games in {stats['elapsed']:.1f} s "
+          f"({stats['games_per_second']:.2f} games/s)")
+    print(f"A: +{stats['wins']} ={stats['draws']} -{stats['losses']}, score {stats['score']:.3f} "
+          f"[{stats['score_interval'][0]:.3f}, {stats['score_interval'][1]:.3f}], "
+          f"Elo {stats['elo']:+.0f} [{stats['elo_interval'][0]:+.0f}, "
+          f"{stats['elo_interval'][1]:+.0f}]")
+    for pid, worker in sorted(stats['workers'].items()):
+        print(f"worker {pid}: {worker['games']} games, {worker['games_per_second']:.2f} games/s")
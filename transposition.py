@@ -0,0 +1,93 @@
+"""Transposition table file"""
+
+import struct
+
+EXACT, LOWER, UPPER = 0, 1, 2  # kind of score stored in an entry
+
+ENTRY = struct.Struct('<QhbBi')  # key, move, depth, flag, score
+BUCKET_SIZE = 2 * ENTRY.size  # a depth-preferred entry and an always-replace entry
+
+class TranspositionTable():
+    """Fixed size hash table of the search results, indexed by the Zobrist key
+    of the position.
+
+    Each bucket holds two entries: the first one is only replaced by a deeper (or equal)
+    search, the second one is always replaced.
+
+    size_mb: the size of the table in megabytes, rounded down to a power of two buckets
+    buffer: optional writable buffer used for the table instead of a new bytearray
+    """
+
+    def __init__(self, size_mb: float = 16, buffer=None) -> None:
+        if buffer is None:
+            buffer = bytearray(self.table_bytes(size_mb))
+        assert len(buffer) >= BUCKET_SIZE
+        self.nb_buckets = 1 << ((len(buffer) // BUCKET_SIZE).bit_length() - 1)
+        self.buffer = buffer
+        self.mask = self.nb_buckets - 1
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    @staticmethod
+    def table_bytes(size_mb: float) -> int:
+        """Function who return the size in bytes of a table of 'size_mb' megabytes."""
+        assert size_mb > 0
+        nb_buckets = max(int(size_mb * 1024 * 1024) // BUCKET_SIZE, 1)
+        return (1 << (nb_buckets.bit_length() - 1)) * BUCKET_SIZE
+
+    def clear(self):
+        """Procedure who remove all the entries and reset the counters."""
+        self.buffer[:] = bytes(len(self.buffer))
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def probe(self, key: int):
+        """Function who return the entry (move, depth, flag, score) of the position 'key',
+        or None if the position is not in the table.
+
+        key: the Zobrist key of the position
+        """
+        offset = (key & self.mask) * BUCKET_SIZE
+        first = ENTRY.unpack_from(self.buffer, offset)
+        if first[0] == key:
+            self.hits += 1
+            return first[1:]
+        second = ENTRY.unpack_from(self.buffer, offset + ENTRY.size)
+        if second[0] == key:
+            self.hits += 1
+            return second[1:]
+        self.misses += 1
+        if first[0] or second[0]:
+            self.collisions += 1
+        return None
+
+    def store(self, key: int, move: int, depth: int, flag: int, score: int):
+        """Procedure who store a search result in the table.
+
+        key: the Zobrist key of the position
+        move: the best move as row * size + column, -1 if there is no move
+        depth: the depth of the search
+        flag: EXACT, LOWER (the score is a lower bound) or UPPER (an upper bound)
+        score: the score of the position
+        """
+        offset = (key & self.mask) * BUCKET_SIZE
+        first_key, _, first_depth, _, _ = ENTRY.unpack_from(self.buffer, offset)
+        if first_key == key or first_key == 0 or depth >= first_depth:
+            ENTRY.pack_into(self.buffer, offset, key, move, depth, flag, score)
+        else:
+            ENTRY.pack_into(self.buffer, offset + ENTRY.size, key, move, depth, flag, score)
+        self.stores += 1
+
+    def stats(self) -> dict:
+        """Function who return the counters of the table."""
+        probes = self.hits + self.misses
+        return {
+            'buckets': self.nb_buckets,
+            'bytes': self.nb_buckets * BUCKET_SIZE,
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'hit_rate': self.hits / probes if probes else 0.0,
+        }
@@ -0,0 +1,25 @@
+"""Zobrist hashing file"""
+
+import random
+
+_ZOBRIST_KEYS = {}
+
+SIDE_KEY = random.Random('side').getrandbits(64)  # xor-ed in the key when white is to move
+
+def zobrist_keys(size: int) -> list:
+    """Function who return the list of the Zobrist keys of a board of size 'size'.
+
+    The element row * size + column is the tuple (black key, white key, black key ^ white key)
+    of the cell (row, column), the last one is used to flip a pawn. The keys are
+    the same in every process, so they can be stored in files.
+
+    size: int who represents the size of the board
+    """
+    if size not in _ZOBRIST_KEYS:
+        generator = random.Random(size)
+        keys = []
+        for _ in range(size * size):
+            black, white = generator.getrandbits(64), generator.getrandbits(64)
+            keys.append((black, white, black ^ white))
+        _ZOBRIST_KEYS[size] = keys
+    return _ZOBRIST_KEYS[size]